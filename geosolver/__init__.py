@@ -1,6 +1,6 @@
-from geosolver import settings
 from geosolver.database.geoserver_interface import GeoserverInterface
 
 __author__ = 'minjoon'
 
-geoserver_interface = GeoserverInterface(settings.GEOSERVER_URL)
+# The server url, mirror and offline mode are read from settings on each download
+geoserver_interface = GeoserverInterface()
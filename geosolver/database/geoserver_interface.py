@@ -1,26 +1,66 @@
-import json
+from concurrent.futures import ThreadPoolExecutor
 import logging
 import os
 import tempfile
-import urllib
 from urllib.parse import urljoin, urlparse
 
-
 import requests
+from requests.adapters import HTTPAdapter
+
 from geosolver import settings
+from geosolver.database.geoserver_mirror import GeoserverMirror
 from geosolver.database.states import Question
 
 __author__ = 'minjoon'
 
+# Number of diagrams downloaded concurrently, which is also the size of the connection pool
+NUM_THREADS = 8
+
+
 class GeoserverInterface(object):
-    def __init__(self, server_url):
-        self.server_url = server_url
+    def __init__(self, server_url=None, mirror_path=None, offline=None):
+        """
+        The arguments that are not given are read from settings on each download,
+        so that settings can be changed after import.
+
+        :param str server_url: if None, settings.GEOSERVER_URL
+        :param str mirror_path: directory of the local mirror; if None, settings.get_cache_path("geoserver_mirror"),
+        and nothing is mirrored if that is None as well
+        :param bool offline: if set, everything is served from the mirror without accessing the server;
+        if None, settings.GEOSERVER_OFFLINE
+        """
+        self._server_url = server_url
+        self._mirror_path = mirror_path
+        self._offline = offline
+        self._mirror = None
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=NUM_THREADS, pool_maxsize=NUM_THREADS)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    @property
+    def server_url(self):
+        return self._server_url if self._server_url is not None else settings.GEOSERVER_URL
+
+    @property
+    def offline(self):
+        return self._offline if self._offline is not None else settings.GEOSERVER_OFFLINE
+
+    @property
+    def mirror(self):
+        path = self._mirror_path if self._mirror_path is not None else settings.get_cache_path("geoserver_mirror")
+        if path is None:
+            return None
+        if self._mirror is None or self._mirror.path != path:
+            self._mirror = GeoserverMirror(path)
+        return self._mirror
 
     def download_questions(self, *args, **kwargs):
         """
         key='all': download all
         key=[development,test]: download dev and test
         key=[1,2,3]: download questions with id 1, 2, and 3
+        The diagrams are downloaded concurrently, into the mirror if there is one.
         :param key:
         :return:
         """
@@ -28,28 +68,22 @@ class GeoserverInterface(object):
             param = 'all'
         else:
             param = "+".join(str(x) for x in args)
-        sub_url = "/questions/download/%s" % param
-        request_url = urljoin(self.server_url, sub_url)
-        print("accessing: %s" % request_url)
-        r = requests.get(request_url)
-        data = json.loads(r.text, object_hook=_decode_dict)
+        data = self._get_json("/questions/download/%s" % param)
+        if 'no_diagram' in kwargs and kwargs['no_diagram']:
+            diagram_paths = ["" for _ in data]
+        else:
+            with ThreadPoolExecutor(NUM_THREADS) as executor:
+                diagram_paths = list(executor.map(lambda pair: self._get_diagram(pair['pk'], pair['diagram_url']),
+                                                  data))
         questions = {}
-        for pair in data:
-            if 'no_diagram' in kwargs and kwargs['no_diagram']:
-                temp_filepath = ""
-            else:
-                diagram_url = pair['diagram_url']
-                temp_dir = tempfile.mkdtemp()
-                temp_name = os.path.basename(urlparse(diagram_url).path)
-                temp_filepath = os.path.join(temp_dir, temp_name)
-                urllib.urlretrieve(diagram_url, temp_filepath)
-            choice_words = {int(number): {int(index): word for index, word in words.iteritems()} for number, words in pair['choice_words'].iteritems()}
-            choices = {int(number): text for number, text in pair['choices'].iteritems()}
-            sentence_expressions ={int(number): {index: expr for index, expr in exprs.iteritems()} for number, exprs in pair['sentence_expressions'].iteritems()}
-            sentence_words = {int(number): {int(index): word for index, word in words.iteritems()} for number, words in pair['sentence_words'].iteritems()}
-            choice_expressions ={int(number): {index: expr for index, expr in exprs.iteritems()} for number, exprs in pair['choice_expressions'].iteritems()}
+        for pair, diagram_path in zip(data, diagram_paths):
+            choice_words = {int(number): {int(index): word for index, word in words.items()} for number, words in pair['choice_words'].items()}
+            choices = {int(number): text for number, text in pair['choices'].items()}
+            sentence_expressions ={int(number): {index: expr for index, expr in exprs.items()} for number, exprs in pair['sentence_expressions'].items()}
+            sentence_words = {int(number): {int(index): word for index, word in words.items()} for number, words in pair['sentence_words'].items()}
+            choice_expressions ={int(number): {index: expr for index, expr in exprs.items()} for number, exprs in pair['choice_expressions'].items()}
             answer = pair['answer']
-            question = Question(pair['pk'], pair['text'], sentence_words, sentence_expressions, temp_filepath, choice_words, choice_expressions, answer, choices)
+            question = Question(pair['pk'], pair['text'], sentence_words, sentence_expressions, diagram_path, choice_words, choice_expressions, answer, choices)
             questions[question.key] = question
         return questions
 
@@ -58,11 +92,7 @@ class GeoserverInterface(object):
             key = 'all'
         else:
             key = "+".join(str(x) for x in args)
-        suburl = "/labels/download/%s" % str(key)
-        request_url = urljoin(self.server_url, suburl)
-        print("accessing: %s" % request_url)
-        r = requests.get(request_url)
-        data = json.loads(r.text, object_hook=_decode_dict)
+        data = self._get_json("/labels/download/%s" % str(key))
         labels = {}
         for pair in data:
             question_pk = pair['question_pk']
@@ -75,17 +105,82 @@ class GeoserverInterface(object):
             param = 'all'
         else:
             param = "+".join(str(x) for x in args)
-        suburl = "/semantics/download/%s" % param
-        request_url = urljoin(self.server_url, suburl)
-        print("accessing: %s" % request_url)
-        r = requests.get(request_url)
-        data = json.loads(r.text, object_hook=_decode_dict)
+        data = self._get_json("/semantics/download/%s" % param)
         processed = {int(pk): {int(idx): {int(num): text
-                                          for num, text in parses.iteritems()}
-                               for idx, parses in sentences.iteritems()}
-                     for pk, sentences in data.iteritems()}
+                                          for num, text in parses.items()}
+                               for idx, parses in sentences.items()}
+                     for pk, sentences in data.items()}
         return processed
 
+    def _get_json(self, sub_url):
+        """
+        Revalidates the mirrored response with its ETag, if any.
+        If the server cannot be reached, the mirrored response is used.
+        """
+        request_url = urljoin(self.server_url, sub_url)
+        mirror, offline = self._get_mirror()
+        entry = mirror.get_json(request_url) if mirror is not None else None
+        if offline:
+            if entry is None:
+                raise Exception("Not in the mirror: %s" % request_url)
+            return entry[1]
+
+        print("accessing: %s" % request_url)
+        headers = {'If-None-Match': entry[0]} if entry is not None and entry[0] is not None else {}
+        try:
+            r = self.session.get(request_url, headers=headers)
+        except requests.ConnectionError:
+            if entry is None:
+                raise
+            logging.warning("Server unreachable, using the mirror: %s" % request_url)
+            return entry[1]
+        if r.status_code == 304:
+            return entry[1]
+        r.raise_for_status()
+        data = r.json()
+        if mirror is not None:
+            mirror.set_json(request_url, r.headers.get('ETag'), data)
+        return data
+
+    def _get_diagram(self, pk, diagram_url):
+        """
+        :return str: local path of the diagram
+        """
+        filename = os.path.basename(urlparse(diagram_url).path)
+        mirror, offline = self._get_mirror()
+        if mirror is None:
+            r = self.session.get(diagram_url)
+            r.raise_for_status()
+            return _write_temp_file(filename, r.content)
+
+        entry = mirror.get_diagram(pk, diagram_url)
+        if offline:
+            if entry is None:
+                raise Exception("Diagram of question %s not in the mirror: %s" % (pk, diagram_url))
+            return entry[1]
+
+        headers = {'If-None-Match': entry[0]} if entry is not None and entry[0] is not None else {}
+        try:
+            r = self.session.get(diagram_url, headers=headers)
+        except requests.ConnectionError:
+            if entry is None:
+                raise
+            logging.warning("Server unreachable, using the mirror: %s" % diagram_url)
+            return entry[1]
+        if r.status_code == 304:
+            return entry[1]
+        r.raise_for_status()
+        return mirror.set_diagram(pk, diagram_url, r.headers.get('ETag'), filename, r.content)
+
+    def _get_mirror(self):
+        """
+        :return tuple: the mirror, or None, and whether to serve from the mirror only
+        """
+        mirror, offline = self.mirror, self.offline
+        if offline and mirror is None:
+            raise Exception("Offline mode requires a mirror; set settings.CACHE_ROOT.")
+        return mirror, offline
+
     def upload_question(self, text, diagram_path, choices, answer=""):
         """
 
@@ -147,31 +242,9 @@ class GeoserverInterface(object):
         return True
 
 
-def _decode_list(data):
-    rv = []
-    for item in data:
-        if isinstance(item, unicode):
-            item = item.encode('utf-8')
-        elif isinstance(item, list):
-            item = _decode_list(item)
-        elif isinstance(item, dict):
-            item = _decode_dict(item)
-        rv.append(item)
-    return rv
-
-
-def _decode_dict(data):
-    rv = {}
-    for key, value in data.iteritems():
-        if isinstance(key, unicode):
-            key = key.encode('utf-8')
-        if isinstance(value, unicode):
-            value = value.encode('utf-8')
-        elif isinstance(value, list):
-            value = _decode_list(value)
-        elif isinstance(value, dict):
-            value = _decode_dict(value)
-        rv[key] = value
-    return rv
-
-
+def _write_temp_file(filename, content):
+    temp_dir = tempfile.mkdtemp()
+    temp_filepath = os.path.join(temp_dir, filename)
+    with open(temp_filepath, 'wb') as f:
+        f.write(content)
+    return temp_filepath
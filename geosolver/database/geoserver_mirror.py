@@ -0,0 +1,82 @@
+"""
+Local mirror of the geoserver.
+Downloaded JSON is stored by request URL, and diagrams by question pk, each with the ETag the server sent,
+so that later requests can be revalidated with If-None-Match instead of downloading again,
+or served without the server in offline mode.
+Files are written to a temporary file first and then moved into place, so that concurrent readers
+never see a partial entry, and the metadata of a diagram is written after the diagram itself.
+"""
+import hashlib
+import json
+import os
+import tempfile
+
+__author__ = 'minjoon'
+
+
+class GeoserverMirror(object):
+    def __init__(self, path):
+        """
+        :param str path: root directory of the mirror
+        """
+        self.path = path
+
+    def get_json(self, url):
+        """
+        :return tuple: ETag (None if the server did not send any) and data, or None
+        """
+        entry = _read_json(self._get_json_path(url))
+        if entry is None or entry['url'] != url:
+            return None
+        return entry['etag'], entry['data']
+
+    def set_json(self, url, etag, data):
+        _write(self._get_json_path(url), json.dumps({'url': url, 'etag': etag, 'data': data}).encode('utf-8'))
+
+    def get_diagram(self, pk, url):
+        """
+        :return tuple: ETag and path of the diagram of question pk, or None if it is missing or from another url
+        """
+        meta = _read_json(self._get_diagram_meta_path(pk))
+        if meta is None or meta['url'] != url:
+            return None
+        path = os.path.join(self.path, 'diagrams', str(pk), meta['filename'])
+        if not os.path.exists(path):
+            return None
+        return meta['etag'], path
+
+    def set_diagram(self, pk, url, etag, filename, content):
+        """
+        :return str: path of the diagram
+        """
+        path = os.path.join(self.path, 'diagrams', str(pk), filename)
+        _write(path, content)
+        meta = {'url': url, 'etag': etag, 'filename': filename}
+        _write(self._get_diagram_meta_path(pk), json.dumps(meta).encode('utf-8'))
+        return path
+
+    def _get_json_path(self, url):
+        return os.path.join(self.path, 'json', hashlib.sha1(url.encode('utf-8')).hexdigest() + ".json")
+
+    def _get_diagram_meta_path(self, pk):
+        return os.path.join(self.path, 'diagrams', str(pk), "meta.json")
+
+
+def _read_json(path):
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _write(path, content):
+    dir_path = os.path.dirname(path)
+    if not os.path.exists(dir_path):
+        os.makedirs(dir_path, exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(dir=dir_path)
+    with os.fdopen(fd, 'wb') as f:
+        f.write(content)
+    os.replace(temp_path, path)
@@ -0,0 +1,113 @@
+"""
+Mirrored responses are revalidated with their ETag, served when the server cannot be reached,
+and served without any request in offline mode, which can be turned on through settings after import.
+"""
+import pytest
+import requests
+
+import geosolver
+from geosolver import settings
+from geosolver.database.geoserver_interface import GeoserverInterface
+from geosolver.database.geoserver_mirror import GeoserverMirror
+
+__author__ = 'minjoon'
+
+SERVER_URL = "http://geoserver"
+
+
+class _Response(object):
+    def __init__(self, status_code, data=None, content=b"", etag=None):
+        self.status_code = status_code
+        self.data = data
+        self.content = content
+        self.headers = {'ETag': etag} if etag is not None else {}
+
+    def json(self):
+        return self.data
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise requests.HTTPError(self.status_code)
+
+
+class _Session(object):
+    """
+    Serves fixed responses by URL, with 304 if If-None-Match is the current ETag.
+    """
+    def __init__(self, responses):
+        self.responses = responses
+        self.requests = []
+        self.reachable = True
+
+    def get(self, url, headers=None):
+        self.requests.append((url, headers or {}))
+        if not self.reachable:
+            raise requests.ConnectionError(url)
+        response = self.responses[url]
+        if headers and headers.get('If-None-Match') == response.headers.get('ETag'):
+            return _Response(304)
+        return response
+
+
+def _get_interface(path, responses, offline=False):
+    interface = GeoserverInterface(SERVER_URL, path, offline)
+    interface.session = _Session(responses)
+    return interface
+
+
+def test_mirror(tmpdir):
+    mirror = GeoserverMirror(str(tmpdir))
+    assert mirror.get_json("http://a") is None
+    mirror.set_json("http://a", '"1"', {'x': [1, 2]})
+    assert GeoserverMirror(str(tmpdir)).get_json("http://a") == ('"1"', {'x': [1, 2]})
+
+    path = mirror.set_diagram(5, "http://a/5.png", None, "5.png", b"png")
+    assert mirror.get_diagram(5, "http://a/5.png") == (None, path)
+    assert mirror.get_diagram(5, "http://a/6.png") is None
+    with open(path, 'rb') as f:
+        assert f.read() == b"png"
+
+
+def test_json(tmpdir):
+    url = SERVER_URL + "/labels/download/all"
+    responses = {url: _Response(200, data=[{'question_pk': 1, 'label_data': {}}], etag='"1"')}
+    interface = _get_interface(str(tmpdir), responses)
+    assert interface.download_labels() == {1: {}}
+    assert interface.session.requests == [(url, {})]
+
+    interface = _get_interface(str(tmpdir), responses)
+    assert interface.download_labels() == {1: {}}
+    assert interface.session.requests == [(url, {'If-None-Match': '"1"'})]
+
+    interface.session.reachable = False
+    assert interface.download_labels() == {1: {}}
+
+    interface = _get_interface(str(tmpdir), {}, offline=True)
+    assert interface.download_labels() == {1: {}}
+    assert interface.session.requests == []
+    with pytest.raises(Exception):
+        interface.download_semantics()
+
+
+def test_diagram(tmpdir):
+    url = "http://images/diagrams/7.png"
+    interface = _get_interface(str(tmpdir), {url: _Response(200, content=b"png", etag='"a"')})
+    path = interface._get_diagram(7, url)
+    assert interface._get_diagram(7, url) == path
+    assert interface.session.requests[1] == (url, {'If-None-Match': '"a"'})
+    assert _get_interface(str(tmpdir), {}, offline=True)._get_diagram(7, url) == path
+
+
+def test_settings_after_import(tmpdir, monkeypatch):
+    url = SERVER_URL + "/labels/download/all"
+    GeoserverMirror(str(tmpdir.join("geoserver_mirror"))).set_json(url, None, [{'question_pk': 1, 'label_data': {}}])
+    monkeypatch.setattr(geosolver.geoserver_interface, 'session', _Session({}))
+    monkeypatch.setattr(settings, 'GEOSERVER_URL', SERVER_URL)
+    monkeypatch.setattr(settings, 'GEOSERVER_OFFLINE', True)
+    with pytest.raises(Exception, match="requires a mirror"):
+        geosolver.geoserver_interface.download_labels()
+
+    monkeypatch.setattr(settings, 'CACHE_ROOT', str(tmpdir))
+    assert geosolver.geoserver_interface.mirror.path == str(tmpdir.join("geoserver_mirror"))
+    assert geosolver.geoserver_interface.download_labels() == {1: {}}
+    assert geosolver.geoserver_interface.session.requests == []
@@ -0,0 +1,101 @@
+"""
+Radius-bounded clustering of points, used to merge nearby intersections in the core parse.
+It finds the fewest clusters whose points all lie within radius of their centroid, as the KMeans search it replaces did.
+Two points of such a cluster are at most 2*radius apart, so the points are first split into the connected components
+of the pairs within 2*radius (cKDTree.query_pairs), and the search only runs inside the components that need it.
+"""
+import numpy as np
+from scipy.sparse import coo_matrix
+from scipy.sparse.csgraph import connected_components
+from scipy.spatial import cKDTree
+
+__author__ = 'minjoon'
+
+
+def cluster_points(points, radius, max_num_clusters=None):
+    """
+    Clusters points such that every point is within radius of the centroid of its cluster.
+    A component of points linked by pairs within 2*radius is one cluster if it satisfies the bound;
+    otherwise it is clustered by k-means with the smallest k that does.
+    If max_num_clusters or more clusters are needed, the bound is dropped, and all points are clustered
+    by k-means into max_num_clusters clusters.
+    K-means is seeded with a fixed random state, so the output is deterministic.
+
+    :param numpy.ndarray points: (N,2) array of points
+    :param float radius:
+    :param int max_num_clusters: None for no limit
+    :return numpy.ndarray: (K,2) array of cluster centroids, ordered by the first point of each component
+    """
+    points = np.asarray(points, dtype=float).reshape(-1, 2)
+    if len(points) == 0:
+        return np.zeros((0, 2))
+
+    pairs = cKDTree(points).query_pairs(2 * radius, output_type='ndarray')
+    graph = coo_matrix((np.ones(len(pairs)), (pairs[:, 0], pairs[:, 1])), shape=(len(points), len(points)))
+    _, labels = connected_components(graph, directed=False)
+    _, first_indices, labels = np.unique(labels, return_index=True, return_inverse=True)
+
+    out = []
+    for label in np.argsort(first_indices):
+        out.extend(_cluster_component(points[labels == label], radius))
+        if max_num_clusters is not None and len(out) >= max_num_clusters:
+            centroids, _ = _kmeans(points, min(len(points), max_num_clusters))
+            return centroids
+    return np.array(out)
+
+
+def _cluster_component(points, radius):
+    for k in range(1, len(points) + 1):
+        centroids, assignments = _kmeans(points, k)
+        if np.max(np.hypot(*(points - centroids[assignments]).T)) <= radius:
+            return centroids
+    return points
+
+
+def _kmeans(points, k, num_inits=10, max_num_iterations=300, seed=42):
+    """
+    Lloyd's algorithm from k-means++ initializations; the run with the lowest inertia is kept.
+
+    :return tuple: (K,2) array of centroids (empty clusters are dropped), and the cluster of each point
+    """
+    if k == 1:
+        return points.mean(axis=0)[np.newaxis], np.zeros(len(points), dtype=int)
+
+    random_state = np.random.RandomState(seed)
+    best = None
+    for _ in range(num_inits):
+        centroids = _kmeans_plus_plus(points, k, random_state)
+        for _ in range(max_num_iterations):
+            assignments = _get_squared_distances(points, centroids).argmin(axis=1)
+            new_centroids = np.array([points[assignments == c].mean(axis=0) if np.any(assignments == c)
+                                      else centroids[c] for c in range(k)])
+            if np.allclose(new_centroids, centroids):
+                break
+            centroids = new_centroids
+        squared_distances = _get_squared_distances(points, centroids)
+        assignments = squared_distances.argmin(axis=1)
+        inertia = squared_distances.min(axis=1).sum()
+        if best is None or inertia < best[0]:
+            best = inertia, centroids, assignments
+
+    _, centroids, assignments = best
+    used = np.unique(assignments)
+    return centroids[used], np.searchsorted(used, assignments)
+
+
+def _kmeans_plus_plus(points, k, random_state):
+    indices = [random_state.randint(len(points))]
+    squared_distances = _get_squared_distances(points, points[indices]).min(axis=1)
+    for _ in range(1, k):
+        total = squared_distances.sum()
+        if total == 0:
+            index = random_state.randint(len(points))
+        else:
+            index = random_state.choice(len(points), p=squared_distances / total)
+        indices.append(index)
+        squared_distances = np.minimum(squared_distances, ((points - points[index]) ** 2).sum(axis=1))
+    return points[indices]
+
+
+def _get_squared_distances(points, centroids):
+    return ((points[:, np.newaxis, :] - centroids[np.newaxis, :, :]) ** 2).sum(axis=2)
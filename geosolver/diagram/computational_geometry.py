@@ -86,6 +86,75 @@ def distance_between_circle_and_point(circle, point):
     return abs(circle.radius - distance_between_points(circle.center, point))
 
 
+def distances_between_points(point, points):
+    """
+    Vectorized distance_between_points.
+
+    :param point:
+    :param numpy.ndarray points: (N,2) array of x, y coordinates
+    :return numpy.ndarray: (N,) array of distances
+    """
+    return np.sqrt(distances_between_points_squared(point, points))
+
+
+def distances_between_points_squared(point, points):
+    dx = points[:, 0] - point[0]
+    dy = points[:, 1] - point[1]
+    return dx*dx + dy*dy
+
+
+def distances_between_line_and_points(line, points):
+    """
+    Vectorized distance_between_line_and_point.
+
+    :param line:
+    :param numpy.ndarray points: (N,2) array of x, y coordinates
+    :return numpy.ndarray: (N,) array of distances
+    """
+    length = line_length(line)
+    if length == 0:
+        return distances_between_points(line.a, points)
+    ux, uy = (line.b.x - line.a.x)/length, (line.b.y - line.a.y)/length
+    px, py = (line.a.x + line.b.x)/2.0, (line.a.y + line.b.y)/2.0
+    vx = points[:, 0] - px
+    vy = points[:, 1] - py
+    perpendicular_distances = np.abs(vx*uy - vy*ux)
+    parallel_distances = np.abs(vx*ux + vy*uy)
+    end_distances = np.sqrt(np.minimum(distances_between_points_squared(line.a, points),
+                                       distances_between_points_squared(line.b, points)))
+    return np.where(parallel_distances <= length/2.0, perpendicular_distances, end_distances)
+
+
+def distances_between_circle_and_points(circle, points):
+    """
+    Vectorized distance_between_circle_and_point.
+
+    :param circle:
+    :param numpy.ndarray points: (N,2) array of x, y coordinates
+    :return numpy.ndarray: (N,) array of distances
+    """
+    return np.abs(circle.radius - distances_between_points(circle.center, points))
+
+
+def distances_between_arc_and_points(arc, points):
+    """
+    Vectorized distance_between_arc_and_point.
+
+    :param arc:
+    :param numpy.ndarray points: (N,2) array of x, y coordinates
+    :return numpy.ndarray: (N,) array of distances
+    """
+    center = arc.circle.center
+    angle_a = cartesian_angle(center, arc.a)
+    angle_b = cartesian_angle(center, arc.b)
+    angles_p = np.arctan2(points[:, 1] - center.y, points[:, 0] - center.x) % (2*np.pi)
+    db = signed_distance_between_cartesian_angles(angle_a, angle_b)
+    dps = (angles_p - angle_a) % (2*np.pi)
+    end_distances = np.sqrt(np.minimum(distances_between_points_squared(arc.a, points),
+                                       distances_between_points_squared(arc.b, points)))
+    return np.where(dps <= db, distances_between_circle_and_points(arc.circle, points), end_distances)
+
+
 def distance_between_arc_and_point(arc, point):
     angle_a = cartesian_angle(arc.circle.center, arc.a)
     angle_b = cartesian_angle(arc.circle.center, arc.b)
@@ -164,6 +233,95 @@ def intersections_between_circle_and_line(circle, line, eps):
 
     return sln
 
+def distances_between_segments_and_points(a, b, points):
+    """
+    Element-wise distance_between_line_and_point for broadcastable arrays of segments and points.
+
+    :param numpy.ndarray a: (...,2) array of the first end points of the segments
+    :param numpy.ndarray b: (...,2) array of the second end points of the segments
+    :param numpy.ndarray points: (...,2) array of points
+    :return numpy.ndarray:
+    """
+    d = b - a
+    length = np.hypot(d[..., 0], d[..., 1])
+    safe_length = np.where(length == 0, 1, length)
+    u = d / safe_length[..., np.newaxis]
+    v = points - (a + b)/2.0
+    perpendicular_distances = np.abs(v[..., 0]*u[..., 1] - v[..., 1]*u[..., 0])
+    parallel_distances = np.abs(v[..., 0]*u[..., 0] + v[..., 1]*u[..., 1])
+    end_distances = np.minimum(np.hypot(*np.moveaxis(points - a, -1, 0)), np.hypot(*np.moveaxis(points - b, -1, 0)))
+    inside = (parallel_distances <= length/2.0) & (length > 0)
+    return np.where(inside, perpendicular_distances, end_distances)
+
+
+def intersections_between_lines_batch(lines, eps):
+    """
+    intersections_between_lines for all pairs of lines at once.
+    Entry [i, j] corresponds to intersections_between_lines(lines[i], lines[j], eps).
+
+    :param numpy.ndarray lines: (L,4) array of a.x, a.y, b.x, b.y
+    :param float eps:
+    :return: (L,L,2) array of intersection points of the infinite lines,
+        and (L,L) boolean mask of the points that intersections_between_lines would return
+    """
+    a = lines[:, 0:2]
+    d = lines[:, 2:4] - a
+    x = a[:, np.newaxis, :] - a[np.newaxis, :, :]
+    d0 = d[:, np.newaxis, :]
+    d1 = d[np.newaxis, :, :]
+    cross = d1[..., 0]*d0[..., 1] - d1[..., 1]*d0[..., 0]
+    parallel = np.abs(cross) < eps
+    safe_cross = np.where(parallel, 1, cross)
+    t1 = (x[..., 0]*d0[..., 1] - x[..., 1]*d0[..., 0]) / safe_cross
+    points = a[np.newaxis, :, :] + d1*t1[..., np.newaxis]
+    a0, b0 = lines[:, np.newaxis, 0:2], lines[:, np.newaxis, 2:4]
+    a1, b1 = lines[np.newaxis, :, 0:2], lines[np.newaxis, :, 2:4]
+    mask = ~parallel & (distances_between_segments_and_points(a1, b1, points) < eps) & \
+        (distances_between_segments_and_points(a0, b0, points) < eps)
+    return points, mask
+
+
+def intersections_between_circles_and_lines_batch(circles, lines, eps):
+    """
+    intersections_between_circle_and_line for all pairs of circles and lines at once.
+    Entry [i, j] holds the up to two intersections of circles[i] and lines[j], in the same order.
+
+    :param numpy.ndarray circles: (C,3) array of center.x, center.y, radius
+    :param numpy.ndarray lines: (L,4) array of a.x, a.y, b.x, b.y
+    :param float eps:
+    :return: (C,L,2,2) array of intersection points and (C,L,2) boolean mask of the valid ones
+    """
+    min_angle = 40
+    a = lines[np.newaxis, :, 0:2]
+    b = lines[np.newaxis, :, 2:4]
+    center = circles[:, np.newaxis, 0:2]
+    radius = circles[:, np.newaxis, 2]
+    u = (b - a) / np.hypot(*np.moveaxis(b - a, -1, 0))[..., np.newaxis]
+    n = np.stack((u[..., 1], -u[..., 0]), axis=-1)
+    v = (a + b)/2.0 - center
+    d = v[..., 0]*n[..., 0] + v[..., 1]*n[..., 1]
+    perp_point = center + d[..., np.newaxis]*n
+
+    discriminant = radius**2 - d**2
+    secant = discriminant >= 0
+    tangent = ~secant & ((radius + eps)**2 - d**2 >= 0)
+    par_vector = np.sqrt(np.where(secant, discriminant, 0))[..., np.newaxis] * u
+    points = np.stack((perp_point + par_vector, perp_point - par_vector), axis=-2)
+    mask = np.stack((secant | tangent, secant), axis=-1)
+    mask &= distances_between_segments_and_points(a[..., np.newaxis, :], b[..., np.newaxis, :], points) < eps
+
+    # Two close intersections are merged into their midpoint.
+    v0 = points[..., 0, :] - center
+    v1 = points[..., 1, :] - center
+    angles = np.arctan2(np.abs(v0[..., 0]*v1[..., 1] - v0[..., 1]*v1[..., 0]),
+                        v0[..., 0]*v1[..., 0] + v0[..., 1]*v1[..., 1])
+    merged = mask[..., 0] & mask[..., 1] & (180*angles/np.pi < min_angle)
+    points[..., 0, :] = np.where(merged[..., np.newaxis], (points[..., 0, :] + points[..., 1, :])/2.0,
+                                 points[..., 0, :])
+    mask[..., 1] &= ~merged
+    return points, mask
+
+
 def intersections_between_circles(circle0, circle1):
     """
     TO BE IMPLEMENTED
@@ -1,4 +1,5 @@
-import itertools
+from types import MappingProxyType
+
 from geosolver.diagram.computational_geometry import polygon_is_convex, angle_in_radian
 from geosolver.diagram.states import GraphParse
 from geosolver.ontology.instantiator_definitions import instantiators
@@ -14,23 +15,109 @@ def get_instances(graph_parse, instance_type_name, is_variable, *args):
     if instance_type_name in ["triangle", "quad", 'hexagon', 'polygon']:
         return _get_polygons(graph_parse, instance_type_name, is_variable, *args)
     else:
-        return eval("_get_%ss(graph_parse, is_variable, *args)" % instance_type_name)
+        return _instance_getters[instance_type_name](graph_parse, is_variable, *args)
 
 
 def get_all_instances(graph_parse, instance_type_name, is_variable=False):
-    if instance_type_name == 'polygon':
-        triangles = _get_all_polygons(graph_parse, 'triangle', 3, is_variable)
-        quads = _get_all_polygons(graph_parse, 'quad', 4, is_variable)
-        hexagons = _get_all_polygons(graph_parse, 'hexagon', 6, is_variable)
-        polygons = dict(triangles.items() + quads.items() + hexagons.items())
-        return polygons
-    elif instance_type_name in ["triangle", "quad", "hexagon"]:
-        if instance_type_name == 'triangle': n = 3
-        elif instance_type_name == 'quad': n = 4
-        elif instance_type_name == 'hexagon': n = 6
-        return _get_all_polygons(graph_parse, instance_type_name, n, is_variable)
+    """
+    All instances of the type in graph_parse, from its instance catalog, as a read-only mapping.
+    """
+    return get_instance_catalog(graph_parse).get_all(instance_type_name, is_variable)
+
+
+def get_instance_catalog(graph_parse):
+    assert isinstance(graph_parse, GraphParse)
+    if graph_parse.instance_catalog is None:
+        graph_parse.instance_catalog = InstanceCatalog(graph_parse)
+    return graph_parse.instance_catalog
+
+
+class InstanceCatalog(object):
+    """
+    Instances of a graph parse, enumerated per (instance type, is_variable) on first access.
+    Each enumeration is indexed by instance key, and lazily by the point keys in the instance key.
+    The enumerations are shared by all callers, so they are returned as read-only mappings.
+    """
+    def __init__(self, graph_parse):
+        assert isinstance(graph_parse, GraphParse)
+        self.graph_parse = graph_parse
+        self.polygon_cycles = {}  # Tuples of cycles, keyed by the number of vertices
+        self._instances = {}
+        self._point_indices = {}
+
+    def get_all(self, instance_type_name, is_variable=False):
+        cache_key = (instance_type_name, is_variable)
+        if cache_key not in self._instances:
+            self._instances[cache_key] = self._enumerate(instance_type_name, is_variable)
+        return MappingProxyType(self._instances[cache_key])
+
+    def get(self, instance_type_name, is_variable, key):
+        return self.get_all(instance_type_name, is_variable).get(key)
+
+    def get_containing(self, instance_type_name, is_variable, point_key):
+        """
+        Instances whose key contains point_key, e.g. lines ending at it or angles with it as a vertex.
+        Circles are keyed by their center only.
+        """
+        cache_key = (instance_type_name, is_variable)
+        if cache_key not in self._point_indices:
+            point_index = {}
+            for key, instance in self.get_all(instance_type_name, is_variable).items():
+                for each_point_key in set(_get_point_keys(instance_type_name, key)):
+                    point_index.setdefault(each_point_key, {})[key] = instance
+            self._point_indices[cache_key] = point_index
+        return MappingProxyType(self._point_indices[cache_key].get(point_key, {}))
+
+    def points(self, is_variable=False):
+        return self.get_all('point', is_variable)
+
+    def lines(self, is_variable=False):
+        return self.get_all('line', is_variable)
+
+    def circles(self, is_variable=False):
+        return self.get_all('circle', is_variable)
+
+    def arcs(self, is_variable=False):
+        return self.get_all('arc', is_variable)
+
+    def angles(self, is_variable=False):
+        return self.get_all('angle', is_variable)
+
+    def triangles(self, is_variable=False):
+        return self.get_all('triangle', is_variable)
+
+    def quads(self, is_variable=False):
+        return self.get_all('quad', is_variable)
+
+    def hexagons(self, is_variable=False):
+        return self.get_all('hexagon', is_variable)
+
+    def polygons(self, is_variable=False):
+        return self.get_all('polygon', is_variable)
+
+    def _enumerate(self, instance_type_name, is_variable):
+        if instance_type_name == 'polygon':
+            return {**self.triangles(is_variable), **self.quads(is_variable), **self.hexagons(is_variable)}
+        elif instance_type_name in _polygon_sizes:
+            n = _polygon_sizes[instance_type_name]
+            return _get_all_polygons(self.graph_parse, instance_type_name, n, is_variable)
+        elif instance_type_name in _all_instance_getters:
+            return _all_instance_getters[instance_type_name](self.graph_parse, is_variable)
+        else:
+            raise Exception("Cannot enumerate instances of type %s" % instance_type_name)
+
+
+def _get_point_keys(instance_type_name, key):
+    if instance_type_name == 'point':
+        return [key]
+    elif instance_type_name == 'circle':
+        center_key, _ = key
+        return [center_key]
+    elif instance_type_name == 'arc':
+        (center_key, _), a_key, b_key = key
+        return [center_key, a_key, b_key]
     else:
-        return eval("_get_all_%ss(graph_parse, is_variable)" % instance_type_name)
+        return list(key)
 
 
 def _get_points(graph_parse, is_variable, key):
@@ -46,7 +133,7 @@ def _get_points(graph_parse, is_variable, key):
 def _get_all_points(graph_parse, is_variable):
     items = []
     for key in graph_parse.intersection_points.keys():
-        items.extend(_get_points(graph_parse, is_variable, key).iteritems())
+        items.extend(_get_points(graph_parse, is_variable, key).items())
     return dict(items)
 
 
@@ -66,7 +153,7 @@ def _get_all_lines(graph_parse, is_variable):
     assert isinstance(graph_parse, GraphParse)
     items = []
     for a_key, b_key in graph_parse.line_graph.edges():
-        items.extend(_get_lines(graph_parse, is_variable, a_key, b_key).iteritems())
+        items.extend(_get_lines(graph_parse, is_variable, a_key, b_key).items())
     return dict(items)
 
 
@@ -74,7 +161,7 @@ def _get_circles(graph_parse, is_variable, center_key):
     assert isinstance(graph_parse, GraphParse)
     if center_key in graph_parse.circle_dict:
         circles = {}
-        for radius_key, d in graph_parse.circle_dict[center_key].iteritems():
+        for radius_key, d in graph_parse.circle_dict[center_key].items():
             if is_variable:
                 circle = d['variable']
             else:
@@ -89,35 +176,46 @@ def _get_all_circles(graph_parse, is_variable):
     assert isinstance(graph_parse, GraphParse)
     items = []
     for center_key in graph_parse.circle_dict:
-        items.extend(_get_circles(graph_parse, is_variable, center_key).iteritems())
+        items.extend(_get_circles(graph_parse, is_variable, center_key).items())
     return dict(items)
 
 
 def _get_arcs(graph_parse, is_variable, a_key, b_key):
     assert isinstance(graph_parse, GraphParse)
     arcs = {}
-    for circle_key in _get_all_circles(graph_parse, is_variable):
-        if graph_parse.arc_graphs[circle_key].has_edge(a_key, b_key):
-            test_arc = graph_parse.arc_graphs[circle_key][a_key][b_key]['instance']
+    for circle_key in get_instance_catalog(graph_parse).circles(is_variable):
+        arc_graph = graph_parse.arc_graphs[circle_key]
+        if arc_graph.has_edge(a_key, b_key):
+            test_arc = arc_graph[a_key][b_key]['instance']
             circle, a, b = test_arc
             test_angle = instantiators['angle'](a, circle.center, b)
-            if angle_in_radian(test_angle) > np.pi:
-                a_key, b_key = b_key, a_key
+            key0, key1 = a_key, b_key
+            if angle_in_radian(test_angle) > np.pi and arc_graph.has_edge(b_key, a_key):
+                key0, key1 = b_key, a_key
 
             if is_variable:
-                arc = graph_parse.arc_graphs[circle_key][a_key][b_key]['variable']
+                arc = arc_graph[key0][key1]['variable']
             else:
-                arc = graph_parse.arc_graphs[circle_key][a_key][b_key]['instance']
-            arc_key = (circle_key, a_key, b_key)
+                arc = arc_graph[key0][key1]['instance']
+            arc_key = (circle_key, key0, key1)
             arcs[arc_key] = arc
     return arcs
 
 
 def _get_all_arcs(graph_parse, is_variable):
+    """
+    Only point pairs that are edges of some arc graph can have arcs,
+    so these are visited instead of all combinations of intersection points (in the same order).
+    """
     assert isinstance(graph_parse, GraphParse)
+    positions = {key: idx for idx, key in enumerate(graph_parse.intersection_points)}
+    pairs = set()
+    for arc_graph in graph_parse.arc_graphs.values():
+        pairs.update((a_key, b_key) for a_key, b_key in arc_graph.edges()
+                     if a_key in positions and b_key in positions and positions[a_key] < positions[b_key])
     items = []
-    for a_key, b_key in itertools.combinations(graph_parse.intersection_points, 2):
-        items.extend(_get_arcs(graph_parse, is_variable, a_key, b_key).iteritems())
+    for a_key, b_key in sorted(pairs, key=lambda pair: (positions[pair[0]], positions[pair[1]])):
+        items.extend(_get_arcs(graph_parse, is_variable, a_key, b_key).items())
     return dict(items)
 
 
@@ -142,20 +240,7 @@ def _get_polygons(graph_parse, name, is_variable, *args):
 
 def _get_all_polygons(graph_parse, name, n, is_variable):
     polygons = {}
-    frozensets = set()
-    line_graph = graph_parse.line_graph
-    for keys in itertools.permutations(graph_parse.intersection_points, n):
-        if frozenset(keys) in frozensets:
-            continue
-        if not all(line_graph.has_edge(keys[idx-1], key) for idx, key in enumerate(keys)):
-            continue
-
-        angles = []
-        for idx, key in enumerate(keys):
-            angles.extend(_get_angles(graph_parse, False, keys[idx-2], keys[idx-1], key).values())
-        if len(angles) < n:
-            continue
-
+    for keys in _get_polygon_cycles(graph_parse, n):
         convex = polygon_is_convex(tuple(graph_parse.intersection_points[key] for key in keys))
 
         if is_variable:
@@ -168,10 +253,59 @@ def _get_all_polygons(graph_parse, name, n, is_variable):
         polygon = FormulaNode(signatures[name.capitalize()], points)
         polygon_key = tuple(keys)
         polygons[polygon_key] = polygon
-        frozensets.add(frozenset(keys))
     return polygons
 
 
+def _get_polygon_cycles(graph_parse, n):
+    """
+    Simple cycles of length n in the line graph whose angles are all non-trivial, one per vertex set.
+    Found by depth-first search from each start vertex over later vertices only,
+    visiting neighbors in the order of intersection_points.
+    Hence the cycle kept for each vertex set is the first one in itertools.permutations order.
+    Memoized in the instance catalog of graph_parse.
+
+    :param GraphParse graph_parse:
+    :param int n:
+    :return tuple: tuple of tuples of point keys
+    """
+    polygon_cycles = get_instance_catalog(graph_parse).polygon_cycles
+    if n in polygon_cycles:
+        return polygon_cycles[n]
+
+    line_graph = graph_parse.line_graph
+    positions = {key: idx for idx, key in enumerate(graph_parse.intersection_points)}
+    neighbors = {key: sorted((nbr for nbr in line_graph[key] if nbr in positions), key=positions.get)
+                 for key in positions if key in line_graph}
+
+    def is_angle(a_key, b_key, c_key):
+        return len(_get_angles(graph_parse, False, a_key, b_key, c_key)) > 0
+
+    cycles = []
+    frozensets = set()
+
+    def extend(path):
+        if len(path) == n:
+            keys = tuple(path)
+            if frozenset(keys) not in frozensets and path[0] in neighbors[path[-1]] and \
+                    is_angle(path[-2], path[-1], path[0]) and is_angle(path[-1], path[0], path[1]):
+                cycles.append(keys)
+                frozensets.add(frozenset(keys))
+            return
+        for key in neighbors[path[-1]]:
+            if positions[key] <= positions[path[0]] or key in path:
+                continue
+            if len(path) >= 2 and not is_angle(path[-2], path[-1], key):
+                continue
+            path.append(key)
+            extend(path)
+            path.pop()
+
+    for start in neighbors:
+        extend([start])
+
+    polygon_cycles[n] = tuple(cycles)
+    return polygon_cycles[n]
+
 
 def _get_angles(graph_parse, is_variable, a_key, b_key, c_key, ignore_trivial=True):
     assert isinstance(graph_parse, GraphParse)
@@ -214,7 +348,24 @@ def _get_all_angles(graph_parse, is_variable, ignore_trivial=True):
     :return:
     """
     assert isinstance(graph_parse, GraphParse)
+    positions = {key: idx for idx, key in enumerate(graph_parse.intersection_points)}
+    line_graph = graph_parse.line_graph
+    neighbors = {key: sorted((nbr for nbr in line_graph[key] if nbr in positions), key=positions.get)
+                 if key in line_graph else [] for key in positions}
+    # Walks a-b-c paths in the line graph, in the order of itertools.permutations
     items = []
-    for a_key, b_key, c_key in itertools.permutations(graph_parse.intersection_points, 3):
-        items.extend(_get_angles(graph_parse, is_variable, a_key, b_key, c_key, ignore_trivial=ignore_trivial).iteritems())
+    for a_key in positions:
+        for b_key in neighbors[a_key]:
+            for c_key in neighbors[b_key]:
+                if c_key == a_key:
+                    continue
+                items.extend(_get_angles(graph_parse, is_variable, a_key, b_key, c_key,
+                                         ignore_trivial=ignore_trivial).items())
     return dict(items)
+
+
+_polygon_sizes = {'triangle': 3, 'quad': 4, 'hexagon': 6}
+_instance_getters = {'point': _get_points, 'line': _get_lines, 'circle': _get_circles,
+                     'arc': _get_arcs, 'angle': _get_angles}
+_all_instance_getters = {'point': _get_all_points, 'line': _get_all_lines, 'circle': _get_all_circles,
+                         'arc': _get_all_arcs, 'angle': _get_all_angles}
@@ -7,11 +7,10 @@ Exists returns True / False
 import numpy as np
 
 from geosolver.diagram.computational_geometry import line_length, line_unit_vector, distance_between_points, \
-    distance_between_line_and_point, distance_between_arc_and_point, arc_length, distance_between_circle_and_point, \
-    circumference
+    arc_length, circumference
 from geosolver.diagram.states import CoreParse
 from geosolver.ontology.instantiator_definitions import instantiators
-from geosolver.parameters import LINE_EPS
+import geosolver.parameters as params
 
 __author__ = 'minjoon'
 
@@ -25,11 +24,11 @@ def instance_exists(diagram_parse, instance):
 
 def _line_exists(diagram_parse, line):
     # TODO : smarter line_exists function needed (check continuity, etc.)
-    eps = LINE_EPS
+    eps = params.LINE_EPS
     multiplier = 1.0
     assert isinstance(diagram_parse, CoreParse)
     pixels = diagram_parse.primitive_parse.image_segment_parse.diagram_image_segment.pixels
-    near_pixels = set(pixel for pixel in pixels if distance_between_line_and_point(line, pixel) <= eps)
+    near_pixels = pixels.near_line(line, eps)
     length = line_length(line)
     ratio = float(len(near_pixels))/length
     if ratio < multiplier:
@@ -42,7 +41,7 @@ def _arc_exists(diagram_parse, arc):
     multiplier = 1
     assert isinstance(diagram_parse, CoreParse)
     pixels = diagram_parse.primitive_parse.image_segment_parse.diagram_image_segment.pixels
-    near_pixels = set(pixel for pixel in pixels if distance_between_arc_and_point(arc, pixel) <= eps)
+    near_pixels = pixels.near_arc(arc, eps)
     length = arc_length(arc)
     ratio = float(len(near_pixels))/length
     if ratio < multiplier:
@@ -55,7 +54,7 @@ def _circle_exists(diagram_parse, circle):
     multiplier = 2
     assert isinstance(diagram_parse, CoreParse)
     pixels = diagram_parse.primitive_parse.image_segment_parse.diagram_image_segment.pixels
-    near_pixels = set(pixel for pixel in pixels if distance_between_circle_and_point(circle, pixel) <= eps)
+    near_pixels = pixels.near_circle(circle, eps)
     length = circumference(circle)
     if len(near_pixels) < multiplier*length:
         return False
@@ -0,0 +1,267 @@
+"""
+Persistent cache of the stages of the diagram parse:
+parse_image_segments -> parse_primitives -> select_primitives -> parse_core -> parse_graph.
+The key of a stage is a hash of the key of the previous stage and of the parameters the stage reads,
+starting from a hash of the image, so changing a parameter only recomputes the stages from the one that reads it.
+Each stage is stored as plain arrays in one pickle file per key: the segment masks as packed bits,
+the primitives and points as coordinate arrays, and the graphs as the keys of their edges and points.
+Loading a stage rebuilds its state from the state of the previous stage, which is always loaded or computed first.
+"""
+import hashlib
+import os
+import pickle
+import tempfile
+
+import networkx as nx
+import numpy as np
+
+from geosolver import parameters, settings
+from geosolver.diagram.parse_core import parse_core, get_core_parse
+from geosolver.diagram.parse_graph import parse_graph
+from geosolver.diagram.parse_image_segments import parse_image_segments
+from geosolver.diagram.parse_primitives import parse_primitives
+from geosolver.diagram.pixel_store import PixelStore
+from geosolver.diagram.select_primitives import select_primitives, REWARD_WEIGHTS
+from geosolver.diagram.states import ImageSegment, ImageSegmentParse, PrimitiveParse, GraphParse
+from geosolver.ontology.instantiator_definitions import instantiators
+from geosolver.ontology.ontology_definitions import FormulaNode, signatures
+
+__author__ = 'minjoon'
+
+# Bump when a stage or its stored form changes, so that stale entries are not used.
+CACHE_VERSION = 2
+
+
+class DiagramCache(object):
+    def __init__(self, path=None):
+        """
+        :param str path: directory of the entries; if None, nothing is cached
+        """
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+
+    def get_graph_parse(self, image):
+        """
+        :param numpy.ndarray image: grayscale diagram, as returned by utils.prep.open_image
+        :return GraphParse:
+        """
+        key = _get_hash(str(CACHE_VERSION), str(image.dtype), str(image.shape), image.tobytes())
+        state = image
+        for name, stage_parameters, parse, dump, load in _get_stages():
+            key = _get_hash(key, name, repr(stage_parameters))
+            data = self._read(key)
+            if data is None:
+                self.misses += 1
+                state = parse(state)
+                self._write(key, dump(state))
+            else:
+                self.hits += 1
+                state = load(state, data)
+        return state
+
+    def clear(self):
+        if self.path is not None and os.path.exists(self.path):
+            for name in os.listdir(self.path):
+                if name.endswith(".p"):
+                    os.remove(os.path.join(self.path, name))
+
+    def _read(self, key):
+        if self.path is None:
+            return None
+        file_path = os.path.join(self.path, key + ".p")
+        if not os.path.exists(file_path):
+            return None
+        try:
+            with open(file_path, 'rb') as f:
+                return pickle.load(f)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            return None
+
+    def _write(self, key, data):
+        if self.path is None:
+            return
+        if not os.path.exists(self.path):
+            os.makedirs(self.path, exist_ok=True)
+        # Written to a temporary file first, so that a concurrent reader never sees a partial entry
+        fd, temp_path = tempfile.mkstemp(dir=self.path)
+        with os.fdopen(fd, 'wb') as f:
+            pickle.dump(data, f, pickle.HIGHEST_PROTOCOL)
+        os.replace(temp_path, os.path.join(self.path, key + ".p"))
+
+
+_diagram_cache = None
+
+
+def get_diagram_cache():
+    """
+    The cache shared by this process, stored under settings.CACHE_ROOT; if that is None, nothing is cached.
+    """
+    global _diagram_cache
+    if _diagram_cache is None:
+        _diagram_cache = DiagramCache(settings.get_cache_path("diagram_cache"))
+    return _diagram_cache
+
+
+def _get_stages():
+    """
+    Name, parameters read, parse function, dump function and load function of each stage.
+    The parameters are read on each call, so that the keys follow changes made at runtime.
+    """
+    return [
+        ('image_segments', (), parse_image_segments,
+         _dump_image_segment_parse, _load_image_segment_parse),
+        ('primitives', (parameters.hough_line_parameters, parameters.hough_circle_parameters), parse_primitives,
+         _dump_primitive_parse, _load_primitive_parse),
+        ('selected_primitives', (parameters.LINE_EPS, parameters.CIRCLE_EPS, parameters.PRIMITIVE_SELECTION_MIN_GAIN,
+                                 REWARD_WEIGHTS), select_primitives,
+         _dump_primitive_parse, lambda primitive_parse, data: _load_primitive_parse(
+             primitive_parse.image_segment_parse, data)),
+        ('core', (parameters.INTERSECTION_EPS, parameters.KMEANS_RADIUS_THRESHOLD, parameters.KMEANS_MAX_NUM_CLUSTERS,
+                  parameters.CIRCLE_EPS),
+         parse_core, _dump_core_parse, _load_core_parse),
+        ('graph', (parameters.LINE_EPS, parameters.CIRCLE_EPS), parse_graph,
+         _dump_graph_parse, _load_graph_parse),
+    ]
+
+
+def _get_hash(*parts):
+    sha = hashlib.sha1()
+    for part in parts:
+        sha.update(part if isinstance(part, bytes) else part.encode('utf-8'))
+        sha.update(b'\0')
+    return sha.hexdigest()
+
+
+def _dump_image_segment_parse(image_segment_parse):
+    """
+    The original image is not stored, as it is the input of the stage.
+    The segments are stored as their offset and mask, from which the segmented images are rebuilt.
+    """
+    segments = [image_segment_parse.diagram_image_segment] + list(image_segment_parse.label_image_segments.values())
+    return [(segment.key, segment.offset.x, segment.offset.y, segment.shape,
+             np.packbits(segment.pixels.mask), np.packbits(segment.binarized_segmented_image > 0))
+            for segment in segments]
+
+
+def _load_image_segment_parse(image, data):
+    segments = []
+    for key, x, y, shape, mask_bits, binarized_bits in data:
+        size = shape[0] * shape[1]
+        mask = np.unpackbits(mask_bits, count=size).reshape(shape).astype(bool)
+        binarized_image = np.unpackbits(binarized_bits, count=size).reshape(shape) * np.uint8(255)
+        sliced_image = image[y:y+shape[0], x:x+shape[1]]
+        segmented_image = 255 - (255 - sliced_image) * mask
+        offset = instantiators['point'](x, y)
+        segments.append(ImageSegment(segmented_image, sliced_image, binarized_image, PixelStore.from_mask(mask),
+                                     offset, key))
+    label_segments = {segment.key: segment for segment in segments[1:]}
+    return ImageSegmentParse(image, segments[0], label_segments)
+
+
+def _dump_primitive_parse(primitive_parse):
+    """
+    Line end points are pixels (int), and circles are as detected by cv2.HoughCircles (float32).
+    """
+    lines = primitive_parse.lines
+    circles = primitive_parse.circles
+    line_array = np.array([(line.a.x, line.a.y, line.b.x, line.b.y) for line in lines.values()],
+                          dtype=np.int32).reshape(-1, 4)
+    circle_array = np.array([(circle.center.x, circle.center.y, circle.radius) for circle in circles.values()],
+                            dtype=np.float32).reshape(-1, 3)
+    return list(lines), line_array, list(circles), circle_array
+
+
+def _load_primitive_parse(image_segment_parse, data):
+    line_keys, line_array, circle_keys, circle_array = data
+    lines = {key: instantiators['line'](instantiators['point'](ax, ay), instantiators['point'](bx, by))
+             for key, (ax, ay, bx, by) in zip(line_keys, line_array.tolist())}
+    circles = {key: _get_circle(row) for key, row in zip(circle_keys, circle_array)}
+    return PrimitiveParse(image_segment_parse, lines, circles)
+
+
+def _get_circle(row):
+    return instantiators['circle'](instantiators['point'](row[0], row[1]), row[2])
+
+
+def _dump_core_parse(core_parse):
+    """
+    Intersection points are float64, except for the line end points added as they are (int).
+    """
+    points = core_parse.intersection_points
+    point_array = np.array([(point.x, point.y) for point in points.values()], dtype=float).reshape(-1, 2)
+    pixel_mask = np.array([isinstance(point.x, int) for point in points.values()], dtype=bool)
+    circle_keys = [(center_key, radius_key) for center_key, d in core_parse.circles.items() for radius_key in d]
+    circle_array = np.array([(circle.center.x, circle.center.y, circle.radius)
+                             for d in core_parse.circles.values() for circle in d.values()],
+                            dtype=np.float32).reshape(-1, 3)
+    return list(points), point_array, pixel_mask, circle_keys, circle_array
+
+
+def _load_core_parse(primitive_parse, data):
+    point_keys, point_array, pixel_mask, circle_keys, circle_array = data
+    intersections = {}
+    for key, row, is_pixel in zip(point_keys, point_array, pixel_mask):
+        if is_pixel:
+            row = [int(value) for value in row]
+        intersections[key] = instantiators['point'](row[0], row[1])
+    circles = {}
+    for (center_key, radius_key), row in zip(circle_keys, circle_array):
+        circles.setdefault(center_key, {})[radius_key] = _get_circle(row)
+    return get_core_parse(primitive_parse, intersections, circles)
+
+
+def _dump_graph_parse(graph_parse):
+    """
+    Edges are stored in the order parse_graph adds them, i.e. of their end points in intersection_points,
+    so that the rebuilt graphs iterate in the same order.
+    The instances and variables of the edges are rebuilt from their end points.
+    """
+    positions = {key: idx for idx, key in enumerate(graph_parse.intersection_points)}
+    circle_points = [(center_key, radius_key, list(graph_parse.circle_dict[center_key][radius_key]['points']))
+                     for center_key, d in graph_parse.circle_dict.items() for radius_key in d]
+    line_edges = []
+    for key0, key1 in graph_parse.line_graph.edges():
+        if positions[key0] > positions[key1]:
+            key0, key1 = key1, key0
+        line_edges.append((key0, key1, list(graph_parse.line_graph[key0][key1]['points'])))
+    line_edges.sort(key=lambda edge: (positions[edge[0]], positions[edge[1]]))
+    arc_edges = {}
+    for circle_key, arc_graph in graph_parse.arc_graphs.items():
+        edges = [(key0, key1, list(data['points'])) for key0, key1, data in arc_graph.edges(data=True)]
+        arc_edges[circle_key] = sorted(edges, key=lambda edge: (positions[edge[0]], positions[edge[1]]))
+    return circle_points, line_edges, arc_edges
+
+
+def _load_graph_parse(core_parse, data):
+    circle_points, line_edges, arc_edges = data
+    points = core_parse.intersection_points
+    point_variables = core_parse.point_variables
+
+    circle_dict = {}
+    for center_key, radius_key, point_keys in circle_points:
+        center_var = point_variables[center_key]
+        radius_var = core_parse.radius_variables[center_key][radius_key]
+        circle_var = FormulaNode(signatures['Circle'], [center_var, radius_var])
+        circle_dict.setdefault(center_key, {})[radius_key] = {'instance': core_parse.circles[center_key][radius_key],
+                                                              'points': {key: points[key] for key in point_keys},
+                                                              'variable': circle_var}
+
+    line_graph = nx.Graph()
+    for key0, key1, point_keys in line_edges:
+        line = instantiators['line'](points[key0], points[key1])
+        var = FormulaNode(signatures['Line'], [point_variables[key0], point_variables[key1]])
+        line_graph.add_edge(key0, key1, instance=line, points={key: points[key] for key in point_keys}, variable=var)
+
+    arc_graphs = {}
+    for (center_key, radius_key), edges in arc_edges.items():
+        circle = circle_dict[center_key][radius_key]['instance']
+        circle_variable = circle_dict[center_key][radius_key]['variable']
+        arc_graph = nx.DiGraph()
+        for key0, key1, point_keys in edges:
+            arc = instantiators['arc'](circle, points[key0], points[key1])
+            var = FormulaNode(signatures['Arc'], [circle_variable, point_variables[key0], point_variables[key1]])
+            arc_graph.add_edge(key0, key1, instance=arc, points={key: points[key] for key in point_keys}, variable=var)
+        arc_graphs[(center_key, radius_key)] = arc_graph
+
+    return GraphParse(core_parse, line_graph, circle_dict, arc_graphs)
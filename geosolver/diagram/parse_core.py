@@ -1,10 +1,10 @@
-from sklearn.cluster import KMeans
 import itertools
 import numpy as np
+from geosolver.diagram.cluster_points import cluster_points
 from geosolver.diagram.states import PrimitiveParse, CoreParse
 from geosolver.ontology.instantiator_definitions import instantiators
-from geosolver.diagram.computational_geometry import intersections_between_lines, intersections_between_circle_and_line, \
-    intersections_between_circles, distance_between_points
+from geosolver.diagram.computational_geometry import intersections_between_lines_batch, \
+    intersections_between_circles_and_lines_batch, distance_between_points
 import geosolver.parameters as params
 from geosolver.ontology.ontology_definitions import VariableSignature, FormulaNode
 
@@ -23,15 +23,32 @@ def parse_core(primitive_parse):
     print(f"Debug: {len(valid_intersections)} valid intersections after filtering")
     
     # Step 3: Improved clustering
-    clustered_intersections = _cluster_intersections_improved(valid_intersections, params.KMEANS_RADIUS_THRESHOLD)
+    clustered_intersections = _cluster_intersections_improved(valid_intersections, params.KMEANS_RADIUS_THRESHOLD,
+                                                              params.KMEANS_MAX_NUM_CLUSTERS)
     print(f"Debug: {len(clustered_intersections)} points after clustering")
     
     # Step 4: Ensure line endpoints are preserved
     final_intersections = _add_missing_line_endpoints(clustered_intersections, primitive_parse)
     print(f"Debug: {len(final_intersections)} final points after adding endpoints")
     
-    # Step 5: Create point variables and assignments
     intersections = dict(enumerate(final_intersections))
+
+    # Step 5: Get circles
+    circles = _get_circles(primitive_parse, intersections)
+
+    return get_core_parse(primitive_parse, intersections, circles)
+
+
+def get_core_parse(primitive_parse, intersections, circles):
+    """
+    Creates the point and radius variables of the intersections and circles, and their assignment.
+
+    :param PrimitiveParse primitive_parse:
+    :param dict intersections: points by index
+    :param dict circles: circles by center point index and radius index
+    :return CoreParse:
+    """
+    # Create point variables and assignments
     assignment = {}
     point_variables = {}
     for idx in intersections.keys():
@@ -39,11 +56,8 @@ def parse_core(primitive_parse):
         vs = VariableSignature(id_, 'point')
         point_variables[idx] = FormulaNode(vs, [])
         assignment[id_] = intersections[idx]
-    
-    # Step 6: Get circles
-    circles = _get_circles(primitive_parse, intersections)
-    
-    # Step 7: Create radius variables
+
+    # Create radius variables
     radius_variables = {}
     for point_idx, d in circles.items():
         radius_variables[point_idx] = {}
@@ -61,15 +75,22 @@ def _get_all_intersections_with_line_extensions(primitive_parse, eps):
     """Get intersections including extended line intersections"""
     assert isinstance(primitive_parse, PrimitiveParse)
 
+    lines = _lines_to_array(primitive_parse.lines.values())
+    circles = _circles_to_array(primitive_parse.circles.values())
+    line_points, line_mask = intersections_between_lines_batch(lines, eps)
+    circle_points, circle_mask = intersections_between_circles_and_lines_batch(circles, lines, eps)
+
+    # Get intersections between primitive pairs, in the order of the pairs.
+    # Lines precede circles in primitive_parse.primitives, and circles do not intersect each other.
+    valid_mask = _is_within_image_bounds(line_points, primitive_parse)
+    circle_valid_mask = _is_within_image_bounds(circle_points, primitive_parse)
     intersections = []
-    
-    # Get intersections between primitive pairs
-    primitives_list = list(primitive_parse.primitives.values())
-    for i, pr0 in enumerate(primitives_list):
-        for j, pr1 in enumerate(primitives_list[i+1:], i+1):
-            candidate_intersections = _get_intersections_between_primitives(pr0, pr1, eps)
-            valid_candidates = _validate_intersection_points(candidate_intersections, primitive_parse)
-            intersections.extend(valid_candidates)
+    upper = np.triu(np.ones(line_mask.shape, dtype=bool), 1)
+    for idx in range(len(lines)):
+        row_mask = line_mask[idx] & valid_mask[idx] & upper[idx]
+        column_mask = circle_mask[:, idx] & circle_valid_mask[:, idx]
+        intersections.extend(_array_to_points(line_points[idx][row_mask]))
+        intersections.extend(_array_to_points(circle_points[:, idx][column_mask]))
 
     # Add line endpoints
     for line in primitive_parse.lines.values():
@@ -82,95 +103,76 @@ def _get_all_intersections_with_line_extensions(primitive_parse, eps):
             intersections.append(circle.center)
     
     # NEW: Add extended line-to-line intersections
-    extended_intersections = _get_extended_line_intersections(primitive_parse, eps)
+    extended_intersections = _get_extended_line_intersections(lines, line_mask, eps)
     intersections.extend(extended_intersections)
     print(f"Debug: Added {len(extended_intersections)} extended line intersections")
 
     return intersections
 
 
-def _get_extended_line_intersections(primitive_parse, eps):
-    """Find intersections between extended lines that don't currently intersect"""
-    intersections = []
-    lines = list(primitive_parse.lines.values())
-    
-    for i, line1 in enumerate(lines):
-        for j, line2 in enumerate(lines[i+1:], i+1):
-            # Check if lines already intersect within their segments
-            existing_intersections = intersections_between_lines(line1, line2, eps)
-            if existing_intersections:
-                continue  # Skip if lines already intersect
-            
-            # Create extended versions of the lines
-            extended_line1 = _extend_line_infinitely(line1)
-            extended_line2 = _extend_line_infinitely(line2)
-            
-            # Find intersection of extended lines
-            try:
-                extended_intersections = intersections_between_lines(extended_line1, extended_line2, eps)
-                
-                for intersection in extended_intersections:
-                    # Check if this intersection is beyond at least one of the original line segments
-                    beyond_line1 = _is_point_beyond_line_segment(intersection, line1)
-                    beyond_line2 = _is_point_beyond_line_segment(intersection, line2)
-                    
-                    if beyond_line1 or beyond_line2:
-                        intersections.append(intersection)
-                        print(f"Debug: Found extended intersection at ({intersection.x:.1f}, {intersection.y:.1f})")
-            except Exception as e:
-                print(f"Warning: Failed to find extended intersection: {e}")
-                continue
-    
-    return intersections
+def _get_extended_line_intersections(lines, line_mask, eps):
+    """
+    Find intersections between extended lines that don't currently intersect
 
+    :param numpy.ndarray lines: (L,4) array of the lines
+    :param numpy.ndarray line_mask: (L,L) mask of the lines that intersect within their segments
+    """
+    extended_points, extended_mask = intersections_between_lines_batch(_extend_lines_infinitely(lines), eps)
+    # Keep intersections beyond at least one of the original line segments
+    beyond = _is_beyond_line_segments(extended_points, lines[:, np.newaxis, :]) | \
+        _is_beyond_line_segments(extended_points, lines[np.newaxis, :, :])
+    mask = extended_mask & ~line_mask & beyond
+    mask &= np.triu(np.ones(mask.shape, dtype=bool), 1)
+    return _array_to_points(extended_points[mask])
 
-def _extend_line_infinitely(line):
-    """Create a very long line from the given line segment"""
-    # Calculate direction vector
-    dx = line.b.x - line.a.x
-    dy = line.b.y - line.a.y
-    length = np.sqrt(dx*dx + dy*dy)
-    
-    if length == 0:
-        return line
-    
-    # Normalize direction
-    dx_norm = dx / length
-    dy_norm = dy / length
-    
-    # Extend by a very large distance
+
+def _extend_lines_infinitely(lines):
+    """Create very long lines from the given (L,4) array of line segments"""
+    a = lines[:, 0:2]
+    b = lines[:, 2:4]
+    length = np.hypot(*(b - a).T)[:, np.newaxis]
+
+    # Extend by a very large distance; degenerate lines are left as they are
     extension = 5000  # Large enough for most diagram contexts
-    
-    # Create new extended endpoints
-    new_a_x = line.a.x - dx_norm * extension
-    new_a_y = line.a.y - dy_norm * extension
-    new_b_x = line.b.x + dx_norm * extension
-    new_b_y = line.b.y + dy_norm * extension
-    
-    new_a = instantiators['point'](new_a_x, new_a_y)
-    new_b = instantiators['point'](new_b_x, new_b_y)
-    
-    return instantiators['line'](new_a, new_b)
+    direction = np.where(length == 0, 0, (b - a) / np.where(length == 0, 1, length))
+    return np.hstack((a - direction*extension, b + direction*extension))
 
 
-def _is_point_beyond_line_segment(point, line_segment):
-    """Check if a point lies beyond the endpoints of a line segment"""
+def _is_beyond_line_segments(points, lines):
+    """
+    Check if the points lie beyond the endpoints of the line segments, element-wise.
+
+    :param numpy.ndarray points: (...,2) array of points
+    :param numpy.ndarray lines: (...,4) array of line segments, broadcastable to the points
+    """
+    a = lines[..., 0:2]
+    d = lines[..., 2:4] - a
+    dx, dy = d[..., 0], d[..., 1]
+
     # Calculate parameter t for point on line: point = line.a + t * (line.b - line.a)
-    dx = line_segment.b.x - line_segment.a.x
-    dy = line_segment.b.y - line_segment.a.y
-    
-    # Handle degenerate case
-    if abs(dx) < 1e-10 and abs(dy) < 1e-10:
-        return False
-    
-    if abs(dx) > abs(dy):
-        t = (point.x - line_segment.a.x) / dx if abs(dx) > 1e-10 else 0
-    else:
-        t = (point.y - line_segment.a.y) / dy if abs(dy) > 1e-10 else 0
-    
+    # along the dominant axis; degenerate lines are never exceeded
+    use_x = np.abs(dx) > np.abs(dy)
+    delta = np.where(use_x, dx, dy)
+    offset = np.where(use_x, points[..., 0] - a[..., 0], points[..., 1] - a[..., 1])
+    degenerate = np.abs(delta) <= 1e-10
+    t = np.where(degenerate, 0, offset / np.where(degenerate, 1, delta))
+
     # Point is beyond the segment if t < 0 or t > 1
     # Use small tolerance for numerical errors
-    return t < -0.05 or t > 1.05
+    return ~degenerate & ((t < -0.05) | (t > 1.05))
+
+
+def _lines_to_array(lines):
+    return np.array([(line.a.x, line.a.y, line.b.x, line.b.y) for line in lines], dtype=float).reshape(-1, 4)
+
+
+def _circles_to_array(circles):
+    return np.array([(circle.center.x, circle.center.y, circle.radius) for circle in circles],
+                    dtype=float).reshape(-1, 3)
+
+
+def _array_to_points(array):
+    return [instantiators['point'](x, y) for x, y in array]
 
 
 def _add_missing_line_endpoints(clustered_points, primitive_parse):
@@ -197,11 +199,8 @@ def _is_point_near_any(target_point, point_list, tolerance):
     return False
 
 
-# Keep all the original functions unchanged
-def _validate_intersection_points(intersections, primitive_parse):
-    """Filter out clearly invalid intersection points"""
-    valid_intersections = []
-    
+def _is_within_image_bounds(points, primitive_parse):
+    """Mask out clearly invalid intersection points in a (...,2) array"""
     # Get image bounds if available
     try:
         image_segment = primitive_parse.image_segment_parse.diagram_image_segment
@@ -211,14 +210,10 @@ def _validate_intersection_points(intersections, primitive_parse):
         # If we can't get image bounds, use a large bounding box
         height, width = 1000, 1000
         margin = 300
-    
-    for intersection in intersections:
-        # Check if point is within reasonable image bounds
-        if (-margin <= intersection.x <= width + margin and 
-            -margin <= intersection.y <= height + margin):
-            valid_intersections.append(intersection)
-    
-    return valid_intersections
+
+    # Check if point is within reasonable image bounds
+    x, y = points[..., 0], points[..., 1]
+    return (-margin <= x) & (x <= width + margin) & (-margin <= y) & (y <= height + margin)
 
 
 def _is_significant_endpoint(line, primitive_parse):
@@ -304,100 +299,10 @@ def _filter_valid_intersections(intersections, primitive_parse):
     return valid_intersections
 
 
-def _cluster_intersections_improved(intersections, radius_threshold):
-    """Improved clustering that's more robust and efficient"""
-    if len(intersections) == 0:
-        return []
-    
-    if len(intersections) == 1:
-        return [instantiators['point'](intersections[0].x, intersections[0].y)]
-    
-    # Convert to numpy array for easier processing
-    points_array = np.array([[p.x, p.y] for p in intersections])
-    
-    # Use a more sophisticated approach to determine the number of clusters
-    optimal_k = _find_optimal_clusters(points_array, radius_threshold)
-    
-    if optimal_k == 1:
-        # All points should be in one cluster
-        center_x = np.mean(points_array[:, 0])
-        center_y = np.mean(points_array[:, 1])
-        return [instantiators['point'](center_x, center_y)]
-    
-    # Perform K-means with optimal number of clusters
-    kmeans = KMeans(n_clusters=optimal_k, random_state=42, n_init=10)
-    assignments = kmeans.fit_predict(points_array)
-    
-    # Create cluster centers
-    centers = []
-    for cluster_idx in range(optimal_k):
-        cluster_points = points_array[assignments == cluster_idx]
-        if len(cluster_points) > 0:
-            center_x = np.mean(cluster_points[:, 0])
-            center_y = np.mean(cluster_points[:, 1])
-            centers.append(instantiators['point'](center_x, center_y))
-    
-    return centers
-
-
-def _find_optimal_clusters(points_array, radius_threshold):
-    """Find optimal number of clusters using the radius threshold constraint"""
-    n_points = len(points_array)
-    
-    if n_points <= 1:
-        return 1
-    
-    # Try different numbers of clusters
-    for k in range(1, min(n_points + 1, 20)):
-        kmeans = KMeans(n_clusters=k, random_state=42, n_init=10)
-        assignments = kmeans.fit_predict(points_array)
-        
-        # Check if all clusters satisfy the radius threshold
-        all_clusters_valid = True
-        for cluster_idx in range(k):
-            cluster_points = points_array[assignments == cluster_idx]
-            if len(cluster_points) > 1:
-                # Calculate radius of this cluster
-                center = np.mean(cluster_points, axis=0)
-                max_distance = np.max([np.linalg.norm(point - center) for point in cluster_points])
-                
-                if max_distance > radius_threshold:
-                    all_clusters_valid = False
-                    break
-        
-        if all_clusters_valid:
-            return k
-    
-    # If no valid clustering found, return number of points
-    return min(n_points, 20)
-
-
-def _get_intersections_between_primitives(obj0, obj1, eps):
-    """Intersections between two primitives with additional validation"""
-    is_line0 = isinstance(obj0, instantiators['line'])
-    is_circle0 = isinstance(obj0, instantiators['circle'])
-    is_line1 = isinstance(obj1, instantiators['line'])
-    is_circle1 = isinstance(obj1, instantiators['circle'])
-    
-    try:
-        if is_line0 and is_line1:
-            intersections = intersections_between_lines(obj0, obj1, eps)
-        elif is_line0 and is_circle1:
-            intersections = intersections_between_circle_and_line(obj1, obj0, eps)
-        elif is_circle0 and is_line1:
-            intersections = intersections_between_circle_and_line(obj0, obj1, eps)
-        elif is_circle0 and is_circle1:
-            intersections = intersections_between_circles(obj0, obj1)
-        else:
-            return []
-        
-        # Filter out any None or invalid intersections
-        valid_intersections = [p for p in intersections if p is not None]
-        return valid_intersections
-        
-    except Exception as e:
-        print(f"Warning: Failed to calculate intersection between primitives: {e}")
-        return []
+def _cluster_intersections_improved(intersections, radius_threshold, max_num_clusters):
+    """Cluster nearby intersections into single points with radius-bounded clustering"""
+    points_array = np.array([[p.x, p.y] for p in intersections], dtype=float).reshape(-1, 2)
+    return _array_to_points(cluster_points(points_array, radius_threshold, max_num_clusters))
 
 
 def _get_circles(primitive_parse, intersection_points):
@@ -6,7 +6,7 @@ from geosolver.diagram.computational_geometry import distance_between_line_and_p
 from geosolver.diagram.instance_exists import instance_exists
 from geosolver.diagram.states import CoreParse, GraphParse
 from geosolver.ontology.instantiator_definitions import instantiators
-from geosolver.parameters import LINE_EPS, CIRCLE_EPS
+import geosolver.parameters as params
 from geosolver.ontology.ontology_definitions import FormulaNode, signatures
 
 __author__ = 'minjoon'
@@ -37,7 +37,7 @@ def _get_circle_dict(core_parse):
     :return:
     """
     # FIXME : this needs to be changed
-    eps = CIRCLE_EPS
+    eps = params.CIRCLE_EPS
     assert isinstance(core_parse, CoreParse)
     circle_dict = {}
 
@@ -69,7 +69,7 @@ def _get_line_graph(core_parse):
     :param eps:
     :return:
     """
-    eps = LINE_EPS
+    eps = params.LINE_EPS
     line_graph = nx.Graph()
 
     for key0, key1 in itertools.combinations(core_parse.intersection_points, 2):
@@ -95,7 +95,7 @@ def _get_arc_graph(core_parse, circle, circle_variable, circle_points):
     :param circle:
     :return:
     """
-    eps = CIRCLE_EPS
+    eps = params.CIRCLE_EPS
     arc_graph = nx.DiGraph()
     for key0, key1 in itertools.permutations(circle_points, 2):
         p0, p1 = circle_points[key0], circle_points[key1]
@@ -2,6 +2,7 @@ from scipy import ndimage
 import cv2
 import numpy as np
 
+from geosolver.diagram.pixel_store import PixelStore
 from geosolver.diagram.states import ImageSegment, ImageSegmentParse
 from geosolver.ontology.instantiator_definitions import instantiators
 
@@ -35,7 +36,7 @@ def _get_image_segments(image, kernel, block_size, c):
         sliced_image = image[slice_]
         boolean_array = labeled[slice_] == (idx+1)
         segmented_image = 255- (255-sliced_image) * boolean_array
-        pixels = set(instantiators['point'](x, y) for x, y in np.transpose(np.nonzero(np.transpose(boolean_array))))
+        pixels = PixelStore.from_mask(boolean_array)
         binarized_segmented_image = cv2.adaptiveThreshold(segmented_image, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C,
                                                           cv2.THRESH_BINARY_INV, block_size, c)
 
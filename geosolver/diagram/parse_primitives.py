@@ -2,10 +2,8 @@ import cv2
 import numpy as np
 
 from geosolver.diagram.states import ImageSegmentParse, PrimitiveParse
-from geosolver.diagram.computational_geometry import dot_distance_between_points
 from geosolver.ontology.instantiator_definitions import instantiators
-from geosolver.parameters import hough_line_parameters as line_params
-from geosolver.parameters import hough_circle_parameters as circle_params
+from geosolver import parameters
 from geosolver.utils.num import dimension_wise_non_maximum_suppression
 
 __author__ = 'minjoon'
@@ -13,8 +11,8 @@ __author__ = 'minjoon'
 def parse_primitives(image_segment_parse):
     assert isinstance(image_segment_parse, ImageSegmentParse)
     diagram_segment = image_segment_parse.diagram_image_segment
-    lines = _get_lines(diagram_segment, line_params)
-    circles = _get_circles(diagram_segment, circle_params)
+    lines = _get_lines(diagram_segment, parameters.hough_line_parameters)
+    circles = _get_circles(diagram_segment, parameters.hough_circle_parameters)
     line_dict = {idx: line for idx, line in enumerate(lines)}
     circle_dict = {idx+len(lines): circle for idx, circle in enumerate(circles)}
     primitive_parse = PrimitiveParse(image_segment_parse, line_dict, circle_dict)
@@ -61,13 +59,13 @@ def _get_circles(image_segment, params):
 
 def _segment_line(image_segment, rho_theta_pair, params):
     lines = []
-    near_pixels = _get_pixels_near_rho_theta_pair(image_segment.pixels, rho_theta_pair, params.eps)
-    if len(near_pixels) == 0:
+    near_indices = image_segment.pixels.near_rho_theta_pair(rho_theta_pair, params.eps)
+    if len(near_indices) == 0:
         return lines
 
+    near_pixels = image_segment.pixels.get_points(near_indices)
     reference_pixel = near_pixels[0]
-    distances = [dot_distance_between_points(_rho_theta_pair_unit_vector(rho_theta_pair), p, reference_pixel)
-                 for p in near_pixels]
+    distances = np.dot(near_pixels - reference_pixel, _rho_theta_pair_unit_vector(rho_theta_pair))
     order = np.argsort(distances)
     start_idx = None
     end_idx = None
@@ -82,8 +80,8 @@ def _segment_line(image_segment, rho_theta_pair, params):
             if abs(d0-d1) > params.max_gap or order_idx == len(order) - 1:
                 length = abs(distances[start_idx] - distances[end_idx])
                 if length > params.min_length:
-                    p0 = near_pixels[start_idx]
-                    p1 = near_pixels[end_idx]
+                    p0 = instantiators['point'](*near_pixels[start_idx].tolist())
+                    p1 = instantiators['point'](*near_pixels[end_idx].tolist())
                     line = instantiators['line'](p0, p1)
                     lines.append(line)
                 start_idx = None
@@ -93,18 +91,6 @@ def _segment_line(image_segment, rho_theta_pair, params):
     return lines
 
 
-def _get_pixels_near_rho_theta_pair(pixels, rho_theta_pair, eps):
-    near_pixels = [pixel for pixel in pixels
-                   if _distance_between_rho_theta_pair_and_point(rho_theta_pair, pixel) <= eps]
-    return near_pixels
-
-
-def _distance_between_rho_theta_pair_and_point(rho_theta_pair, point):
-    rho, theta = rho_theta_pair
-    x, y = point
-    return abs(rho - x*np.cos(theta) - y*np.sin(theta))
-
-
 def _rho_theta_pair_unit_vector(rho_theta_pair):
     _, theta = rho_theta_pair
     return tuple([np.sin(theta), -np.cos(theta)])
@@ -0,0 +1,118 @@
+"""
+Array-backed storage of the pixels of an image segment.
+Proximity queries return index arrays into PixelStore.points instead of sets of point tuples.
+
+Queries go through a uniform grid over the pixels, built on the first query.
+Only pixels in cells that can contain a match are tested exactly,
+so the cost scales with the number of pixels near the queried shape rather than the whole segment.
+"""
+import numpy as np
+
+from geosolver.diagram.computational_geometry import distances_between_line_and_points, \
+    distances_between_circle_and_points, distances_between_arc_and_points, distances_between_points
+from geosolver.ontology.instantiator_definitions import instantiators
+
+__author__ = 'minjoon'
+
+
+class PixelStore(object):
+    def __init__(self, points, mask=None, cell_size=8):
+        """
+        :param numpy.ndarray points: (N,2) array of x, y pixel coordinates
+        :param numpy.ndarray mask: optional boolean image (indexed by [y, x]) of the same pixels
+        :param int cell_size: side length of the grid cells of the spatial index
+        :return:
+        """
+        self.points = np.asarray(points, dtype=np.int32).reshape(-1, 2)
+        self.mask = mask
+        self.cell_size = cell_size
+        self._grid = None
+
+    @classmethod
+    def from_mask(cls, mask, **kwargs):
+        points = np.argwhere(np.transpose(mask))
+        return cls(points, mask, **kwargs)
+
+    def __len__(self):
+        return len(self.points)
+
+    def __iter__(self):
+        for x, y in self.points:
+            yield instantiators['point'](int(x), int(y))
+
+    def get_points(self, indices):
+        return self.points[indices]
+
+    def near_point(self, point, eps):
+        return self._near(distances_between_points, point, eps)
+
+    def near_line(self, line, eps):
+        return self._near(distances_between_line_and_points, line, eps)
+
+    def near_circle(self, circle, eps):
+        return self._near(distances_between_circle_and_points, circle, eps)
+
+    def near_arc(self, arc, eps):
+        """
+        The arc distance jumps at the ends of the arc, so cells are selected by the circle
+        and end point distances instead: a pixel near the arc is near one of them.
+        """
+        grid = self._get_grid()
+        threshold = eps + grid.radius
+        cell_mask = (distances_between_circle_and_points(arc.circle, grid.centers) <= threshold) | \
+                    (distances_between_points(arc.a, grid.centers) <= threshold) | \
+                    (distances_between_points(arc.b, grid.centers) <= threshold)
+        candidates = grid.candidates(cell_mask)
+        distances = distances_between_arc_and_points(arc, self.points[candidates])
+        return np.sort(candidates[distances <= eps])
+
+    def near_rho_theta_pair(self, rho_theta_pair, eps):
+        """
+        Pixels near the infinite line given in Hough (rho, theta) form.
+        """
+        return self._near(_distances_between_rho_theta_pair_and_points, rho_theta_pair, eps)
+
+    def _near(self, distances_function, shape, eps):
+        """
+        distances_function must be 1-Lipschitz in the point,
+        so that a cell can only contain a match if its center is within eps + cell radius.
+        """
+        grid = self._get_grid()
+        cell_mask = distances_function(shape, grid.centers) <= eps + grid.radius
+        candidates = grid.candidates(cell_mask)
+        distances = distances_function(shape, self.points[candidates])
+        return np.sort(candidates[distances <= eps])
+
+    def _get_grid(self):
+        if self._grid is None:
+            self._grid = _PixelGrid(self.points, self.cell_size)
+        return self._grid
+
+
+class _PixelGrid(object):
+    """
+    Pixels bucketed by grid cell, stored in CSR form.
+    Only occupied cells are kept.
+    """
+    def __init__(self, points, cell_size):
+        cells = points // cell_size
+        num_columns = int(cells[:, 0].max()) + 1 if len(cells) > 0 else 1
+        keys = cells[:, 1].astype(np.int64) * num_columns + cells[:, 0]
+        self.order = np.argsort(keys, kind='stable')
+        cell_keys, self.starts, self.counts = np.unique(keys[self.order], return_index=True, return_counts=True)
+        offset = (cell_size - 1) / 2.0
+        self.centers = np.column_stack((cell_keys % num_columns * cell_size + offset,
+                                        cell_keys // num_columns * cell_size + offset))
+        self.radius = offset * np.sqrt(2)
+
+    def candidates(self, cell_mask):
+        starts = self.starts[cell_mask]
+        counts = self.counts[cell_mask]
+        ends = np.cumsum(counts)
+        offsets = np.repeat(starts - ends + counts, counts) + np.arange(ends[-1] if len(ends) > 0 else 0)
+        return self.order[offsets]
+
+
+def _distances_between_rho_theta_pair_and_points(rho_theta_pair, points):
+    rho, theta = rho_theta_pair
+    return np.abs(rho - points[:, 0]*np.cos(theta) - points[:, 1]*np.sin(theta))
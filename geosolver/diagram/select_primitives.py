@@ -1,17 +1,22 @@
+import heapq
 import logging
 
 import numpy as np
 
 from geosolver.diagram.states import PrimitiveParse
-from geosolver.diagram.computational_geometry import line_length, circumference, \
-    distance_between_circle_and_point, midpoint, line_unit_vector, line_normal_vector, \
-    distance_between_points_squared, distance_between_line_and_point
+from geosolver.diagram.computational_geometry import circumference, distance_between_circle_and_point, \
+    distance_between_line_and_point
 from geosolver.ontology.instantiator_definitions import instantiators
 import geosolver.parameters as params
 
 
 __author__ = 'minjoon'
 
+# Weights of coverage, pixel number, length sum, coherence and end pixel number in the reward.
+REWARD_WEIGHTS = [1, -0.1, -0.7, 0, 0.1]
+# Gains closer than this to the largest one are compared by their exact reward, to break ties as max() does.
+GAIN_TIE_EPS = 1e-6
+
 
 def select_primitives(primitive_parse):
     assert isinstance(primitive_parse, PrimitiveParse)
@@ -20,21 +25,7 @@ def select_primitives(primitive_parse):
         return primitive_parse
     pixels_dict = _get_pixels_dict(primitive_parse,
                                    params.LINE_EPS, params.CIRCLE_EPS)
-    selected_primitives = {}
-    remaining_primitives = primitive_parse.primitives.copy()
-    reward = 0
-    while len(remaining_primitives) > 0:
-        key = _get_next_primitive_key(selected_primitives, remaining_primitives, pixels_dict)
-        updated_selected_primitives = selected_primitives.copy()
-        updated_selected_primitives[key] = remaining_primitives[key]
-        new_reward = _evaluate_reward(updated_selected_primitives, pixels_dict)
-        if new_reward - reward > params.PRIMITIVE_SELECTION_MIN_GAIN:
-            selected_primitives = updated_selected_primitives
-            del remaining_primitives[key]
-            reward = new_reward
-        else:
-            break
-
+    selected_primitives = _select_greedily(primitive_parse.primitives, pixels_dict)
     new_primitive_parse = _get_primitive_parse(primitive_parse.image_segment_parse, selected_primitives)
     return new_primitive_parse
 
@@ -46,9 +37,79 @@ def _get_primitive_parse(segment_parse, primitives):
     return PrimitiveParse(segment_parse, lines, circles)
 
 
-def _get_next_primitive_key(selected_primitives, remaining_primitives, pixels_dict):
-    return max(remaining_primitives.items(),
-               key=lambda p: _evaluate_reward({**selected_primitives, p[0]: p[1]}, pixels_dict))[0]
+def _select_greedily(primitives, pixels_dict):
+    """
+    Greedily adds the primitive with the largest reward gain until no gain exceeds the minimum.
+    Equivalent to maximizing _evaluate_reward at each step, but evaluated incrementally:
+    covered pixels are kept in bitmaps, and since the coverage terms are submodular,
+    stale gains are upper bounds and only the top of the priority queue is re-evaluated (lazy greedy).
+    The reward of each candidate is computed from the same terms as _evaluate_reward, and the candidates
+    within GAIN_TIE_EPS of the top are compared by it, so that ties are broken exactly as max() does.
+
+    :param dict primitives:
+    :param dict pixels_dict:
+    :return dict: selected primitives, in order of selection
+    """
+    assert REWARD_WEIGHTS[0] >= 0 and REWARD_WEIGHTS[4] >= 0, "lazy greedy needs submodular gains"
+    assert REWARD_WEIGHTS[3] == 0, "coherence is not evaluated incrementally"
+    num_pixels = len(pixels_dict['all'])
+    covered = np.zeros(num_pixels, dtype=bool)
+    end_covered = np.zeros(num_pixels, dtype=bool)
+    end_pixels_dict = {key: np.union1d(pixels_dict[primitive.a], pixels_dict[primitive.b])
+                       for key, primitive in primitives.items() if isinstance(primitive, instantiators['line'])}
+    # Terms of _evaluate_reward for the selected primitives
+    terms = [0, 0, 0, 0, 0]
+    reward = 0
+
+    def evaluate(idx, key):
+        candidate_terms = _get_terms(terms, key, primitives[key], pixels_dict, end_pixels_dict, covered, end_covered)
+        candidate_reward = np.dot(candidate_terms, REWARD_WEIGHTS)
+        return [reward - candidate_reward, idx, key, step, candidate_reward, candidate_terms]
+
+    # Ordered by gain, then by primitive order, as max() over the remaining primitives is.
+    step = 0
+    heap = [evaluate(idx, key) for idx, key in enumerate(primitives)]
+    heapq.heapify(heap)
+    selected_primitives = {}
+    while len(heap) > 0:
+        entry = heapq.heappop(heap)
+        if entry[3] < step:
+            heapq.heappush(heap, evaluate(entry[1], entry[2]))
+            continue
+        contenders = [entry]
+        while len(heap) > 0 and heap[0][0] <= entry[0] + GAIN_TIE_EPS:
+            other = heapq.heappop(heap)
+            contenders.append(other if other[3] == step else evaluate(other[1], other[2]))
+        best = max(contenders, key=lambda contender: (contender[4], -contender[1]))
+        for contender in contenders:
+            if contender is not best:
+                heapq.heappush(heap, contender)
+
+        _, _, key, _, new_reward, new_terms = best
+        if new_reward - reward <= params.PRIMITIVE_SELECTION_MIN_GAIN:
+            break
+        selected_primitives[key] = primitives[key]
+        covered[pixels_dict[key]] = True
+        if key in end_pixels_dict:
+            end_covered[end_pixels_dict[key]] = True
+        terms = new_terms
+        reward = new_reward
+        step += 1
+    return selected_primitives
+
+
+def _get_terms(terms, key, primitive, pixels_dict, end_pixels_dict, covered, end_covered):
+    """
+    Terms of _evaluate_reward when the primitive is added to the primitives with the given terms,
+    which cover the bitmaps.
+    The length sum is accumulated in the order of selection, as _length_sum does.
+    """
+    return [terms[0] + np.count_nonzero(~covered[pixels_dict[key]]),
+            terms[1] + len(pixels_dict[key]),
+            terms[2] + _length_sum({key: primitive}),
+            0,
+            terms[4] + (np.count_nonzero(~end_covered[end_pixels_dict[key]]) if key in end_pixels_dict else 0),
+            ]
 
 
 def _get_pixels_dict(primitive_parse, line_eps, circle_eps):
@@ -77,13 +138,13 @@ def _get_pixels_dict(primitive_parse, line_eps, circle_eps):
 
         elif isinstance(primitive, instantiators['circle']):
             eps = circle_eps
-            curr_pixels = set(pixel for pixel in pixels if distance_between_circle_and_point(primitive, pixel) < eps)
+            curr_pixels = pixels.near_circle(primitive, eps)
             pixels_dict[key] = curr_pixels
     return pixels_dict
 
 
 def _get_pixels_near_point(pixels, point, eps):
-    return set(pixel for pixel in pixels if distance_between_points_squared(pixel, point) <= eps**2)
+    return pixels.near_point(point, eps)
 
 
 def _evaluate_reward(partial_primitives, pixels_dict):
@@ -93,14 +154,13 @@ def _evaluate_reward(partial_primitives, pixels_dict):
          _coherence(partial_primitives),
          _end_pixel_num(partial_primitives, pixels_dict),
          ]
-    w = [1, -0.1, -0.7, 00, 0.1]
-    return np.dot(x, w)
+    return np.dot(x, REWARD_WEIGHTS)
 
 
 def _coverage(partial_primitives, pixels_dict):
     if len(partial_primitives) == 0:
         return 0
-    coverage = len(set.union(*[pixels_dict[key] for key in partial_primitives]))
+    coverage = _union_size([pixels_dict[key] for key in partial_primitives])
     return coverage
 
 
@@ -114,43 +174,20 @@ def _end_pixel_num(partial_primitives, pixels_dict):
     lines = _get_lines(partial_primitives)
     if len(lines) == 0:
         return 0
-    coverage = set.union(*[pixels_dict[primitive.a] for primitive in lines])
-    coverage2 = set.union(*[pixels_dict[primitive.b] for primitive in lines])
-    return len(set.union(coverage, coverage2))
-
+    coverage = [pixels_dict[primitive.a] for primitive in lines]
+    coverage2 = [pixels_dict[primitive.b] for primitive in lines]
+    return _union_size(coverage + coverage2)
 
 
-def _get_pixels_near_line(pixels, line, eps):
+def _union_size(index_arrays):
     """
-    This can be replaced with shorter, more inefficient code.
-    Written to boost up the speed.
-    :param pixels:
-    :param line:
-    :param eps:
-    :return:
+    Number of distinct pixel indices in the union of the index arrays.
     """
-    #return set(pixel for pixel in pixels if distance_between_line_and_point(line, pixel) <= eps)
-
-    p = midpoint(line.a, line.b)
-    u = line_unit_vector(line)
-    n = line_normal_vector(line)
-    half_length = line_length(line)/2.0
-    eps_squared = eps**2
-
-    near_pixels = set()
-    for point in pixels:
-        vector = point.x - p.x, point.y - p.y
-        perpendicular_distance = abs(np.dot(vector, n))
-        if perpendicular_distance > eps:
-            continue
-        parallel_distance = abs(np.dot(vector, u))
-        if parallel_distance <= half_length:
-            near_pixels.add(point)
-        else:
-            if distance_between_points_squared(point, line.a) <= eps_squared or \
-                    distance_between_points_squared(point, line.b) <= eps_squared:
-                near_pixels.add(point)
-    return near_pixels
+    return len(np.unique(np.concatenate(index_arrays)))
+
+
+def _get_pixels_near_line(pixels, line, eps):
+    return pixels.near_line(line, eps)
 
 
 def _length_sum(partial_primitives):
@@ -1,8 +1,4 @@
-from geosolver.diagram.parse_core import parse_core
-from geosolver.diagram.parse_graph import parse_graph
-from geosolver.diagram.parse_image_segments import parse_image_segments
-from geosolver.diagram.parse_primitives import parse_primitives
-from geosolver.diagram.select_primitives import select_primitives
+from geosolver.diagram.parse_cache import get_diagram_cache
 from geosolver.grounding.parse_match_from_known_labels import parse_match_from_known_labels
 from geosolver.utils.prep import open_image
 
@@ -10,12 +6,11 @@ __author__ = 'minjoon'
 
 
 def question_to_graph_parse(question):
+    """
+    Stages already parsed for the same diagram and parameters are loaded from the diagram cache.
+    """
     diagram = open_image(question.diagram_path)
-    image_segment_parse = parse_image_segments(diagram)
-    primitive_parse = parse_primitives(image_segment_parse)
-    selected_primitive_parse = select_primitives(primitive_parse)
-    core_parse = parse_core(selected_primitive_parse)
-    graph_parse = parse_graph(core_parse)
+    graph_parse = get_diagram_cache().get_graph_parse(diagram)
     return graph_parse
 
 def question_to_match_parse(question, label_data):
@@ -25,8 +20,8 @@ def question_to_match_parse(question, label_data):
 
 def questions_to_match_parses(questions, labels):
     match_parses = {}
-    for key, question in questions.iteritems():
-        print key
+    for key, question in questions.items():
+        print(key)
         label = labels[key]
         match_parse = question_to_match_parse(question, label)
         match_parses[key] = match_parse
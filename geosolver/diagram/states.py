@@ -1,7 +1,9 @@
 import cv2
 
+from geosolver import parameters
 from geosolver.diagram.draw_on_image import draw_point, draw_instance, draw_label
 from geosolver.ontology.ontology_semantics import evaluate
+from geosolver.utils.lru import LRUCache
 from geosolver.utils.prep import display_image
 
 __author__ = 'minjoon'
@@ -94,9 +96,11 @@ class CoreParse(object):
         self.point_variables = point_variables
         self.radius_variables = radius_variables
         self.variable_assignment = assignment
+        # Values of the formulas evaluated against variable_assignment, which is fixed, by Node.get_key
+        self.evaluation_memo = LRUCache(parameters.EVALUATION_MEMO_SIZE)
 
     def evaluate(self, formula):
-        return evaluate(formula, self.variable_assignment)
+        return evaluate(formula, self.variable_assignment, memo=self.evaluation_memo)
 
     def is_grounded(self, formula):
         return formula.is_grounded(self.variable_assignment.keys())
@@ -128,6 +132,7 @@ class GraphParse(object):
         self.intersection_points = core_parse.intersection_points
         self.point_variables = core_parse.point_variables
         self.radius_variables = core_parse.radius_variables
+        self.instance_catalog = None  # Built on first use by get_instances.get_instance_catalog
 
     def display_instances(self, instances, block=True, **kwargs):
         self.image_segment_parse.display_instances(instances, block=block, **kwargs)
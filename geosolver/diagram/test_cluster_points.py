@@ -0,0 +1,83 @@
+"""
+Regression tests of cluster_points against the KMeans search of parse_core it replaced:
+the fewest KMeans clusters (k < 20) whose points are all within the radius of their centroid, else 20 clusters.
+"""
+import numpy as np
+import pytest
+
+from geosolver.diagram.cluster_points import cluster_points
+
+__author__ = 'minjoon'
+
+RADIUS = 8
+
+# Intersections of a bundled diagram (jbkksd.png) before clustering, and the centroids of the KMeans search
+INTERSECTIONS = [[2.0, 1.02], [103.0, 1.99], [104.98, 2.01], [206.99, 2.99], [3.0, 207.99], [206.0, 206.02],
+                 [-0.01, 208.02], [206.01, 206.02], [2.97, 202.17], [103.99, 3.94], [159.05, 113.02],
+                 [206.01, 206.04], [0.0, 1.0], [208.0, 3.0], [2.0, 208.0], [208.0, 206.0], [3.0, 208.0], [2.0, 0.0],
+                 [102.0, 0.0], [207.0, 208.0], [0.0, 208.0], [106.0, 0.0], [206.0, 208.0], [207.0, 0.0],
+                 [1.04, -200.0], [2.55, 114.47], [207.96, -200.08], [206.46, 112.58]]
+KMEANS_CENTROIDS = [[159.05, 113.02], [1.83, 207.03], [1.33, 0.67], [103.99, 1.59], [206.5, 206.68], [207.96, -200.08],
+                    [1.04, -200.0], [207.33, 2.0], [2.55, 114.47], [206.46, 112.58]]
+
+
+def _kmeans_search(points, radius):
+    KMeans = pytest.importorskip('sklearn.cluster').KMeans
+    if len(points) == 1:
+        return points
+    for k in list(range(1, min(len(points) + 1, 20))) + [min(len(points), 20)]:
+        assignments = KMeans(n_clusters=k, random_state=42, n_init=10).fit_predict(points)
+        centroids = np.array([points[assignments == c].mean(axis=0) for c in range(k)])
+        if np.max(np.hypot(*(points - centroids[assignments]).T)) <= radius:
+            break
+    return centroids
+
+
+def _assert_same_points(points0, points1, tolerance):
+    assert len(points0) == len(points1)
+    distances = np.hypot(*(np.asarray(points0)[:, np.newaxis] - np.asarray(points1)[np.newaxis]).transpose(2, 0, 1))
+    assert distances.min(axis=0).max() <= tolerance
+    assert distances.min(axis=1).max() <= tolerance
+
+
+def test_bundled_diagram():
+    _assert_same_points(cluster_points(INTERSECTIONS, RADIUS, 20), KMEANS_CENTROIDS, 0.01)
+
+
+@pytest.mark.parametrize('seed', range(20))
+def test_separated_groups(seed):
+    random_state = np.random.RandomState(seed)
+    grid = np.array([(x, y) for x in range(6) for y in range(6)], dtype=float) * 6 * RADIUS
+    centers = grid[random_state.choice(len(grid), random_state.randint(1, 15), replace=False)]
+    points = np.concatenate([center + random_state.uniform(-3, 3, size=(random_state.randint(1, 6), 2))
+                             for center in centers])
+    _assert_same_points(cluster_points(points, RADIUS, 20), _kmeans_search(points, RADIUS), 1e-6)
+
+
+@pytest.mark.parametrize('seed', range(20))
+def test_radius_bound(seed):
+    random_state = np.random.RandomState(seed)
+    points = random_state.uniform(0, 60, size=(40, 2))
+    centroids = cluster_points(points, RADIUS)
+    distances = np.hypot(*(points[:, np.newaxis] - centroids[np.newaxis]).transpose(2, 0, 1))
+    assert distances.min(axis=1).max() <= RADIUS
+
+
+def test_chain_is_split():
+    points = np.array([(3.0 * i, 0.0) for i in range(30)])
+    centroids = cluster_points(points, RADIUS)
+    assert len(centroids) > 1
+    assert np.hypot(*(points[:, np.newaxis] - centroids[np.newaxis]).transpose(2, 0, 1)).min(axis=1).max() <= RADIUS
+
+
+def test_max_num_clusters():
+    points = np.array([(10.0 * RADIUS * i, 0.0) for i in range(25)])
+    assert len(cluster_points(points, RADIUS, 20)) == 20
+    assert len(cluster_points(points, RADIUS)) == 25
+    assert len(cluster_points(points[:19], RADIUS, 20)) == 19
+
+
+def test_deterministic():
+    points = np.random.RandomState(0).uniform(0, 100, size=(60, 2))
+    assert np.array_equal(cluster_points(points, RADIUS, 20), cluster_points(points, RADIUS, 20))
+    assert cluster_points([], RADIUS).shape == (0, 2)
@@ -0,0 +1,51 @@
+"""
+The batched intersection kernels used by parse_core return the same intersections as the scalar functions,
+pair by pair and in the same order.
+"""
+import numpy as np
+import pytest
+
+from geosolver.diagram.computational_geometry import intersections_between_lines, \
+    intersections_between_circle_and_line, intersections_between_lines_batch, \
+    intersections_between_circles_and_lines_batch
+from geosolver.ontology.instantiator_definitions import instantiators
+
+__author__ = 'minjoon'
+
+EPS = 3
+
+
+def _get_lines(random_state, num_lines):
+    # Pixel end points, as returned by parse_primitives
+    lines = random_state.randint(0, 200, size=(num_lines, 4)).astype(float)
+    lines = lines[np.hypot(lines[:, 2] - lines[:, 0], lines[:, 3] - lines[:, 1]) > 0]
+    return lines, [instantiators['line'](instantiators['point'](ax, ay), instantiators['point'](bx, by))
+                   for ax, ay, bx, by in lines.tolist()]
+
+
+@pytest.mark.parametrize('seed', range(10))
+def test_lines_batch(seed):
+    lines, line_instances = _get_lines(np.random.RandomState(seed), 30)
+    points, mask = intersections_between_lines_batch(lines, EPS)
+    for i, line0 in enumerate(line_instances):
+        for j, line1 in enumerate(line_instances):
+            if i == j:
+                continue
+            expected = intersections_between_lines(line0, line1, EPS)
+            assert bool(mask[i, j]) == (len(expected) > 0)
+            if mask[i, j]:
+                assert np.allclose(points[i, j], expected[0])
+
+
+@pytest.mark.parametrize('seed', range(10))
+def test_circles_and_lines_batch(seed):
+    random_state = np.random.RandomState(seed)
+    lines, line_instances = _get_lines(random_state, 30)
+    circles = np.column_stack((random_state.randint(0, 200, size=(8, 2)), random_state.uniform(10, 80, 8)))
+    points, mask = intersections_between_circles_and_lines_batch(circles, lines, EPS)
+    for i, (x, y, radius) in enumerate(circles.tolist()):
+        circle = instantiators['circle'](instantiators['point'](x, y), radius)
+        for j, line in enumerate(line_instances):
+            expected = intersections_between_circle_and_line(circle, line, EPS)
+            assert mask[i, j].sum() == len(expected)
+            assert np.allclose(points[i, j][mask[i, j]].reshape(-1, 2), np.array(expected).reshape(-1, 2))
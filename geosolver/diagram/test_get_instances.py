@@ -0,0 +1,92 @@
+"""
+The instance enumerations of get_instances give the same instances, in the same order,
+as the scans over all permutations of intersection points they replaced.
+"""
+import contextlib
+import io
+import itertools
+import os
+
+import pytest
+
+from geosolver.diagram.get_instances import get_all_instances, get_instance_catalog, _get_angles, _get_arcs, \
+    _get_polygons, _get_point_keys
+from geosolver.diagram.parse_core import parse_core
+from geosolver.diagram.parse_graph import parse_graph
+from geosolver.diagram.parse_image_segments import parse_image_segments
+from geosolver.diagram.parse_primitives import parse_primitives
+from geosolver.diagram.select_primitives import select_primitives
+from geosolver.utils.prep import open_image
+
+__author__ = 'minjoon'
+
+IMAGES_PATH = os.path.join(os.path.dirname(__file__), os.pardir, "images")
+IMAGE_NAMES = ["00142.png", "Circle-question-300x269.png", "jbkksd.png", "images (2).png"]
+
+
+@pytest.fixture(scope='module', params=IMAGE_NAMES)
+def graph_parse(request):
+    image = open_image(os.path.join(IMAGES_PATH, request.param))
+    with contextlib.redirect_stdout(io.StringIO()):
+        return parse_graph(parse_core(select_primitives(parse_primitives(parse_image_segments(image)))))
+
+
+def _scan_polygons(graph_parse, name, n, is_variable):
+    polygons = {}
+    frozensets = set()
+    line_graph = graph_parse.line_graph
+    for keys in itertools.permutations(graph_parse.intersection_points, n):
+        if frozenset(keys) in frozensets:
+            continue
+        if not all(line_graph.has_edge(keys[idx-1], key) for idx, key in enumerate(keys)):
+            continue
+        angles = []
+        for idx, key in enumerate(keys):
+            angles.extend(_get_angles(graph_parse, False, keys[idx-2], keys[idx-1], key).values())
+        if len(angles) < n:
+            continue
+        polygons.update(_get_polygons(graph_parse, name, is_variable, *keys))
+        frozensets.add(frozenset(keys))
+    return polygons
+
+
+@pytest.mark.parametrize('is_variable', [False, True])
+@pytest.mark.parametrize('name,n', [('triangle', 3), ('quad', 4), ('hexagon', 6)])
+def test_polygons(graph_parse, name, n, is_variable):
+    polygons = get_all_instances(graph_parse, name, is_variable)
+    expected = _scan_polygons(graph_parse, name, n, is_variable)
+    assert list(polygons.items()) == list(expected.items())
+
+
+@pytest.mark.parametrize('is_variable', [False, True])
+def test_angles(graph_parse, is_variable):
+    angles = get_all_instances(graph_parse, 'angle', is_variable)
+    expected = {}
+    for a_key, b_key, c_key in itertools.permutations(graph_parse.intersection_points, 3):
+        expected.update(_get_angles(graph_parse, is_variable, a_key, b_key, c_key))
+    assert list(angles.items()) == list(expected.items())
+
+
+@pytest.mark.parametrize('is_variable', [False, True])
+def test_arcs(graph_parse, is_variable):
+    arcs = get_all_instances(graph_parse, 'arc', is_variable)
+    expected = {}
+    for a_key, b_key in itertools.combinations(graph_parse.intersection_points, 2):
+        expected.update(_get_arcs(graph_parse, is_variable, a_key, b_key))
+    assert list(arcs.items()) == list(expected.items())
+
+
+@pytest.mark.parametrize('name', ['point', 'line', 'circle', 'arc', 'angle', 'triangle', 'quad', 'polygon'])
+def test_catalog(graph_parse, name):
+    catalog = get_instance_catalog(graph_parse)
+    instances = catalog.get_all(name, True)
+    assert dict(instances) == dict(get_all_instances(graph_parse, name, True))
+    with pytest.raises(TypeError):
+        instances['key'] = None
+
+    for point_key in graph_parse.intersection_points:
+        containing = catalog.get_containing(name, True, point_key)
+        expected = {key: instance for key, instance in instances.items() if point_key in _get_point_keys(name, key)}
+        assert list(containing.items()) == list(expected.items())
+        with pytest.raises(TypeError):
+            containing['key'] = None
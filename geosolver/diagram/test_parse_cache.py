@@ -0,0 +1,69 @@
+"""
+Diagram parses loaded from the cache equal fresh parses, and changing a parameter at runtime
+recomputes the stages that read it, with the new value.
+"""
+import contextlib
+import io
+import os
+
+import pytest
+
+import geosolver.parameters as params
+from geosolver.diagram.parse_cache import DiagramCache
+from geosolver.diagram.parse_core import parse_core
+from geosolver.diagram.parse_graph import parse_graph
+from geosolver.diagram.parse_image_segments import parse_image_segments
+from geosolver.diagram.parse_primitives import parse_primitives
+from geosolver.diagram.select_primitives import select_primitives
+from geosolver.utils.prep import open_image
+
+__author__ = 'minjoon'
+
+IMAGES_PATH = os.path.join(os.path.dirname(__file__), os.pardir, "images")
+
+
+def _parse(image):
+    return parse_graph(parse_core(select_primitives(parse_primitives(parse_image_segments(image)))))
+
+
+def _get_summary(graph_parse):
+    core_parse = graph_parse.core_parse
+    return (sorted(core_parse.primitive_parse.lines), sorted(core_parse.primitive_parse.circles),
+            [(key, point.x, point.y) for key, point in core_parse.intersection_points.items()],
+            sorted(core_parse.variable_assignment),
+            list(graph_parse.line_graph.edges()),
+            {key: sorted(d) for key, d in graph_parse.circle_dict.items()},
+            {key: list(arc_graph.edges()) for key, arc_graph in graph_parse.arc_graphs.items()})
+
+
+@pytest.mark.parametrize('name', ["00142.png", "Circle-question-300x269.png"])
+def test_loaded_parse(tmpdir, name):
+    image = open_image(os.path.join(IMAGES_PATH, name))
+    with contextlib.redirect_stdout(io.StringIO()):
+        expected = _get_summary(_parse(image))
+        cache = DiagramCache(str(tmpdir))
+        assert _get_summary(cache.get_graph_parse(image)) == expected
+        assert (cache.hits, cache.misses) == (0, 5)
+        assert _get_summary(DiagramCache(str(tmpdir)).get_graph_parse(image)) == expected
+
+
+def test_runtime_parameters(tmpdir, monkeypatch):
+    image = open_image(os.path.join(IMAGES_PATH, "00142.png"))
+    cache = DiagramCache(str(tmpdir))
+    with contextlib.redirect_stdout(io.StringIO()):
+        cache.get_graph_parse(image)
+        monkeypatch.setattr(params, 'LINE_EPS', params.LINE_EPS + 2)
+        graph_parse = cache.get_graph_parse(image)
+        expected = _get_summary(_parse(image))
+    # image segments and primitives are loaded, and the stages from select_primitives on are recomputed
+    assert (cache.hits, cache.misses) == (2, 8)
+    assert _get_summary(graph_parse) == expected
+
+
+def test_disabled_cache():
+    image = open_image(os.path.join(IMAGES_PATH, "00142.png"))
+    cache = DiagramCache()
+    with contextlib.redirect_stdout(io.StringIO()):
+        cache.get_graph_parse(image)
+        cache.get_graph_parse(image)
+    assert (cache.hits, cache.misses) == (0, 10)
@@ -0,0 +1,79 @@
+"""
+The vectorized distance kernels behind PixelStore give the same distances as the scalar functions
+of computational_geometry that instance_exists and select_primitives used on sets of point tuples,
+and the queries through its grid return the same pixels as a scan of all pixels.
+"""
+import numpy as np
+import pytest
+
+from geosolver.diagram.computational_geometry import distance_between_points, distance_between_line_and_point, \
+    distance_between_circle_and_point, distance_between_arc_and_point, distances_between_points, \
+    distances_between_line_and_points, distances_between_circle_and_points, distances_between_arc_and_points
+from geosolver.diagram.pixel_store import PixelStore
+from geosolver.ontology.instantiator_definitions import instantiators
+
+__author__ = 'minjoon'
+
+
+def _get_store(seed, shape=(90, 120), density=0.3, **kwargs):
+    mask = np.random.RandomState(seed).uniform(size=shape) < density
+    return PixelStore.from_mask(mask, **kwargs)
+
+
+def _get_shapes(seed):
+    random_state = np.random.RandomState(seed)
+
+    def point():
+        return instantiators['point'](*random_state.uniform(-10, 130, 2))
+    circle = instantiators['circle'](point(), random_state.uniform(5, 60))
+    angles = random_state.uniform(0, 2*np.pi, 2)
+    a, b = [instantiators['point'](circle.center.x + circle.radius*np.cos(angle),
+                                   circle.center.y + circle.radius*np.sin(angle)) for angle in angles]
+    return {'point': point(), 'line': instantiators['line'](point(), point()), 'circle': circle,
+            'arc': instantiators['arc'](circle, a, b)}
+
+
+_kernels = {'point': (distances_between_points, lambda shape, point: distance_between_points(shape, point)),
+            'line': (distances_between_line_and_points, distance_between_line_and_point),
+            'circle': (distances_between_circle_and_points, distance_between_circle_and_point),
+            'arc': (distances_between_arc_and_points, distance_between_arc_and_point)}
+
+
+@pytest.mark.parametrize('seed', range(10))
+@pytest.mark.parametrize('name', sorted(_kernels))
+def test_kernels_match_scalar_functions(seed, name):
+    store = _get_store(seed)
+    shape = _get_shapes(seed)[name]
+    kernel, scalar_function = _kernels[name]
+    distances = kernel(shape, store.points)
+    expected = [scalar_function(shape, instantiators['point'](*point)) for point in store.points.tolist()]
+    assert np.allclose(distances, expected)
+
+
+def test_store_points():
+    mask = np.zeros((4, 5), dtype=bool)
+    mask[1, 3] = mask[2, 0] = True
+    store = PixelStore.from_mask(mask)
+    assert len(store) == 2
+    assert set(store) == {instantiators['point'](3, 1), instantiators['point'](0, 2)}
+    assert all(mask[y, x] for x, y in store.points)
+
+
+@pytest.mark.parametrize('cell_size', [1, 3, 8, 20])
+@pytest.mark.parametrize('seed', range(10))
+def test_grid_queries_match_full_scan(seed, cell_size):
+    store = _get_store(seed, cell_size=cell_size)
+    shapes = _get_shapes(seed)
+    random_state = np.random.RandomState(seed)
+    rho, theta = rho_theta_pair = (random_state.uniform(0, 150), random_state.uniform(0, np.pi))
+    for eps in [0.5, 2, 6]:
+        for name, (kernel, _) in _kernels.items():
+            indices = getattr(store, 'near_' + name)(shapes[name], eps)
+            assert np.array_equal(indices, np.flatnonzero(kernel(shapes[name], store.points) <= eps))
+        distances = np.abs(rho - store.points[:, 0]*np.cos(theta) - store.points[:, 1]*np.sin(theta))
+        assert np.array_equal(store.near_rho_theta_pair(rho_theta_pair, eps), np.flatnonzero(distances <= eps))
+
+
+def test_grid_queries_on_empty_store():
+    store = PixelStore.from_mask(np.zeros((10, 10), dtype=bool))
+    assert len(store.near_line(_get_shapes(0)['line'], 5)) == 0
@@ -0,0 +1,45 @@
+"""
+The lazy greedy selection picks the same primitives, in the same order, as recomputing the full reward
+of every remaining primitive at every step.
+"""
+import os
+
+import pytest
+
+import geosolver.parameters as params
+from geosolver.diagram.parse_image_segments import parse_image_segments
+from geosolver.diagram.parse_primitives import parse_primitives
+from geosolver.diagram.select_primitives import select_primitives, _select_greedily, _get_pixels_dict, \
+    _evaluate_reward
+from geosolver.utils.prep import open_image
+
+__author__ = 'minjoon'
+
+IMAGES_PATH = os.path.join(os.path.dirname(__file__), os.pardir, "images")
+
+
+def _select_by_full_rewards(primitives, pixels_dict):
+    selected_primitives = {}
+    remaining_primitives = dict(primitives)
+    reward = 0
+    while len(remaining_primitives) > 0:
+        key = max(remaining_primitives.items(),
+                  key=lambda p: _evaluate_reward({**selected_primitives, p[0]: p[1]}, pixels_dict))[0]
+        new_reward = _evaluate_reward({**selected_primitives, key: remaining_primitives[key]}, pixels_dict)
+        if new_reward - reward <= params.PRIMITIVE_SELECTION_MIN_GAIN:
+            break
+        selected_primitives[key] = remaining_primitives.pop(key)
+        reward = new_reward
+    return selected_primitives
+
+
+@pytest.mark.parametrize('name', ["00142.png", "Circle-question-300x269.png", "jbkksd.png"])
+def test_same_selection(name):
+    primitive_parse = parse_primitives(parse_image_segments(open_image(os.path.join(IMAGES_PATH, name))))
+    pixels_dict = _get_pixels_dict(primitive_parse, params.LINE_EPS, params.CIRCLE_EPS)
+    selected_primitives = _select_greedily(primitive_parse.primitives, pixels_dict)
+    assert len(selected_primitives) > 0
+    assert list(selected_primitives) == list(_select_by_full_rewards(primitive_parse.primitives, pixels_dict))
+
+    selected_parse = select_primitives(primitive_parse)
+    assert set(selected_parse.primitives) == set(selected_primitives)
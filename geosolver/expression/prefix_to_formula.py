@@ -3,24 +3,24 @@ from geosolver.utils.num import is_number
 
 __author__ = 'minjoon'
 
-def prefix_to_formula(prefix):
+def prefix_to_formula(prefix, return_type='number'):
     """
+    Leaf variables and numbers take the type of the argument they are passed as, instead of having it assigned
+    to their signature afterwards; abbreviated signatures are shared, so they keep their own type.
 
     :param list prefix:
+    :param str return_type: type of the formula if it is a variable or a number
     :return FormulaNode:
     """
     if isinstance(prefix, str):
         if prefix in abbreviations:
             return FormulaNode(signatures[abbreviations[prefix]], [])
         elif is_number(prefix):
-            return FormulaNode(FunctionSignature(prefix, 'number', []), [])
+            return FormulaNode(FunctionSignature(prefix, return_type, []), [])
         else:
-            return FormulaNode(VariableSignature(prefix, 'number'), [])
+            return FormulaNode(VariableSignature(prefix, return_type), [])
     else:
         sig = signatures[abbreviations[prefix[0]]]
-        children = [prefix_to_formula(child) for child in prefix[1:]]
-        for idx, child in enumerate(children):
-            child.signature.return_type = sig.arg_types[idx]
-            child.return_type = sig.arg_types[idx]
+        children = [prefix_to_formula(child, sig.arg_types[idx]) for idx, child in enumerate(prefix[1:])]
         out = FormulaNode(sig, children)
         return out
@@ -0,0 +1,27 @@
+"""
+prefix_to_formula gives leaves the types of the arguments they are passed as, without changing shared signatures.
+"""
+from geosolver.expression.prefix_to_formula import prefix_to_formula
+from geosolver.ontology.ontology_definitions import signatures
+
+__author__ = 'minjoon'
+
+
+def test_argument_types():
+    formula = prefix_to_formula(['||', 'AB', 'CD'])
+    assert formula.signature is signatures['Parallel']
+    assert [child.return_type for child in formula.children] == ['line', 'line']
+    assert [child.signature.return_type for child in formula.children] == ['line', 'line']
+
+    formula = prefix_to_formula(['=', ['+', 'x', '2'], '\\pi'])
+    assert formula.return_type == 'truth'
+    add, pi = formula.children
+    assert [child.return_type for child in add.children] == ['number', 'number']
+    assert pi.signature is signatures['Pi']
+    assert prefix_to_formula('x').return_type == 'number'
+
+
+def test_shared_signatures():
+    types = {id_: signature.return_type for id_, signature in signatures.items()}
+    prefix_to_formula(['||', ['+', 'a', 'b'], 'CD'])
+    assert {id_: signature.return_type for id_, signature in signatures.items()} == types
@@ -1,8 +1,11 @@
+from collections import OrderedDict
+import heapq
 import itertools
 import logging
-from geosolver.diagram.get_instances import get_all_instances, get_instances
+from geosolver import parameters
+from geosolver.diagram.get_instances import get_instances, get_instance_catalog
 from geosolver.grounding.states import MatchParse
-from geosolver.ontology.ontology_semantics import evaluate, MeasureOf, IsHypotenuseOf
+from geosolver.ontology.ontology_semantics import MeasureOf, IsHypotenuseOf
 from geosolver.ontology.ontology_definitions import VariableSignature, signatures, FormulaNode, SetNode, is_singular, Node
 from geosolver.utils.num import is_number
 import numpy as np
@@ -10,24 +13,91 @@ import numpy as np
 __author__ = 'minjoon'
 
 
-def ground_formulas(match_parse, formulas, references={}):
-    core_parse = match_parse.graph_parse.core_parse
-    singular_variables = set(itertools.chain(*[_get_singular_variables(formula) for formula in formulas]))
+def ground_formulas(match_parse, formulas, references={}, beam_width=parameters.GROUNDING_BEAM_WIDTH):
+    """
+    Grounds the singular variables of formulas jointly, to the combination of candidates that maximizes
+    the sum of the confidences of the grounded formulas in the diagram.
+
+    :param int beam_width: number of partial combinations kept by the search (see _search_combination);
+    the search is exhaustive if it is at least the number of combinations
+    :return list: the grounded formulas
+    """
+    singular_variables = list(OrderedDict.fromkeys(
+        itertools.chain(*[_get_singular_variables(formula) for formula in formulas])))
     grounded_variable_sets = []
     for variable in singular_variables:
         grounded_variable = _ground_variable(match_parse, variable, references)
         if isinstance(grounded_variable, FormulaNode): grounded_variable_sets.append([grounded_variable])
         else: grounded_variable_sets.append(grounded_variable.children)
-    scores = []
-    grounded_formulas_list = []
-    combinations = list(itertools.product(*grounded_variable_sets))
-    for combination in combinations:
-        grounded_formulas = _combination_to_grounded_formulas(match_parse, formulas, combination, singular_variables)
-        local_scores = [core_parse.evaluate(f) for f in grounded_formulas]
-        scores.append(sum(s.conf for s in local_scores if s is not None))
-        grounded_formulas_list.append(grounded_formulas)
-    max_score, max_gf = max(zip(scores, grounded_formulas_list), key=lambda pair: pair[0])
-    return max_gf
+    combination = _search_combination(match_parse, formulas, singular_variables, grounded_variable_sets, beam_width)
+    return _combination_to_grounded_formulas(match_parse, formulas, combination, singular_variables)
+
+
+def _search_combination(match_parse, formulas, singular_variables, grounded_variable_sets, beam_width):
+    """
+    Beam search over partial combinations, binding one variable at a time.
+    Each formula is scored as soon as all of its variables are bound, and only once per binding of them,
+    and the partial combinations are ranked by the sum of the scores of their formulas.
+    Ties are broken towards the earliest combination in itertools.product order,
+    so with a wide enough beam, the result is that of scoring every combination.
+
+    :return tuple: the best combination of candidates, one per singular variable
+    """
+    core_parse = match_parse.graph_parse.core_parse
+    positions = {variable: idx for idx, variable in enumerate(singular_variables)}
+    formula_positions = [sorted(set(positions[variable] for variable in _get_singular_variables(formula)))
+                         for formula in formulas]
+    scores = {}
+
+    def get_score(formula_idx, indices):
+        key = (formula_idx, tuple(indices[position] for position in formula_positions[formula_idx]))
+        if key not in scores:
+            var_dict = {singular_variables[position].signature: grounded_variable_sets[position][indices[position]]
+                        for position in formula_positions[formula_idx]}
+            grounded_formula = _ground_formula_with(match_parse, formulas[formula_idx], var_dict)
+            score = None if grounded_formula is None else core_parse.evaluate(grounded_formula)
+            scores[key] = None if score is None else score.conf
+        return scores[key]
+
+    # Variables that complete the most formulas go first, so that partial scores are informative early
+    order = []
+    bound = set()
+    while len(order) < len(singular_variables):
+        position = max((position for position in range(len(singular_variables)) if position not in bound),
+                       key=lambda position: (len(_get_completed_formulas(formula_positions, bound, position)),
+                                             -position))
+        order.append((position, _get_completed_formulas(formula_positions, bound, position)))
+        bound.add(position)
+
+    unbound = (None,) * len(singular_variables)
+    beam = [(0.0, unbound)]
+    for position, completed in order:
+        expanded = []
+        for partial_score, indices in beam:
+            for candidate_idx in range(len(grounded_variable_sets[position])):
+                new_indices = indices[:position] + (candidate_idx,) + indices[position+1:]
+                new_score = partial_score + sum(score for score in (get_score(formula_idx, new_indices)
+                                                                    for formula_idx in completed)
+                                                if score is not None)
+                expanded.append((new_score, new_indices))
+        beam = heapq.nsmallest(beam_width, expanded, key=lambda pair: (-pair[0], pair[1]))
+
+    # Totals are summed again in formula order, as the partial sums may round differently
+    combinations = sorted(indices for _, indices in beam)
+    totals = [sum(score for score in (get_score(formula_idx, indices) for formula_idx in range(len(formulas)))
+                  if score is not None)
+              for indices in combinations]
+    max_idx = max(range(len(combinations)), key=lambda idx: totals[idx])
+    return tuple(grounded_variable_sets[position][candidate_idx]
+                 for position, candidate_idx in enumerate(combinations[max_idx]))
+
+
+def _get_completed_formulas(formula_positions, bound, position):
+    """
+    Indices of the formulas whose variables are all bound once the variable at position is.
+    """
+    return [formula_idx for formula_idx, each in enumerate(formula_positions)
+            if position in each and all(p in bound for p in each if p != position)]
 
 
 def _combination_to_grounded_formulas(match_parse, formulas, combination, singular_variables):
@@ -35,16 +105,24 @@ def _combination_to_grounded_formulas(match_parse, formulas, combination, singul
                 for idx, variable_node in enumerate(singular_variables)}
     grounded_formulas = []
     for formula in formulas:
-        singular_grounded_formula = _assign_variables(formula, var_dict)
-        try:
-            plural_grounded_formula = _ground_formula(match_parse, singular_grounded_formula)
-            grounded_formula = _apply_distribution(plural_grounded_formula)
+        grounded_formula = _ground_formula_with(match_parse, formula, var_dict)
+        if grounded_formula is not None:
             grounded_formulas.append(grounded_formula)
-        except:
-            pass
     return grounded_formulas
 
 
+def _ground_formula_with(match_parse, formula, var_dict):
+    """
+    :return: formula grounded with the singular variables in var_dict, or None if it cannot be grounded
+    """
+    singular_grounded_formula = _assign_variables(formula, var_dict)
+    try:
+        plural_grounded_formula = _ground_formula(match_parse, singular_grounded_formula)
+        return _apply_distribution(plural_grounded_formula)
+    except:
+        return None
+
+
 def _assign_variables(formula_node, var_dict):
     tester = lambda node: isinstance(node, FormulaNode) and node.is_leaf() and node.signature in var_dict
     getter = lambda node: var_dict[node.signature]
@@ -120,6 +198,7 @@ def _ground_variable(match_parse, variable, references={}):
     return_type = variable.return_type
     graph_parse = match_parse.graph_parse
     core_parse = graph_parse.core_parse
+    catalog = get_instance_catalog(graph_parse)
     variable_signature = variable.signature
 
     if variable_signature.id in signatures:
@@ -147,8 +226,8 @@ def _ground_variable(match_parse, variable, references={}):
         if len(variable_signature.name) == 1:
             return match_parse.match_dict[variable_signature.name][0]
         else:
-            points = get_all_instances(graph_parse, 'point', True)
-            return SetNode(points.values())
+            points = catalog.points(True)
+            return SetNode(list(points.values()))
     elif return_type == 'line':
         if len(variable_signature.name) == 1 and variable_signature.name in match_parse.match_dict:
             line = match_parse.match_dict[variable_signature.name][0]
@@ -159,8 +238,8 @@ def _ground_variable(match_parse, variable, references={}):
             point_b = match_parse.match_dict[label_b][0]
             return FormulaNode(signatures['Line'], [point_a, point_b])
         else:
-            lines = get_all_instances(graph_parse, 'line', True)
-            return SetNode(lines.values())
+            lines = catalog.lines(True)
+            return SetNode(list(lines.values()))
     elif return_type == 'circle':
         if len(variable_signature.name) == 1:
             center_label = variable_signature.name
@@ -169,8 +248,8 @@ def _ground_variable(match_parse, variable, references={}):
             return graph_parse.circle_dict[center_idx][0]['variable']
             # radius = match_parse.graph_parse.core_parse.radius_variables[center_idx][0]
         elif variable_signature.name == 'circle':
-            circles = get_all_instances(graph_parse, 'circle', True)
-            return SetNode(circles.values())
+            circles = catalog.circles(True)
+            return SetNode(list(circles.values()))
         else:
             raise Exception()
     elif return_type == 'angle':
@@ -181,76 +260,77 @@ def _ground_variable(match_parse, variable, references={}):
             point_b = match_parse.match_dict[label_b][0]
             point_c = match_parse.match_dict[label_c][0]
             out = FormulaNode(signatures['Angle'], [point_a, point_b, point_c])
-            measure = evaluate(FormulaNode(signatures['MeasureOf'], [out]), core_parse.variable_assignment)
+            measure = core_parse.evaluate(FormulaNode(signatures['MeasureOf'], [out]))
             if measure > np.pi:
                 out = FormulaNode(signatures['Angle'], [point_c, point_b, point_a])
             return out
         elif len(variable_signature.name) == 1 and variable_signature.name.isupper():
-            angles = get_all_instances(graph_parse, 'angle', True)
-            p = match_parse.match_dict[variable_signature.name][0]
-            for formula in angles.values():
-                if formula.children[1].signature == p.signature:
-                    measure = evaluate(FormulaNode(signatures['MeasureOf'], [formula]), core_parse.variable_assignment)
+            # Angles with the labeled point as their vertex
+            point_key = match_parse.point_key_dict.get(variable_signature.name)
+            angles = catalog.get_containing('angle', True, point_key)
+            for key, formula in angles.items():
+                if key[1] == point_key:
+                    measure = core_parse.evaluate(FormulaNode(signatures['MeasureOf'], [formula]))
                     if measure > np.pi:
                         continue
                     return formula
         elif len(variable_signature.name) == 1 and variable_signature.name.islower() and variable_signature.name in match_parse.match_dict:
             return match_parse.match_dict[variable_signature.name][0]
         else:
-            angles = get_all_instances(graph_parse, 'angle', True)
-            return SetNode(angles.values())
+            angles = catalog.angles(True)
+            return SetNode(list(angles.values()))
     elif return_type == 'arc':
         if len(variable_signature.name) == 2 and variable_signature.name.isupper():
             point_keys = [match_parse.point_key_dict[label] for label in variable_signature.name]
-            test_arc = get_instances(graph_parse, 'arc', False, *point_keys).values()[0]
+            test_arc = next(iter(get_instances(graph_parse, 'arc', False, *point_keys).values()))
             if MeasureOf(test_arc) > np.pi:
                 point_keys = [point_keys[1], point_keys[0]]
-            arc = get_instances(graph_parse, 'arc', True, *point_keys).values()[0]
+            arc = next(iter(get_instances(graph_parse, 'arc', True, *point_keys).values()))
             return arc
         else:
-            arcs = get_all_instances(graph_parse, 'arc', True)
-            return SetNode(arcs.values())
+            arcs = catalog.arcs(True)
+            return SetNode(list(arcs.values()))
 
     elif return_type == 'triangle':
         if variable_signature.name.isupper() and len(variable_signature.name) == 3:
             point_keys = [match_parse.point_key_dict[label] for label in variable_signature.name]
             triangles = get_instances(graph_parse, 'triangle', True, *point_keys)
-            return triangles.values()[0]
+            return next(iter(triangles.values()))
         else:
-            triangles = get_all_instances(graph_parse, 'triangle', True)
-            return SetNode(triangles.values())
+            triangles = catalog.triangles(True)
+            return SetNode(list(triangles.values()))
     elif return_type == 'quad':
         if variable_signature.name.isupper() and len(variable_signature.name) == 4:
             point_keys = [match_parse.point_key_dict[label] for label in variable_signature.name]
             quads = get_instances(graph_parse, 'quad', True, *point_keys)
-            return quads.values()[0]
+            return next(iter(quads.values()))
         else:
-            quads = get_all_instances(graph_parse, 'quad', True)
-            return SetNode(quads.values())
+            quads = catalog.quads(True)
+            return SetNode(list(quads.values()))
     elif return_type == 'hexagon':
         if variable_signature.name.isupper() and len(variable_signature.name) == 6:
             point_keys = [match_parse.point_key_dict[label] for label in variable_signature.name]
             hexagons = get_instances(graph_parse, 'hexagon', True, *point_keys)
-            return hexagons.values()[0]
+            return next(iter(hexagons.values()))
         else:
-            quads = get_all_instances(graph_parse, 'hexagon', True)
-            return SetNode(quads.values())
+            quads = catalog.hexagons(True)
+            return SetNode(list(quads.values()))
     elif return_type == 'polygon':
         if variable_signature.name.isupper():
             point_keys = [match_parse.point_key_dict[label] for label in variable_signature.name]
             polygons = get_instances(graph_parse, 'polygon', True, *point_keys)
-            return polygons.values()[0]
+            return next(iter(polygons.values()))
         else:
-            polygons = get_all_instances(graph_parse, 'polygon', True)
-            return SetNode(polygons.values())
+            polygons = catalog.polygons(True)
+            return SetNode(list(polygons.values()))
     elif return_type == 'twod':
-        circles = get_all_instances(graph_parse, 'circle', True)
-        polygons = get_all_instances(graph_parse, 'polygon', True)
-        return SetNode(polygons.values() + circles.values())
+        circles = catalog.circles(True)
+        polygons = catalog.polygons(True)
+        return SetNode(list(polygons.values()) + list(circles.values()))
     elif return_type == 'oned':
-        lines = get_all_instances(graph_parse, 'line', True)
-        arcs = get_all_instances(graph_parse, 'arc', True)
-        return SetNode(lines.values() + arcs.values())
+        lines = catalog.lines(True)
+        arcs = catalog.arcs(True)
+        return SetNode(list(lines.values()) + list(arcs.values()))
 
     logging.error("failed to ground variable: %r" % variable)
     return variable
@@ -36,17 +36,17 @@ def parse_match_from_known_labels(graph_parse, known_labels):
             continue
 
         if len(arr) > 1 and type_ == 'line' and arr[0] == 'length':
-            distances = [(key, label_distance_to_line(label_point, instance, True)) for key, instance in instances.iteritems()]
+            distances = [(key, label_distance_to_line(label_point, instance, True)) for key, instance in instances.items()]
         elif type_ == 'line':
-            distances = [(key, label_distance_to_line(label_point, instance, False)) for key, instance in instances.iteritems()]
+            distances = [(key, label_distance_to_line(label_point, instance, False)) for key, instance in instances.items()]
         elif type_ == 'point':
-            distances = [(key, label_distance_to_point(label_point, instance)) for key, instance in instances.iteritems()]
+            distances = [(key, label_distance_to_point(label_point, instance)) for key, instance in instances.items()]
         elif type_ == 'arc':
-            distances = [(key, label_distance_to_arc(label_point, instance)) for key, instance in instances.iteritems()]
+            distances = [(key, label_distance_to_arc(label_point, instance)) for key, instance in instances.items()]
         elif type_ == 'angle':
             # filter subangles
-            # instances = {key: value for key, value in instances.iteritems() if all(x == value or not is_subangle(x, value) for x in instances.values())}
-            distances = [(key, label_distance_to_angle(label_point, instance)) for key, instance in instances.iteritems()]
+            # instances = {key: value for key, value in instances.items() if all(x == value or not is_subangle(x, value) for x in instances.values())}
+            distances = [(key, label_distance_to_angle(label_point, instance)) for key, instance in instances.items()]
 
         # Then use the key to get corresponding variable in general graph
         # Wrap the general instance in function nod3. If there are extra prefixes, add these as well the formula
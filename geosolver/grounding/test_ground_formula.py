@@ -0,0 +1,82 @@
+"""
+The beam search of ground_formulas returns the grounding of scoring every combination of the candidates
+of the singular variables, with ties going to the earliest combination.
+"""
+from collections import OrderedDict
+import contextlib
+import io
+import itertools
+import os
+
+import pytest
+
+from geosolver.diagram.parse_core import parse_core
+from geosolver.diagram.parse_graph import parse_graph
+from geosolver.diagram.parse_image_segments import parse_image_segments
+from geosolver.diagram.parse_primitives import parse_primitives
+from geosolver.diagram.select_primitives import select_primitives
+from geosolver.grounding.ground_formula import ground_formulas, _get_singular_variables, _ground_variable, \
+    _combination_to_grounded_formulas
+from geosolver.grounding.states import MatchParse
+from geosolver.ontology.ontology_definitions import FormulaNode, VariableSignature, signatures
+from geosolver.utils.prep import open_image
+
+__author__ = 'minjoon'
+
+IMAGES_PATH = os.path.join(os.path.dirname(__file__), os.pardir, "images")
+IMAGE_NAMES = ["00142.png", "Circle-question-300x269.png", "body_SAT_triangles_20.3.png", "images (3).png"]
+
+
+@pytest.fixture(scope='module', params=IMAGE_NAMES)
+def match_parse(request):
+    image = open_image(os.path.join(IMAGES_PATH, request.param))
+    with contextlib.redirect_stdout(io.StringIO()):
+        graph_parse = parse_graph(parse_core(select_primitives(parse_primitives(parse_image_segments(image)))))
+    return MatchParse(graph_parse, {}, {})
+
+
+def _variable(name, return_type):
+    return FormulaNode(VariableSignature(name, return_type), [])
+
+
+def _formula(name, *args):
+    return FormulaNode(signatures[name], list(args))
+
+
+def _get_formulas():
+    p, q, r = _variable('p', 'line'), _variable('q', 'line'), _variable('r', 'line')
+    return [_formula('Perpendicular', p, q), _formula('Parallel', q, r),
+            _formula('Equals', _formula('LengthOf', p), _formula('LengthOf', r))]
+
+
+def _ground_exhaustively(match_parse, formulas):
+    core_parse = match_parse.graph_parse.core_parse
+    singular_variables = list(OrderedDict.fromkeys(
+        itertools.chain(*[_get_singular_variables(formula) for formula in formulas])))
+    grounded_variable_sets = []
+    for variable in singular_variables:
+        grounded_variable = _ground_variable(match_parse, variable, {})
+        if isinstance(grounded_variable, FormulaNode):
+            grounded_variable_sets.append([grounded_variable])
+        else:
+            grounded_variable_sets.append(grounded_variable.children)
+    max_score, max_grounded_formulas = None, None
+    for combination in itertools.product(*grounded_variable_sets):
+        grounded_formulas = _combination_to_grounded_formulas(match_parse, formulas, combination, singular_variables)
+        scores = [core_parse.evaluate(formula) for formula in grounded_formulas]
+        score = sum(each.conf for each in scores if each is not None)
+        if max_score is None or score > max_score:
+            max_score, max_grounded_formulas = score, grounded_formulas
+    return max_grounded_formulas
+
+
+def test_same_grounding(match_parse):
+    formulas = _get_formulas()
+    grounded_formulas = ground_formulas(match_parse, formulas)
+    assert repr(grounded_formulas) == repr(_ground_exhaustively(match_parse, formulas))
+
+
+def test_narrow_beam(match_parse):
+    formulas = _get_formulas()
+    grounded_formulas = ground_formulas(match_parse, formulas, beam_width=1)
+    assert len(grounded_formulas) == len(formulas)
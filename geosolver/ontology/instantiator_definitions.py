@@ -31,6 +31,9 @@ class polygon(tuple):
     def __new__(self, *points):
         return tuple.__new__(polygon, points)
 
+    def __getnewargs__(self):
+        return tuple(self)
+
 
 
 """
@@ -42,6 +45,7 @@ for key, value in instantiator_defs.items():
     args, _ = zip(*value)
     nt = namedtuple(key, ' '.join(args))
     instantiators[key] = nt
+    globals()[key] = nt  # Module attribute, so that instances can be pickled
 
 
 def get_polygon(*args):
@@ -1,6 +1,5 @@
 import itertools
 import networkx as nx
-from geosolver.utils.num import is_number
 
 __author__ = 'minjoon'
 
@@ -73,16 +72,41 @@ class VariableSignature(Signature):
         return False
 
 
+_EMPTY_SET = frozenset()
+
+
+def _union(sets):
+    """
+    Union of frozensets, reusing the argument when only one is non-empty.
+    """
+    non_empty = [each for each in sets if len(each) > 0]
+    if len(non_empty) == 0:
+        return _EMPTY_SET
+    if len(non_empty) == 1:
+        return non_empty[0]
+    return frozenset().union(*non_empty)
+
+
 class Node(object):
-    def __init__(self, children, parent=None, index=None):
-        self.parent = parent
-        self.index = index
+    """
+    Each node precomputes the ids of the variables and signatures in its subtree,
+    so has_signature, has_constant and is_grounded do not walk the subtree.
+    Nodes do not point to their parents, as formula nodes can be shared between formulas.
+    """
+    __slots__ = ('children', 'valence', 'variable_ids', 'signature_ids', '_has_constant', '_key')
+
+    def __init__(self, children):
         self.children = children
         self.valence = len(children)
-        for idx, child in enumerate(children):
-            if isinstance(child, Node):
-                child.parent = self
-                child.index = idx
+        self._set_subtree_attributes(_EMPTY_SET, _EMPTY_SET, False)
+        self._key = None
+
+    def _set_subtree_attributes(self, variable_ids, signature_ids, has_constant):
+        node_children = [child for child in self.children if isinstance(child, Node)]
+        self.variable_ids = _union([variable_ids] + [child.variable_ids for child in node_children])
+        self.signature_ids = _union([signature_ids] + [child.signature_ids for child in node_children])
+        self._has_constant = has_constant or len(node_children) < len(self.children) or \
+            any(child._has_constant for child in node_children)
 
     def serialized(self):
         serialized_children = [child.serialized() for child in self.children]
@@ -94,7 +118,7 @@ class Node(object):
 
     def replace_node(self, tester, getter=None):
         args = [child.replace_node(tester, getter) for child in self.children]
-        out = self.__class__(args, self.parent, self.index)
+        out = self.__class__(args)
         test = tester(out)
         if bool(test):
             if getter is None:
@@ -120,13 +144,31 @@ class Node(object):
         return len(self.children) > 1
 
     def has_signature(self, id_):
-        return any(not is_number(child) and child.has_signature(id_) for child in self.children)
+        return id_ in self.signature_ids
+
+    def get_key(self):
+        """
+        Hashable key made of the signature id of each formula node (the class name of other nodes)
+        and the children of the subtree, in order.
+        Unlike ==, it tells apart the arguments of symmetric signatures in different orders.
+        Computed once, as nodes are not modified after construction.
+        """
+        if self._key is None:
+            self._key = (self._get_head_key(),) + tuple(child.get_key() if isinstance(child, Node) else child
+                                                        for child in self.children)
+        return self._key
+
+    def _get_head_key(self):
+        return self.__class__.__name__
 
     def has_constant(self):
-        return any(not isinstance(child, Node) or child.has_constant() for child in self.children)
+        return self._has_constant
 
     def is_grounded(self, ids=()):
-        return all(not isinstance(child, Node) or child.is_grounded(ids) for child in self.children)
+        """
+        Determines if the formula's variables are only made of ids
+        """
+        return all(id_ in ids for id_ in self.variable_ids)
 
     def get_nodes(self, tester):
         return [node for node in self if tester(node)]
@@ -153,10 +195,34 @@ class Node(object):
 
 
 class FormulaNode(Node):
-    def __init__(self, signature, children, parent=None, index=None):
+    """
+    Formula nodes are immutable, so the hash is computed once, on first use, and children are stored as a tuple.
+    """
+    __slots__ = ('signature', 'return_type', '_hash')
+
+    def __init__(self, signature, children):
+        children = tuple(children)
         self.signature = signature
-        super(FormulaNode, self).__init__(children, parent, index)
+        self.children = children
+        self.valence = len(children)
         self.return_type = signature.return_type
+        self._key = None
+        if len(children) == 0 and isinstance(signature, VariableSignature):
+            self._set_subtree_attributes(frozenset([signature.id]), frozenset([signature.id]), False)
+        else:
+            self._set_subtree_attributes(_EMPTY_SET, frozenset([signature.id]), len(children) == 0)
+        self._hash = None
+
+    def __reduce_ex__(self, protocol):
+        if type(self) is FormulaNode:
+            return FormulaNode, (self.signature, self.children)
+        return super(FormulaNode, self).__reduce_ex__(protocol)
+
+    def _get_head_key(self):
+        return self.signature.id
+
+    def _is_symmetric(self):
+        return isinstance(self.signature, FunctionSignature) and self.signature.is_symmetric
 
     def replace_signature(self, tester, getter):
         """
@@ -179,7 +245,7 @@ class FormulaNode(Node):
                 args.append(child.replace_node(tester, getter))
             else:
                 args.append(child)
-        out = self.__class__(self.signature, args, self.parent, self.index)
+        out = self.__class__(self.signature, args)
         test = tester(out)
         if bool(test):
             if getter is None:
@@ -188,15 +254,25 @@ class FormulaNode(Node):
         return out
 
     def __hash__(self):
-        if isinstance(self.signature, FunctionSignature) and self.signature.is_symmetric:
-            return hash((self.signature, frozenset(self.children)))
-        return hash((self.signature, tuple(self.children)))
+        if self._hash is None:
+            if self._is_symmetric():
+                self._hash = hash((self.signature, frozenset(self.children)))
+            else:
+                self._hash = hash((self.signature, self.children))
+        return self._hash
 
     def __eq__(self, other):
-        if isinstance(self.signature, FunctionSignature) and self.signature.is_symmetric:
+        if self is other:
+            return True
+        if not isinstance(other, FormulaNode) or hash(self) != hash(other):
+            return False
+        if self._is_symmetric():
             return self.signature == other.signature and frozenset(self.children) == frozenset(other.children)
         return self.signature == other.signature and tuple(self.children) == tuple(other.children)
 
+    def __ne__(self, other):
+        return not self.__eq__(other)
+
     def __add__(self, other):
         current = signatures['Add']
         return FormulaNode(current, [self, other])
@@ -262,32 +338,11 @@ class FormulaNode(Node):
         out['signature'] = self.signature.serialized()
         return out
 
-    def has_signature(self, id_):
-        if self.signature.id == id_:
-            return True
-        return any(not is_number(child) and child.has_signature(id_) for child in self.children)
-
-    def has_constant(self):
-        if self.is_leaf():
-            if isinstance(self.signature, VariableSignature):
-                return False
-            return True
-        return any(not isinstance(child, Node) or child.has_constant() for child in self.children)
-
-    def is_grounded(self, ids=[]):
-        """
-        Determines if the formula's variables are only made of ids
-        :param core_parse:
-        :return:
-        """
-        if self.is_leaf():
-            if isinstance(self.signature, VariableSignature):
-                return self.signature.id in ids
-            return True
-        return all(not isinstance(child, Node) or child.is_grounded(ids) for child in self.children)
 
 
 class ZippedNode(Node):
+    __slots__ = ('nodes',)
+
     def __init__(self, nodes, children):
         super(ZippedNode, self).__init__(children)
         self.nodes = nodes
@@ -299,8 +354,10 @@ class ZippedNode(Node):
 
 
 class SetNode(Node):
-    def __init__(self, children, parent=None, index=None, head_index=0):
-        super(SetNode, self).__init__(children, parent, index)
+    __slots__ = ('head',)
+
+    def __init__(self, children, head_index=0):
+        super(SetNode, self).__init__(children)
         self.head = children[head_index]
 
     def __repr__(self):
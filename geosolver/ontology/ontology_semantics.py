@@ -1,3 +1,5 @@
+from functools import reduce
+
 import numpy as np
 
 import itertools
@@ -160,7 +162,7 @@ def Mul(a, b):
     return a * b
 
 def Div(a, b):
-    return float(a) / b
+    return a / b
 
 def RatioOf(a, b):
     return Div(a, b)
@@ -477,7 +479,27 @@ def _polygon_to_lines(polygon):
 def _polygon_to_angles(polygon):
     return [Angle(polygon[index-2], polygon[index-1], point) for index, point in enumerate(polygon)]
 
-def evaluate(formula, assignment):
+_MISSING = object()
+
+
+def evaluate(formula, assignment, memo=None):
+    """
+    :param dict assignment: variable id to value
+    :param LRUCache memo: if given, values of formula nodes under this assignment by their Node.get_key,
+    which are looked up and stored for the formula and all of its subformulas;
+    it must only be shared by calls with the same assignment
+    """
+    if memo is not None and isinstance(formula, FormulaNode):
+        key = formula.get_key()
+        out = memo.get(key, _MISSING)
+        if out is _MISSING:
+            out = _evaluate(formula, assignment, memo)
+            memo.set(key, out)
+        return out
+    return _evaluate(formula, assignment, memo)
+
+
+def _evaluate(formula, assignment, memo):
     if not isinstance(formula, Node):
         return formula
     if not formula.is_grounded(assignment.keys()):
@@ -485,7 +507,7 @@ def evaluate(formula, assignment):
 
     if isinstance(formula, SetNode):
         if issubtype(formula.head.return_type, 'boolean'):
-            out = reduce(operator.__and__, (evaluate(child, assignment) for child in formula.children), True)
+            out = reduce(operator.__and__, (evaluate(child, assignment, memo) for child in formula.children), True)
             return out
         return formula
 
@@ -497,9 +519,9 @@ def evaluate(formula, assignment):
         evaluated_args = []
         for arg in formula.children:
             if isinstance(arg, FormulaNode):
-                evaluated_args.append(evaluate(arg, assignment))
+                evaluated_args.append(evaluate(arg, assignment, memo))
             elif isinstance(arg, SetNode):
-                evaluated_args.append(SetNode([evaluate(arg_arg, assignment) for arg_arg in arg.children]))
+                evaluated_args.append(SetNode([evaluate(arg_arg, assignment, memo) for arg_arg in arg.children]))
             else:
                 evaluated_args.append(arg)
         # FIXME : rather than try/catch, check type matching
@@ -509,3 +531,108 @@ def evaluate(formula, assignment):
         except:
             return TruthValue(np.inf)
 
+
+def compile_formula(formula, variable_indices, constants=None):
+    """
+    Compiles formula into a function of a vector that returns evaluate(formula, assignment),
+    where assignment maps each variable id in variable_indices to its entry of the vector,
+    and each id in constants to its value.
+    Groundedness, variable lookups and semantic functions are resolved once here instead of per evaluation,
+    and subformulas without variables in variable_indices are evaluated once.
+
+    :param Node formula:
+    :param dict variable_indices: variable id to index in the vector
+    :param dict constants: variable id to fixed value
+    :return function:
+    """
+    if constants is None:
+        constants = {}
+    if isinstance(formula, Node) and not formula.is_grounded(set(variable_indices).union(constants)):
+        return lambda vector: None
+    function, _ = _compile(formula, variable_indices, constants)
+    return function
+
+
+def _compile(formula, variable_indices, constants):
+    """
+    :return tuple: the compiled function, and whether it is constant
+    """
+    if not isinstance(formula, Node):
+        return (lambda vector: formula), True
+
+    if isinstance(formula, SetNode):
+        if issubtype(formula.head.return_type, 'boolean'):
+            compiled_children = [_compile(child, variable_indices, constants) for child in formula.children]
+            children = [child for child, _ in compiled_children]
+
+            def call(vector):
+                return reduce(operator.__and__, (child(vector) for child in children), True)
+            return _fold(call, all(constant for _, constant in compiled_children))
+        return (lambda vector: formula), True
+
+    signature = formula.signature
+    if isinstance(signature, VariableSignature):
+        if signature.id in variable_indices:
+            index = variable_indices[signature.id]
+            return (lambda vector: vector[index]), False
+        value = constants[signature.id]
+        return (lambda vector: value), True
+    elif is_number(signature.id):
+        value = float(signature.id)
+        return (lambda vector: value), True
+
+    compiled_args = []
+    for arg in formula.children:
+        if isinstance(arg, FormulaNode):
+            compiled_args.append(_compile(arg, variable_indices, constants))
+        elif isinstance(arg, SetNode):
+            compiled_args.append(_compile_set_arg(arg, variable_indices, constants))
+        else:
+            compiled_args.append(((lambda vector, arg=arg: arg), True))
+    args = [arg for arg, _ in compiled_args]
+    function = getattr(this, signature.id, None)
+
+    # Specialized by arity to save a list and a star-call per node
+    if len(args) == 1:
+        arg0, = args
+
+        def call(vector):
+            value0 = arg0(vector)
+            try:
+                return function(value0)
+            except Exception:
+                return TruthValue(np.inf)
+    elif len(args) == 2:
+        arg0, arg1 = args
+
+        def call(vector):
+            value0, value1 = arg0(vector), arg1(vector)
+            try:
+                return function(value0, value1)
+            except Exception:
+                return TruthValue(np.inf)
+    else:
+        def call(vector):
+            evaluated_args = [arg(vector) for arg in args]
+            try:
+                return function(*evaluated_args)
+            except Exception:
+                return TruthValue(np.inf)
+    return _fold(call, all(constant for _, constant in compiled_args))
+
+
+def _compile_set_arg(set_node, variable_indices, constants):
+    compiled_children = [_compile(child, variable_indices, constants) for child in set_node.children]
+    children = [child for child, _ in compiled_children]
+
+    def call(vector):
+        return SetNode([child(vector) for child in children])
+    # SetNode sets the parent of its children, so a fresh one is built on every call
+    return call, False
+
+
+def _fold(call, constant):
+    if constant:
+        value = call(None)
+        return (lambda vector: value), True
+    return call, False
@@ -0,0 +1,62 @@
+"""
+Formula nodes compare and hash by signature id and children, so nodes built separately,
+or with a signature of the same id but another type or name, are equal.
+"""
+import pickle
+
+from geosolver.ontology.ontology_definitions import FormulaNode, VariableSignature, signatures
+
+__author__ = 'minjoon'
+
+
+def _variable(id_, return_type='number', name=None):
+    return FormulaNode(VariableSignature(id_, return_type, name=name), [])
+
+
+def test_equality():
+    a, b = _variable('a'), _variable('b')
+    formula = FormulaNode(signatures['Add'], [a, 2])
+    other = FormulaNode(signatures['Add'], [_variable('a'), 2])
+    assert formula == other and hash(formula) == hash(other)
+    assert formula is not other
+    assert formula != FormulaNode(signatures['Sub'], [a, 2])
+    assert formula != FormulaNode(signatures['Add'], [b, 2])
+
+    # Signatures are equal by id, as in augment_formulas and ground_formula that retype a variable
+    retyped = _variable('a', 'line', name='temp')
+    assert retyped == a and hash(retyped) == hash(a)
+    assert retyped.return_type == 'line' and a.return_type == 'number'
+    assert len({a, retyped}) == 1
+
+
+def test_symmetric_signatures():
+    line, other_line = _variable('l', 'line'), _variable('m', 'line')
+    formula = FormulaNode(signatures['Parallel'], [line, other_line])
+    swapped = FormulaNode(signatures['Parallel'], [other_line, line])
+    assert signatures['Parallel'].is_symmetric
+    assert formula == swapped and hash(formula) == hash(swapped)
+
+
+def test_subtree_attributes():
+    x, y = _variable('x'), _variable('y')
+    formula = FormulaNode(signatures['Equals'], [FormulaNode(signatures['Add'], [x, 1]), y])
+    assert formula.variable_ids == {'x', 'y'}
+    assert formula.has_signature('Add') and not formula.has_signature('Mul')
+    assert formula.has_constant()
+    assert formula.is_grounded(['x', 'y']) and not formula.is_grounded(['x'])
+
+
+def test_pickle():
+    formula = FormulaNode(signatures['Add'], [_variable('x'), 1])
+    copy = pickle.loads(pickle.dumps(formula))
+    assert copy == formula and copy.variable_ids == formula.variable_ids
+
+
+def test_key():
+    line, other_line = _variable('l', 'line'), _variable('m', 'line')
+    formula = FormulaNode(signatures['Parallel'], [line, other_line])
+    swapped = FormulaNode(signatures['Parallel'], [other_line, line])
+    assert formula == swapped and formula.get_key() != swapped.get_key()
+    assert formula.get_key() == FormulaNode(signatures['Parallel'], [_variable('l', 'line'), other_line]).get_key()
+    assert formula.get_key() == ('Parallel', ('l',), ('m',))
+    assert FormulaNode(signatures['Add'], [_variable('x'), 2]).get_key() == ('Add', ('x',), 2)
@@ -0,0 +1,92 @@
+"""
+Compiled formulas, and evaluations through a memo, return the same values as evaluate on the corresponding assignment.
+"""
+import numpy as np
+import pytest
+
+from geosolver.ontology.ontology_semantics import evaluate, compile_formula, TruthValue
+from geosolver.solver.variable_handler import VariableHandler
+from geosolver.utils.lru import LRUCache
+
+__author__ = 'minjoon'
+
+
+def _get_formulas():
+    vh = VariableHandler()
+    x = vh.number('x')
+    A, B, C, D, O = [vh.point(name) for name in "ABCDO"]
+    AB, BC, CA, CD, AD = vh.line(A, B), vh.line(B, C), vh.line(C, A), vh.line(C, D), vh.line(A, D)
+    cO = vh.circle(O)
+    angle = vh.apply('Angle', A, B, C)
+    triangle = vh.apply('Triangle', A, B, C)
+    quad = vh.apply('Quad', A, B, C, D)
+    formulas = [vh.apply('Equals', vh.apply('LengthOf', AB), 3),
+                vh.apply('Equals', vh.apply('LengthOf', BC), x),
+                vh.apply('Equals', vh.apply('LengthOf', CA), (16 + x**2)**0.5),
+                vh.apply('Perpendicular', AB, BC),
+                vh.apply('Parallel', AB, CD),
+                vh.apply('Tangent', AB, cO),
+                vh.apply('Equals', vh.apply('RadiusOf', cO), 5),
+                vh.apply('IsChordOf', CD, cO),
+                vh.apply('IsDiameterLineOf', AD, cO),
+                vh.apply('PointLiesOnLine', D, AB),
+                vh.apply('PointLiesOnCircle', A, cO),
+                vh.apply('Equals', vh.apply('MeasureOf', angle), x),
+                vh.apply('Equals', vh.apply('AreaOf', triangle), 6),
+                vh.apply('Equals', vh.apply('PerimeterOf', quad), 4*x),
+                vh.apply('IsMidpointOf', D, AB),
+                vh.apply('IsRightAngle', angle),
+                vh.apply('IsCenterOf', O, cO),
+                vh.apply('Equals', vh.apply('SquareOf', x), vh.apply('Sqrt', 9)),
+                vh.apply('Equals', vh.apply('Div', vh.apply('LengthOf', AB), vh.apply('LengthOf', CD)), 2),
+                vh.apply('LengthOf', AB),
+                vh.apply('AreaOf', cO),
+                ]
+    return vh, formulas
+
+
+def _to_value(value):
+    if isinstance(value, TruthValue):
+        return value.norm
+    return np.asarray(value, dtype=float)
+
+
+@pytest.mark.parametrize('seed', range(10))
+def test_compiled_formulas_match_evaluate(seed):
+    vh, formulas = _get_formulas()
+    variable_indices = vh.get_variable_indices()
+    constants = vh.get_fixed_assignment()
+    vector = np.random.RandomState(seed).uniform(-5, 5, len(variable_indices))
+    assignment = vh.vector_to_dict(vector)
+    for formula in formulas:
+        value = compile_formula(formula, variable_indices, constants)(vector)
+        expected = evaluate(formula, assignment)
+        assert np.allclose(_to_value(value), _to_value(expected), equal_nan=True), formula
+
+
+def test_ungrounded_formula():
+    vh, formulas = _get_formulas()
+    variable_indices = {name: idx for name, idx in vh.get_variable_indices().items() if name != 'x'}
+    assignment = vh.vector_to_dict(np.ones(len(vh.get_variable_indices())))
+    del assignment['x']
+    compiled = compile_formula(formulas[1], variable_indices, vh.get_fixed_assignment())
+    assert compiled(np.ones(len(vh.get_variable_indices()))) is None
+    assert evaluate(formulas[1], assignment) is None
+
+
+def test_memo():
+    vh, formulas = _get_formulas()
+    assignment = vh.vector_to_dict(np.random.RandomState(0).uniform(-5, 5, len(vh.get_variable_indices())))
+    memo = LRUCache(1000)
+    for formula in formulas + formulas:
+        value = evaluate(formula, assignment, memo=memo)
+        assert np.allclose(_to_value(value), _to_value(evaluate(formula, assignment)))
+    assert memo.hits >= len(formulas)
+
+    # Symmetric signatures evaluate their arguments in order, so a swapped formula is memoized separately
+    A, B = vh.named_entities['A'], vh.named_entities['B']
+    C, D = vh.named_entities['C'], vh.named_entities['D']
+    formula = vh.apply('Perpendicular', vh.line(A, B), vh.line(C, D))
+    swapped = vh.apply('Perpendicular', vh.line(C, D), vh.line(A, B))
+    evaluate(formula, assignment, memo=memo)
+    assert swapped.get_key() not in memo
@@ -39,4 +39,23 @@ CIRCLE_EPS = 6
 PRIMITIVE_SELECTION_MIN_GAIN = 0
 
 INTERSECTION_EPS = 3
+# Radius of the clusters of intersections merged into single points in parse_core.
 KMEANS_RADIUS_THRESHOLD = 8
+# If this many clusters are needed, the radius is not enforced and the intersections are merged into this many points.
+KMEANS_MAX_NUM_CLUSTERS = 20
+
+# Maximum number of solutions kept by the solver solution cache.
+SOLUTION_CACHE_SIZE = 10000
+
+# Number of partial combinations of candidates kept by the beam search of grounding.ground_formula.ground_formulas.
+GROUNDING_BEAM_WIDTH = 1000
+
+# Maximum number of formula values memoized by CoreParse.evaluate.
+EVALUATION_MEMO_SIZE = 100000
+
+# Process pool of run.full_test (see utils.benchmark.run_benchmark).
+# None workers means one per CPU; the memory limit is in bytes of address space per worker, None for no limit.
+BENCHMARK_NUM_PROCESSES = None
+BENCHMARK_TIMEOUT = 2400
+BENCHMARK_MEMORY_LIMIT = None
+BENCHMARK_MAX_TASKS_PER_CHILD = 1
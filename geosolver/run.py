@@ -1,4 +1,4 @@
-from cStringIO import StringIO
+from io import StringIO
 import json
 import logging
 import numbers
@@ -6,8 +6,7 @@ from pprint import pprint
 import shutil
 import sys
 import time
-import signal
-from geosolver import geoserver_interface
+from geosolver import geoserver_interface, parameters
 from geosolver.database.utils import split
 from geosolver.diagram.parse_confident_formulas import parse_confident_formulas
 from geosolver.diagram.shortcuts import question_to_match_parse
@@ -31,8 +30,9 @@ from geosolver.text.complete_formulas import complete_formulas
 from geosolver.text.syntax_parser import stanford_parser
 from geosolver.ontology.utils import filter_formulas, reduce_formulas
 from geosolver.ontology.utils import flatten_formulas
+from geosolver.utils.benchmark import run_benchmark, time_limit
 from geosolver.utils.prep import open_image
-import cPickle as pickle
+import pickle
 import os.path
 
 __author__ = 'minjoon'
@@ -84,7 +84,7 @@ def annotated_unit_test(query):
 def _annotated_unit_test(query):
     questions = geoserver_interface.download_questions(query)
     all_annotations = geoserver_interface.download_semantics(query)
-    pk, question = questions.items()[0]
+    pk, question = next(iter(questions.items()))
 
     choice_formulas = get_choice_formulas(question)
     label_data = geoserver_interface.download_labels(pk)[pk]
@@ -97,12 +97,12 @@ def _annotated_unit_test(query):
     match_formulas = parse_match_formulas(match_parse)
     diagram_formulas = parse_confident_formulas(graph_parse)
     all_formulas = match_formulas + diagram_formulas
-    for number, sentence_words in question.sentence_words.iteritems():
+    for number, sentence_words in question.sentence_words.items():
         syntax_parse = stanford_parser.get_best_syntax_parse(sentence_words)
         annotation_nodes = [annotation_to_semantic_tree(syntax_parse, annotation)
                             for annotation in all_annotations[pk][number].values()]
         expr_formulas = {key: prefix_to_formula(expression_parser.parse_prefix(expression))
-                         for key, expression in question.sentence_expressions[number].iteritems()}
+                         for key, expression in question.sentence_expressions[number].items()}
         truth_expr_formulas, value_expr_formulas = _separate_expr_formulas(expr_formulas)
         text_formula_parse = semantic_trees_to_text_formula_parse(annotation_nodes)
         completed_formulas = complete_formulas(text_formula_parse)
@@ -113,8 +113,8 @@ def _annotated_unit_test(query):
 
     reduced_formulas = reduce_formulas(all_formulas)
     for reduced_formula in reduced_formulas:
-        score = evaluate(reduced_formula, core_parse.variable_assignment)
-        scores = [evaluate(child, core_parse.variable_assignment) for child in reduced_formula.children]
+        score = core_parse.evaluate(reduced_formula)
+        scores = [core_parse.evaluate(child) for child in reduced_formula.children]
         print(reduced_formula, score, scores)
     # core_parse.display_points()
 
@@ -129,7 +129,7 @@ def _annotated_unit_test(query):
             correct = False
     else:
         attempted = True
-        c = max(ans.iteritems(), key=lambda pair: pair[1].conf)[0]
+        c = max(ans.items(), key=lambda pair: pair[1].conf)[0]
         if c == int(float(question.answer)):
             correct = True
         else:
@@ -138,7 +138,7 @@ def _annotated_unit_test(query):
     result = SimpleResult(query, False, attempted, correct)
     return result
 
-def full_unit_test(combined_model, question, label_data):
+def full_unit_test(combined_model, question, label_data, maxtime=parameters.BENCHMARK_TIMEOUT):
     """
     Attempts to solve the question with id=id_.
     If the answer is correct, return 'c'
@@ -146,17 +146,12 @@ def full_unit_test(combined_model, question, label_data):
     If an error occurred, return 'e'
 
     :param id_:
+    :param int maxtime: seconds before the attempt is abandoned; None if the caller enforces it
     :return SimpleResult:
     """
-    maxtime = 2400
-
-    def handler(signum, frame):
-        raise Exception("Timeout")
-    signal.signal(signal.SIGALRM, handler)
-    signal.alarm(maxtime)
-
     try:
-        result = _full_unit_test(combined_model, question, label_data)
+        with time_limit(maxtime):
+            result = _full_unit_test(combined_model, question, label_data)
     except Exception as e:
         logging.error(question.key)
         logging.exception(e)
@@ -273,7 +268,7 @@ def _full_unit_test(combined_model, question, label_data):
     optimized_list = []
     entity_list = []
     solution = ""
-    json.dump(question._asdict(), open(question_path, 'wb'))
+    json.dump(question._asdict(), open(question_path, 'w'))
 
     choice_formulas = get_choice_formulas(question)
     match_parse = question_to_match_parse(question, label_data)
@@ -289,11 +284,11 @@ def _full_unit_test(combined_model, question, label_data):
     all_formulas = set(match_formulas + diagram_formulas)
 
     opt_model = FullGreedyOptModel(combined_model, match_parse)
-    for number, sentence_words in question.sentence_words.iteritems():
+    for number, sentence_words in question.sentence_words.items():
         syntax_parse = stanford_parser.get_best_syntax_parse(sentence_words)
 
         expr_formulas = {key: prefix_to_formula(expression_parser.parse_prefix(expression))
-                         for key, expression in question.sentence_expressions[number].iteritems()}
+                         for key, expression in question.sentence_expressions[number].items()}
         truth_expr_formulas, value_expr_formulas = _separate_expr_formulas(expr_formulas)
 
         semantic_forest = opt_model.combined_model.get_semantic_forest(syntax_parse)
@@ -322,10 +317,10 @@ def _full_unit_test(combined_model, question, label_data):
             optimized_list.append({'simple': t.simple_repr(), 'tree': t.serialized(), 'sentence_number': number,
                                     'score': opt_model.get_magic_score(t, cc_trees)})
 
-        for key, f in expr_formulas.iteritems():
+        for key, f in expr_formulas.items():
             if key.startswith("v"):
                 pass
-            index = (i for i, word in sentence_words.iteritems() if word == key).next()
+            index = next(i for i, word in sentence_words.items() if word == key)
             tree = formula_to_semantic_tree(f, syntax_parse, (index, index+1))
             print("f and t:", f, tree)
             text_parse_list.append({'simple': f.simple_repr(), 'tree': tree.serialized(), 'sentence_number': number, 'score': 1.0})
@@ -353,8 +348,8 @@ def _full_unit_test(combined_model, question, label_data):
     reduced_formulas = all_formulas # reduce_formulas(all_formulas)
     for reduced_formula in reduced_formulas:
         if reduced_formula.is_grounded(core_parse.variable_assignment.keys()):
-            score = evaluate(reduced_formula, core_parse.variable_assignment)
-            scores = [evaluate(child, core_parse.variable_assignment) for child in reduced_formula.children]
+            score = core_parse.evaluate(reduced_formula)
+            scores = [core_parse.evaluate(child) for child in reduced_formula.children]
         else:
             score = None
             scores = None
@@ -363,16 +358,16 @@ def _full_unit_test(combined_model, question, label_data):
     solution = solution.rstrip()
     # core_parse.display_points()
 
-    json.dump(diagram_parse_list, open(diagram_parse_path, 'wb'))
-    json.dump(optimized_list, open(optimized_path, 'wb'))
-    json.dump(text_parse_list, open(text_parse_path, 'wb'))
-    json.dump(entity_list, open(entity_list_path, 'wb'))
-    json.dump(solution, open(solution_path, 'wb'))
+    json.dump(diagram_parse_list, open(diagram_parse_path, 'w'))
+    json.dump(optimized_list, open(optimized_path, 'w'))
+    json.dump(text_parse_list, open(text_parse_path, 'w'))
+    json.dump(entity_list, open(entity_list_path, 'w'))
+    json.dump(solution, open(solution_path, 'w'))
 
     # return SimpleResult(question.key, False, False, True) # Early termination
 
     print("Solving...")
-    ans = solve(reduced_formulas, choice_formulas, assignment=None)#core_parse.variable_assignment)
+    ans = solve(reduced_formulas, choice_formulas, assignment=core_parse.variable_assignment)
     print("ans:", ans)
 
 
@@ -383,7 +378,7 @@ def _full_unit_test(combined_model, question, label_data):
         else:
             correct = False
     else:
-        idx, tv = max(ans.iteritems(), key=lambda pair: pair[1].conf)
+        idx, tv = max(ans.items(), key=lambda pair: pair[1].conf)
         if tv.conf > 0.98:
             if idx == int(float(question.answer)):
                 correct = True
@@ -403,7 +398,7 @@ def _full_unit_test(combined_model, question, label_data):
 def _separate_expr_formulas(expr_formulas):
     truth_expr_formulas = []
     value_expr_formulas = {}
-    for key, expr_formula in expr_formulas.iteritems():
+    for key, expr_formula in expr_formulas.items():
         if key[1] == 's':
             truth_expr_formulas.append(expr_formula)
         else:
@@ -417,13 +412,13 @@ def get_choice_formulas(question):
     :return:
     """
     choice_formulas = {}
-    for number, choice_expressions in question.choice_expressions.iteritems():
+    for number, choice_expressions in question.choice_expressions.items():
         choice_words = question.choice_words[number]
         if len(choice_expressions) == 1:
-            string = choice_expressions.values()[0]
+            string = next(iter(choice_expressions.values()))
         elif len(choice_expressions) == 0:
             if len(choice_words) == 1:
-                string = choice_words.values()[0]
+                string = next(iter(choice_words.values()))
             else:
                 continue
                 # string = r"\none"
@@ -487,16 +482,14 @@ def full_test():
 
     tr_questions = geoserver_interface.download_questions('aaai')
     te_questions = geoserver_interface.download_questions('official')
-    te_keys = te_questions.keys() # [968, 971, 973, 1018]
-    all_questions = dict(tr_questions.items() + te_questions.items())
-    tr_ids = tr_questions.keys()
-    te_ids = te_questions.keys()
-
-    if not load:
-        all_syntax_parses = questions_to_syntax_parses(all_questions)
-        pickle.dump(all_syntax_parses, open('syntax_parses.p', 'wb'))
-    else:
-        all_syntax_parses = pickle.load(open('syntax_parses.p', 'rb'))
+    te_keys = list(te_questions.keys()) # [968, 971, 973, 1018]
+    all_questions = dict(tr_questions)
+    all_questions.update(te_questions)
+    tr_ids = list(tr_questions.keys())
+    te_ids = list(te_questions.keys())
+
+    # Served from the syntax parse cache of stanford_parser after the first run
+    all_syntax_parses = questions_to_syntax_parses(all_questions)
     all_annotations = geoserver_interface.download_semantics()
     all_labels = geoserver_interface.download_labels()
 
@@ -518,13 +511,16 @@ def full_test():
         cm = pickle.load(open('cm.p', 'rb'))
 
     print("test ids: %s" % ", ".join(str(k) for k in te_s.keys()))
-    for idx, id_ in enumerate(te_keys):
-        question = all_questions[id_]
-        label = all_labels[id_]
-        id_ = str(id_)
+    # Each question runs in a worker process that enforces the time limit itself,
+    # so a hanging or crashing question only costs its own result.
+    args_list = [(cm, all_questions[id_], all_labels[id_], None) for id_ in te_keys]
+    results = run_benchmark(full_unit_test, args_list)
+    for idx, (key_idx, result, message) in enumerate(results):
+        id_ = str(te_keys[key_idx])
+        if result is None:
+            result = SimpleResult(id_, True, False, False, message=message)
         print("-"*80)
         print("id: %s" % id_)
-        result = full_unit_test(cm, question, label)
         print(result.message)
         print(result)
         if result.error:
@@ -543,7 +539,7 @@ def full_test():
     print(out)
 
     dirs_path = os.path.join(demo_path, 'dirs.json')
-    json.dump([str(x) for x in te_keys], open(dirs_path, 'wb'))
+    json.dump([str(x) for x in te_keys], open(dirs_path, 'w'))
 
 
 def data_stat(query):
@@ -553,9 +549,9 @@ def data_stat(query):
     unary_rules = []
     binary_rules = []
     semantic_trees = []
-    for pk, local_syntax_parses in syntax_parses.iteritems():
+    for pk, local_syntax_parses in syntax_parses.items():
         print(pk)
-        for number, syntax_parse in local_syntax_parses.iteritems():
+        for number, syntax_parse in local_syntax_parses.items():
             local_semantic_trees = [annotation_to_semantic_tree(syntax_parse, annotation)
                               for annotation in annotations[pk][number].values()]
             semantic_trees.extend(local_semantic_trees)
@@ -566,15 +562,15 @@ def data_stat(query):
 
     tag_model = train_tag_model(syntax_parses, annotations)
 
-    print("sentences: %d" % sum(len(question.sentence_words) for _, question in questions.iteritems()))
-    print("words: %d" % (sum(len(words) for _, question in questions.iteritems() for _, words in question.sentence_words.iteritems())))
+    print("sentences: %d" % sum(len(question.sentence_words) for _, question in questions.items()))
+    print("words: %d" % (sum(len(words) for _, question in questions.items() for _, words in question.sentence_words.items())))
     print("literals: %d" % len(semantic_trees))
     print("unary rules: %d" % len(unary_rules))
     print("binary rules: %d" % len(binary_rules))
 
     print("")
     print("LEXICON")
-    for key, s in tag_model.lexicon.iteritems():
+    for key, s in tag_model.lexicon.items():
         print("%s: %s" % ("_".join(key), ", ".join(" ".join(ss) for ss in s)))
 
 
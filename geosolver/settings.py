@@ -3,8 +3,29 @@ Contains non-parametric constants used throughout the module.
 That is, DO NOT include performance-affecting parameters here.
 Instead, place parameters in paramters.py
 """
+import os
+
 __author__ = 'minjoon'
 
 
 STANFORD_PARSER_SERVER_URL = "http://localhost:9000/dep"
 GEOSERVER_URL = "http://localhost:8000"
+# Directory of the persistent caches, each in its own subdirectory (see get_cache_path); None disables them.
+# A relative path is resolved against the root of the repository, not the working directory.
+CACHE_ROOT = None
+# Serve everything from the local mirror of the geoserver (see database.geoserver_mirror), stored under CACHE_ROOT,
+# without accessing the geoserver.
+GEOSERVER_OFFLINE = False
+
+
+def get_cache_path(name):
+    """
+    Read at call time, so that CACHE_ROOT can be set after import.
+
+    :param str name: file or directory name of the cache
+    :return str: absolute path of the cache under CACHE_ROOT, or None if CACHE_ROOT is None
+    """
+    if CACHE_ROOT is None:
+        return None
+    root = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir)
+    return os.path.normpath(os.path.join(root, CACHE_ROOT, name))
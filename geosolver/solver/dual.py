@@ -0,0 +1,169 @@
+"""
+Forward-mode automatic differentiation with dual numbers.
+A Dual carries a value and its gradient with respect to all variables of the optimization vector,
+so a single evaluation of the semantics functions on Duals yields the objective and its gradient.
+Numpy ufuncs on Duals (np.sqrt, np.arctan2, ...) dispatch to the methods of the same name.
+"""
+import numpy as np
+
+__author__ = 'minjoon'
+
+
+class Dual(object):
+    __slots__ = ('value', 'gradient')
+
+    def __init__(self, value, gradient):
+        self.value = value
+        self.gradient = gradient
+
+    def __add__(self, other):
+        if isinstance(other, Dual):
+            return Dual(self.value + other.value, self.gradient + other.gradient)
+        return Dual(self.value + other, self.gradient)
+
+    def __radd__(self, other):
+        return Dual(other + self.value, self.gradient)
+
+    def __sub__(self, other):
+        if isinstance(other, Dual):
+            return Dual(self.value - other.value, self.gradient - other.gradient)
+        return Dual(self.value - other, self.gradient)
+
+    def __rsub__(self, other):
+        return Dual(other - self.value, -self.gradient)
+
+    def __mul__(self, other):
+        if isinstance(other, Dual):
+            return Dual(self.value * other.value, self.gradient * other.value + other.gradient * self.value)
+        return Dual(self.value * other, self.gradient * other)
+
+    def __rmul__(self, other):
+        return Dual(other * self.value, other * self.gradient)
+
+    def __truediv__(self, other):
+        if isinstance(other, Dual):
+            value = self.value / other.value
+            return Dual(value, (self.gradient - other.gradient * value) / other.value)
+        return Dual(self.value / other, self.gradient / other)
+
+    def __rtruediv__(self, other):
+        value = other / self.value
+        return Dual(value, -self.gradient * value / self.value)
+
+    def __pow__(self, other):
+        if isinstance(other, Dual):
+            return (self.log() * other).exp()
+        if other == 0:
+            return Dual(1.0, np.zeros_like(self.gradient))
+        return Dual(self.value ** other, self.gradient * (other * self.value ** (other - 1)))
+
+    def __rpow__(self, other):
+        value = other ** self.value
+        return Dual(value, self.gradient * (value * np.log(other)))
+
+    def __mod__(self, other):
+        return Dual(self.value % other, self.gradient)
+
+    def __neg__(self):
+        return Dual(-self.value, -self.gradient)
+
+    def __pos__(self):
+        return self
+
+    def __abs__(self):
+        return Dual(abs(self.value), self.gradient * np.sign(self.value))
+
+    def __float__(self):
+        return float(self.value)
+
+    def __lt__(self, other):
+        return self.value < _value(other)
+
+    def __le__(self, other):
+        return self.value <= _value(other)
+
+    def __gt__(self, other):
+        return self.value > _value(other)
+
+    def __ge__(self, other):
+        return self.value >= _value(other)
+
+    def __eq__(self, other):
+        return self.value == _value(other)
+
+    def __ne__(self, other):
+        return self.value != _value(other)
+
+    def __hash__(self):
+        return hash(self.value)
+
+    def __repr__(self):
+        return "Dual(%r, %r)" % (self.value, self.gradient)
+
+    def sqrt(self):
+        value = np.sqrt(self.value)
+        if value == 0:
+            # Subgradient at the kink of the norms built on sqrt
+            return Dual(value, np.zeros_like(self.gradient))
+        return Dual(value, self.gradient / (2 * value))
+
+    def exp(self):
+        value = np.exp(self.value)
+        return Dual(value, self.gradient * value)
+
+    def log(self):
+        return Dual(np.log(self.value), self.gradient / self.value)
+
+    def sin(self):
+        return Dual(np.sin(self.value), self.gradient * np.cos(self.value))
+
+    def cos(self):
+        return Dual(np.cos(self.value), -self.gradient * np.sin(self.value))
+
+    def arccos(self):
+        return Dual(np.arccos(self.value), -self.gradient / np.sqrt(1 - self.value ** 2))
+
+    def arctan2(self, other):
+        """
+        np.arctan2(self, other), i.e. self is the y coordinate.
+        """
+        x_value = _value(other)
+        x_gradient = other.gradient if isinstance(other, Dual) else 0
+        squared_norm = self.value ** 2 + x_value ** 2
+        if squared_norm == 0:
+            return Dual(np.arctan2(self.value, x_value), np.zeros_like(self.gradient))
+        gradient = (self.gradient * x_value - x_gradient * self.value) / squared_norm
+        return Dual(np.arctan2(self.value, x_value), gradient)
+
+    def ceil(self):
+        return Dual(np.ceil(self.value), np.zeros_like(self.gradient))
+
+    def floor(self):
+        return Dual(np.floor(self.value), np.zeros_like(self.gradient))
+
+
+def seed(vector):
+    """
+    Duals for the entries of vector, each with the unit gradient of its own index.
+
+    :param numpy.ndarray vector:
+    :return list:
+    """
+    identity = np.eye(len(vector))
+    return [Dual(float(value), identity[idx]) for idx, value in enumerate(vector)]
+
+
+def value_and_gradient(x, size):
+    """
+    Splits the result of an evaluation on seeded duals into its value and gradient.
+    x is a plain number when it does not depend on any variable.
+    """
+    if isinstance(x, Dual):
+        return x.value, x.gradient
+    return float(x), np.zeros(size)
+
+
+def _value(x):
+    if isinstance(x, Dual):
+        return x.value
+    return x
@@ -0,0 +1,129 @@
+"""
+Initialization and scaling of the variables before numeric optimization.
+Seeded values (e.g. the point coordinates and radii of the CoreParse) are measured in pixels,
+while the numbers in the text are in the units of the problem.
+The seeded values are first rescaled into problem units, using the Equals atoms that compare a diagram measurement
+to a given number, or to unit extent if there is none.
+Number variables that only appear in the text are then seeded from the atoms that determine them,
+and each free variable gets the scale the solver optimizes it in.
+"""
+import numpy as np
+
+from geosolver.ontology.ontology_definitions import FormulaNode
+from geosolver.ontology.ontology_semantics import evaluate
+from geosolver.solver.propagate import solve_equation
+from geosolver.solver.variable_handler import VariableHandler, get_variables
+
+__author__ = 'minjoon'
+
+DEGREE_TOLERANCE = 10**-6
+
+
+def initialize(variable_handler, atoms, rescale=True):
+    """
+    :param VariableHandler variable_handler:
+    :param list atoms: atoms added to variable_handler
+    :param bool rescale: if not set, the seeded values are taken to be in problem units already
+    :return float: the factor the seeded values were multiplied by
+    """
+    assert isinstance(variable_handler, VariableHandler)
+    equations = [atom.children for atom in atoms
+                 if isinstance(atom, FormulaNode) and atom.signature.id == 'Equals' and len(atom.children) == 2]
+    factor = 1.0
+    if rescale:
+        factor = _get_unit_factor(variable_handler, equations)
+        for name in variable_handler.seeded:
+            variable_handler.set_value(name, variable_handler.get_value(name) * factor)
+    _seed_numbers(variable_handler, equations)
+    _set_scales(variable_handler)
+    return factor
+
+
+def _get_unit_factor(variable_handler, equations):
+    """
+    Median over the equations between a measurement of the seeded values and a given value
+    of the factor that makes them agree.
+    The degree of each measurement in the scale (1 for lengths, 2 for areas, 0 for angles, which are skipped)
+    is found by measuring at double scale.
+    Without such equation, the seeded point coordinates are scaled to unit extent.
+    """
+    seeded = variable_handler.seeded
+    free_names = set(variable_handler.get_free_variables())
+    variables = variable_handler.layout.to_dict()
+    estimates = []
+    for sides in equations:
+        for measured, given in (sides, sides[::-1]):
+            names = get_variables(measured, variables)
+            if len(names) == 0 or not names <= seeded or len(get_variables(given, free_names | seeded)) > 0:
+                continue
+            given_value = _measure(given, variables, seeded, 1.0)
+            value = _measure(measured, variables, seeded, 1.0)
+            double_value = _measure(measured, variables, seeded, 2.0)
+            if given_value is None or value is None or double_value is None or given_value <= 0 or value <= 0:
+                continue
+            degree = np.log2(double_value / value)
+            if abs(degree - round(degree)) > DEGREE_TOLERANCE or round(degree) < 1:
+                continue
+            estimates.append((given_value / value) ** (1.0 / round(degree)))
+    if len(estimates) > 0:
+        return float(np.median(estimates))
+
+    coordinates = [variable_handler.get_value(name) for name in seeded & variable_handler.point_coordinates]
+    extent = np.ptp(coordinates) if len(coordinates) > 0 else 0
+    if extent > 0:
+        return 1.0 / extent
+    return 1.0
+
+
+def _measure(formula, variables, seeded, factor):
+    assignment = {name: value * factor if name in seeded else value for name, value in variables.items()}
+    try:
+        value = evaluate(formula, assignment)
+    except Exception:
+        return None
+    if not np.isscalar(value) or not np.isfinite(value):
+        return None
+    return float(value)
+
+
+def _seed_numbers(variable_handler, equations):
+    """
+    Seeds each random number variable that is the only random variable of an equation,
+    from the current values of the others, until no equation seeds a new variable.
+    """
+    changed = True
+    while changed:
+        changed = False
+        random_names = set(variable_handler.get_free_variables()) - variable_handler.seeded - \
+            variable_handler.point_coordinates
+        for left, right in equations:
+            names = get_variables(left, random_names) | get_variables(right, random_names)
+            if len(names) != 1:
+                continue
+            name, = names
+            assignment = dict(variable_handler.variables)
+            del assignment[name]
+            value = solve_equation(left, right, name, assignment)
+            if value is not None:
+                variable_handler.set_value(name, value)
+                variable_handler.seeded.add(name)
+                random_names.discard(name)
+                changed = True
+
+
+def _set_scales(variable_handler):
+    """
+    Point coordinates share the extent of the seeded points, and seeded numbers use their own magnitude.
+    Random values are drawn in [0,1] and keep scale 1.
+    """
+    seeded = variable_handler.seeded
+    coordinates = [variable_handler.get_value(name) for name in seeded & variable_handler.point_coordinates]
+    coordinate_scale = np.ptp(coordinates) if len(coordinates) > 0 else 0
+    for name in variable_handler.get_free_variables():
+        if name in variable_handler.point_coordinates:
+            scale = coordinate_scale
+        elif name in seeded:
+            scale = abs(variable_handler.get_value(name))
+        else:
+            scale = 1.0
+        variable_handler.scales[name] = float(scale) if scale > 0 else 1.0
@@ -1,32 +1,59 @@
-import functools
-import algopy
-# import pyipopt
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import multiprocessing
 from scipy.optimize import minimize, newton_krylov, basinhopping
+import networkx as nx
 import numpy as np
-from scipy.optimize.nonlin import NoConvergence
+from scipy.optimize import NoConvergence
 import time
 
-from geosolver.ontology.ontology_semantics import evaluate, TruthValue
-from geosolver.solver.variable_handler import VariableHandler
+from geosolver.ontology.ontology_semantics import evaluate, TruthValue, compile_formula
+from geosolver.solver.dual import seed, value_and_gradient
+from geosolver.solver.initialize import initialize
+from geosolver.solver.propagate import propagate
+from geosolver.solver.solution_cache import get_solution_cache, get_key
+from geosolver.solver.variable_handler import VariableHandler, get_variables
 from geosolver.ontology.ontology_definitions import FormulaNode
 
 __author__ = 'minjoon'
 
 
 class NumericSolver(object):
-    def __init__(self, prior_atoms, variable_handler=None, max_num_resets=3, tol=10**-3, assignment=None):
+    def __init__(self, prior_atoms, variable_handler=None, max_num_resets=3, tol=10**-3, assignment=None,
+                 num_processes=1, propagation=True, rescale=True, use_cache=False):
+        """
+        :param dict assignment: initial values of the variables, e.g. core_parse.variable_assignment
+        :param VariableHandler variable_handler: handler the atoms are built with; the solver works on a copy
+        :param bool propagation: if set, variables determined in closed form by the atoms are fixed
+        before any numeric solving (see propagate)
+        :param bool rescale: if set, the values of assignment are in diagram units,
+        and are rescaled to the units of the atoms (see initialize)
+        :param bool use_cache: if set, solutions are looked up in and stored to the solution cache of the process
+        (see get_solution_cache)
+        """
         if variable_handler is None:
             variable_handler = VariableHandler()
+        else:
+            # Propagation and initialization change the values, so the caller's handler is left as it is
+            variable_handler = variable_handler.copy()
         self.variable_handler = variable_handler
         self.atoms = [variable_handler.add(prior_atom, assignment=assignment) for prior_atom in prior_atoms]
+        if propagation:
+            for name, value in propagate(variable_handler, self.atoms).items():
+                variable_handler.fix(name, value)
+        initialize(variable_handler, self.atoms, rescale=rescale)
         self.max_num_resets = max_num_resets
         self.tol = tol
+        self.num_processes = num_processes
+        self.solution_cache = get_solution_cache() if use_cache else None
         self.assignment = None
-        self.assigned = False
+        self.assigned = False  # True once all atoms are solved
+        self.solved_variables = set()
         self.confidence = None
 
     def solve(self):
-        self.assignment, self.confidence = find_assignment(self.variable_handler, self.atoms, self.max_num_resets, self.tol)
+        self.assignment, self.confidence = find_assignment(self.variable_handler, self.atoms, self.max_num_resets,
+                                                           self.tol, num_processes=self.num_processes,
+                                                           solution_cache=self.solution_cache)
         self.assigned = True
 
     def is_sat(self, th=None):
@@ -45,27 +72,153 @@ class NumericSolver(object):
 
     def find_assignment(self, query_atom):
         query_atom = self.variable_handler.add(query_atom)
-        return find_assignment(self.variable_handler, self.atoms + [query_atom], self.max_num_resets, self.tol)
+        query_variables = get_variables(query_atom, self.variable_handler.get_variable_indices())
+        return find_assignment(self.variable_handler, self.atoms + [query_atom], self.max_num_resets, self.tol,
+                               num_processes=self.num_processes, query_variables=query_variables,
+                               solution_cache=self.solution_cache)
 
     def evaluate(self, variable_node, th=None):
         variable_node = self.variable_handler.add(variable_node)
         if not self.assigned:
-            self.solve()
+            self._solve_for(get_variables(variable_node, self.variable_handler.get_variable_indices()))
         return evaluate(variable_node, self.assignment)
 
+    def _solve_for(self, query_variables):
+        """
+        Solves the components of the atoms that contain the query variables and are not solved yet.
+        Variables of the other components keep their initial values until they are queried.
+        """
+        query_variables = query_variables - self.solved_variables
+        if self.assignment is not None and len(query_variables) == 0:
+            return
+        assignment, _ = find_assignment(self.variable_handler, self.atoms, self.max_num_resets, self.tol,
+                                        num_processes=self.num_processes, query_variables=query_variables,
+                                        solution_cache=self.solution_cache)
+        if self.assignment is not None:
+            assignment.update((name, self.assignment[name]) for name in self.solved_variables)
+        self.assignment = assignment
+        for _, names in get_components(self.atoms, self.variable_handler.get_variable_indices()):
+            if not query_variables.isdisjoint(names):
+                self.solved_variables.update(names)
 
-def find_assignment(variable_handler, atoms, max_num_resets, tol, verbose=True):
-    init = variable_handler.dict_to_vector()
 
-    def func(vector):
-        return sum(evaluate(atom, variable_handler.vector_to_dict(vector)).norm for atom in atoms)
+def find_assignment(variable_handler, atoms, max_num_resets, tol, verbose=True, num_processes=1, random_seed=None,
+                    query_variables=None, solution_cache=None):
+    """
+    Minimizes the sum of the norms of atoms.
+    The optimization vector holds each free variable divided by its scale (see VariableHandler.scales).
+    The atoms are first split into components that share no free variable (see get_components),
+    and each component is minimized on its own by up to max_num_resets basinhopping restarts,
+    until one of them reaches a norm below tol.
+    Restart i > 0 starts from a random vector. If random_seed is given, restart i draws it and its basinhopping steps
+    from np.random.RandomState(random_seed + i), so the schedule is reproducible.
+    With num_processes > 1, the components are minimized at the same time on a process pool,
+    or for a single component, its restarts are, and the rest are cancelled as soon as one reaches a norm below tol.
+
+    :param set query_variables: if given, only the components containing one of these variables are minimized,
+    and the other free variables keep their initial values
+    :param SolutionCache solution_cache: if given, each component is first looked up in it,
+    and the solutions of the others are stored to it if their norm is below tol
+    :return tuple: the assignment and the sum of the norms of the minimized components
+    """
+    variable_indices = variable_handler.get_variable_indices()
+    scales = variable_handler.get_scales(list(variable_indices))
+    init = variable_handler.dict_to_vector() / scales
+    components = get_components(atoms, variable_indices)
+    if query_variables is not None:
+        components = [(component_atoms, names) for component_atoms, names in components
+                      if not query_variables.isdisjoint(names)]
+
+    x = np.array(init, dtype=float)
+    norm = 0.0
+    variable_components = [(component_atoms, names) for component_atoms, names in components if len(names) > 0]
+    for component_atoms, names in components:
+        if len(names) == 0:
+            # Nothing to minimize, e.g. atoms over fixed variables only
+            norm += _get_objective(variable_handler, component_atoms, names)(np.zeros(0))[0]
+
+    keys = []
+    if solution_cache is not None:
+        fixed_assignment = variable_handler.get_fixed_assignment()
+        seeded_assignment = {name: variable_handler.get_value(name) for name in variable_indices
+                             if name in variable_handler.seeded}
+        unsolved_components = []
+        for component_atoms, names in variable_components:
+            # The names are reordered canonically, so that the cached vector lines up with them
+            key, names = get_key(component_atoms, variable_indices, fixed_assignment, tol, seeded_assignment)
+            entry = solution_cache.get(key)
+            if entry is None:
+                unsolved_components.append((component_atoms, names))
+                keys.append(key)
+            else:
+                indices = [variable_indices[name] for name in names]
+                x[indices] = entry[0] / scales[indices]
+                norm += entry[1]
+        variable_components = unsolved_components
+
+    if num_processes > 1 and len(variable_components) > 1:
+        with ProcessPoolExecutor(min(num_processes, len(variable_components))) as executor:
+            futures = [executor.submit(_find_component_minimum, variable_handler, component_atoms, names,
+                                       init[[variable_indices[name] for name in names]],
+                                       max_num_resets, tol, random_seed)
+                       for component_atoms, names in variable_components]
+            minima = [future.result() for future in futures]
+    else:
+        minima = []
+        for component_atoms, names in variable_components:
+            component_init = init[[variable_indices[name] for name in names]]
+            xs, fs = _find_minima(variable_handler, component_atoms, names, component_init, max_num_resets, tol,
+                                  verbose, num_processes, random_seed)
+            min_idx = min(enumerate(fs), key=lambda pair: pair[1])[0]
+            minima.append((xs[min_idx], fs[min_idx]))
+
+    for idx, ((component_atoms, names), (component_x, component_norm)) in enumerate(zip(variable_components, minima)):
+        indices = [variable_indices[name] for name in names]
+        x[indices] = component_x
+        norm += component_norm
+        if solution_cache is not None and component_norm < tol:
+            solution_cache.set(keys[idx], component_x * scales[indices], component_norm)
+    assignment = variable_handler.vector_to_dict(x * scales)
+    return assignment, norm
 
+
+def get_components(atoms, variable_indices):
+    """
+    Splits atoms into the connected components of the bipartite graph between atoms and
+    the free variables (keys of variable_indices) they contain.
+
+    :return list: list of (atoms, variable names) pairs, ordered by their first atom.
+    Variable names are in the order of variable_indices.
+    """
+    graph = nx.Graph()
+    for idx, atom in enumerate(atoms):
+        graph.add_node(idx)
+        for name in get_variables(atom, variable_indices):
+            graph.add_edge(idx, name)
+    components = []
+    for nodes in nx.connected_components(graph):
+        atom_indices = sorted(node for node in nodes if isinstance(node, int))
+        names = sorted((node for node in nodes if not isinstance(node, int)), key=variable_indices.get)
+        components.append((atom_indices, names))
+    components.sort(key=lambda component: component[0][0])
+    return [([atoms[idx] for idx in atom_indices], names) for atom_indices, names in components]
+
+
+def _find_minima(variable_handler, atoms, names, init, max_num_resets, tol, verbose, num_processes, random_seed):
+    """
+    Minima of the restarts over the variables names, starting from init.
+
+    :return tuple: list of minimizers and list of their norms
+    """
+    if num_processes > 1 and max_num_resets > 1:
+        return _find_minima_in_parallel(variable_handler, atoms, names, init, max_num_resets, tol, verbose,
+                                        num_processes, random_seed)
+    func = _get_objective(variable_handler, atoms, names)
     xs = []
     fs = []
-    options = {'ftol': tol**2}
-    minimizer_kwargs = {"method": "SLSQP", "options": options}
     for i in range(max_num_resets):
-        result = basinhopping(func, init, minimizer_kwargs=minimizer_kwargs)
+        x0, random_state = _get_restart(init, i, random_seed)
+        result = _basinhopping(func, x0, tol, random_state)
         if verbose:
             print("iteration %d:" % (i+1))
             print(result)
@@ -73,41 +226,98 @@ def find_assignment(variable_handler, atoms, max_num_resets, tol, verbose=True):
         fs.append(result.fun)
         if result.fun < tol:
             break
-        init = np.random.rand(len(init))
+    return xs, fs
 
+
+def _find_component_minimum(variable_handler, atoms, names, init, max_num_resets, tol, random_seed):
+    xs, fs = _find_minima(variable_handler, atoms, names, init, max_num_resets, tol, False, 1, random_seed)
     min_idx = min(enumerate(fs), key=lambda pair: pair[1])[0]
-    assignment = variable_handler.vector_to_dict(xs[min_idx])
-    norm = fs[min_idx]
-    return assignment, norm
+    return xs[min_idx], fs[min_idx]
 
-def _find_assignment(variable_handler, atoms, max_num_resets, tol, verbose=False):
-    init = np.array(variable_handler.dict_to_vector())
+
+def _get_objective(variable_handler, atoms, names):
+    """
+    Objective over the variables names divided by their scales; other free variables must not appear in atoms.
+    """
+    variable_indices = {name: idx for idx, name in enumerate(names)}
+    scales = variable_handler.get_scales(names)
+    fixed_assignment = variable_handler.get_fixed_assignment()
+    compiled_atoms = [compile_formula(atom, variable_indices, fixed_assignment) for atom in atoms]
 
     def func(vector):
-        print "dim:", np.shape(vector), vector
-        d = variable_handler.vector_to_dict(vector)
-        return sum(evaluate(atom, d).norm for atom in atoms)
+        """
+        Objective and its gradient, from one evaluation of the atoms on dual numbers.
+        """
+        duals = [dual * scale for dual, scale in zip(seed(vector), scales)]
+        total = sum(compiled_atom(duals).norm for compiled_atom in compiled_atoms)
+        return value_and_gradient(total, len(vector))
+    return func
 
-    def grad(f, theta):
-        theta = algopy.UTPM.init_jacobian(theta)
-        return algopy.UTPM.extract_jacobian(f(theta))
 
-    def hess(f, theta):
-        theta = algopy.UTPM.init_hessian(theta)
-        return algopy.UTPM.extract_hessian(len(theta), f(theta))
+def _get_restart(init, index, random_seed):
+    """
+    Initial vector and random state of restart index in the seed schedule.
+    """
+    if random_seed is None:
+        random_state = None
+        x0 = np.random.rand(len(init)) if index > 0 else init
+    else:
+        random_state = np.random.RandomState(random_seed + index)
+        x0 = random_state.rand(len(init)) if index > 0 else init
+    return x0, random_state
+
+
+def _basinhopping(func, x0, tol, random_state, stop=None):
+    """
+    Hops until a minimum below tol has been found (so a good x0 costs a single hop), or stop() returns True.
+    """
+    options = {'ftol': tol**2}
+    minimizer_kwargs = {"method": "SLSQP", "jac": True, "options": options}
+    lowest = [np.inf]
+
+    def callback(x, f, accept):
+        lowest[0] = min(lowest[0], f)
+        return lowest[0] < tol or (stop is not None and stop())
+    return basinhopping(func, x0, minimizer_kwargs=minimizer_kwargs, callback=callback, seed=random_state)
+
+
+def _find_minima_in_parallel(variable_handler, atoms, names, init, max_num_resets, tol, verbose, num_processes,
+                             random_seed):
+    if random_seed is None:
+        random_seed = np.random.randint(2**31 - max_num_resets)
+    context = multiprocessing.get_context()
+    stop_event = context.Event()
+    xs = []
+    fs = []
+    with ProcessPoolExecutor(min(num_processes, max_num_resets), mp_context=context,
+                             initializer=_initialize_worker, initargs=(stop_event,)) as executor:
+        futures = {executor.submit(_find_minimum, variable_handler, atoms, names, init, i, tol, random_seed): i
+                   for i in range(max_num_resets)}
+        for future in as_completed(futures):
+            result = future.result()
+            if verbose:
+                print("iteration %d:" % (futures[future]+1))
+                print(result)
+            xs.append(result.x)
+            fs.append(result.fun)
+            if result.fun < tol:
+                # Running restarts stop at their next basinhopping step, pending ones never start
+                stop_event.set()
+                for each in futures:
+                    each.cancel()
+                break
+    return xs, fs
+
+
+_stop_event = None
+
+
+def _initialize_worker(stop_event):
+    global _stop_event
+    _stop_event = stop_event
 
-    x = None
-    for i in range(max_num_resets):
-        results = pyipopt.fmin_unconstrained(func, init, functools.partial(grad, func))
-        if verbose:
-            print("iteration %d:" % (i+1))
-            print(results)
-        val, zl, zu, constraint_multipliers, obj, status = results
-        if obj < tol:
-            x = val
-            break
-        init = np.random.rand(len(init))
 
-    if x is None:
-        return None
-    return variable_handler.vector_to_dict(x)
+def _find_minimum(variable_handler, atoms, names, init, index, tol, random_seed):
+    func = _get_objective(variable_handler, atoms, names)
+    x0, random_state = _get_restart(init, index, random_seed)
+    return _basinhopping(func, x0, tol, random_state, stop=_stop_event.is_set)
@@ -0,0 +1,93 @@
+"""
+Closed-form propagation of Equals atoms before numeric optimization.
+An Equals atom over a single free scalar variable whose two sides differ by a polynomial of degree at most 2
+in that variable (linear relations through Add/Sub/Mul/Div, squares through Pow)
+is solved exactly when that solution is unique, and the value is used for the atoms that follow.
+This repeats until no atom determines a new variable; the caller fixes the returned values,
+so the numeric solver only sees the rest.
+"""
+import numpy as np
+
+from geosolver.ontology.ontology_definitions import FormulaNode
+from geosolver.ontology.ontology_semantics import compile_formula
+from geosolver.solver.variable_handler import VariableHandler, get_variables
+
+__author__ = 'minjoon'
+
+SAMPLES = (1.0, 2.0, 3.0)
+CHECK_SAMPLES = (5.0, 11.0)
+RELATIVE_TOLERANCE = 10**-9
+
+
+def propagate(variable_handler, atoms):
+    """
+    Point coordinates are not propagated, as the solver resolves them with the anchor point as reference.
+    An atom with two distinct real solutions (e.g. x**2 = 9) is left to the solver.
+    variable_handler is not modified.
+
+    :param VariableHandler variable_handler:
+    :param list atoms: atoms added to variable_handler
+    :return dict: values of the variables determined by propagation, in the order they were found
+    """
+    assert isinstance(variable_handler, VariableHandler)
+    equations = [atom.children for atom in atoms
+                 if isinstance(atom, FormulaNode) and atom.signature.id == 'Equals' and len(atom.children) == 2]
+    assignment = variable_handler.get_fixed_assignment()
+    values = {}
+    changed = True
+    while changed:
+        changed = False
+        variable_indices = {name: idx for idx, name in enumerate(variable_handler.get_free_variables())
+                            if name not in variable_handler.point_coordinates and name not in values}
+        for left, right in equations:
+            names = get_variables(left, variable_indices) | get_variables(right, variable_indices)
+            if len(names) != 1 or not names.isdisjoint(values):
+                continue
+            name, = names
+            value = solve_equation(left, right, name, assignment)
+            if value is not None:
+                assignment[name] = values[name] = value
+                changed = True
+    return values
+
+
+def solve_equation(left, right, name, assignment):
+    """
+    Solves left = right for the variable name, if their difference is a polynomial of degree at most 2 in it.
+    Other variables in left or right must be in assignment.
+
+    :param dict assignment: values of the other variables
+    :return float: the solution, or None if there is none or more than one
+    """
+    compiled_left = compile_formula(left, {name: 0}, assignment)
+    compiled_right = compile_formula(right, {name: 0}, assignment)
+
+    def residual(value):
+        try:
+            out = compiled_left([value]) - compiled_right([value])
+        except Exception:
+            return None
+        if not np.isscalar(out) or not np.isfinite(out):
+            return None
+        return float(out)
+
+    residuals = [residual(value) for value in SAMPLES]
+    if any(each is None for each in residuals):
+        return None
+    coefficients = np.polyfit(SAMPLES, residuals, 2)
+    scale = max(1.0, max(abs(each) for each in residuals))
+    for value in CHECK_SAMPLES:
+        check = residual(value)
+        if check is None or abs(check - np.polyval(coefficients, value)) > RELATIVE_TOLERANCE * scale * value**2:
+            return None
+
+    a, b, c = coefficients
+    if abs(a) <= RELATIVE_TOLERANCE * scale:
+        if abs(b) <= RELATIVE_TOLERANCE * scale:
+            return None
+        return -c / b
+    discriminant = b**2 - 4*a*c
+    if abs(discriminant) <= RELATIVE_TOLERANCE * scale**2:
+        # Double root
+        return -b / (2*a)
+    return None
@@ -0,0 +1,181 @@
+"""
+Persistent cache of solver solutions.
+A problem is keyed by a canonical form of its atoms: the atoms are sorted by their form with the free variables
+left anonymous, and the free variables are then renamed in order of first appearance,
+so the key does not depend on the order of the atoms or the names of the variables.
+Fixed variables enter the key by their values, so they must not be drawn at random
+(the anchor point is placed at the origin unless its position is given, see VariableHandler.point).
+The starting values of the seeded free variables (e.g. the warm start from the diagram) enter the key as well,
+as they decide which solution of an underdetermined problem is found.
+Only solutions whose norm is below the tolerance of the solve are stored.
+An entry holds the values of the free variables, in canonical order, and the norm of the solution.
+Entries are kept in memory, and in one pickle file per entry if a directory is given,
+and the least recently used ones are evicted beyond max_size.
+"""
+from collections import OrderedDict
+import hashlib
+import os
+import pickle
+import tempfile
+
+import numpy as np
+
+from geosolver import parameters, settings
+from geosolver.ontology.ontology_definitions import FormulaNode, VariableSignature, Node, SetNode
+
+__author__ = 'minjoon'
+
+# Bump when the semantics of the solver change, so that stale entries are not used.
+CACHE_VERSION = 2
+
+
+class SolutionCache(object):
+    def __init__(self, path=None, max_size=parameters.SOLUTION_CACHE_SIZE):
+        """
+        :param str path: directory of the entries on disk; if None, entries are only kept in memory
+        :param int max_size: maximum number of entries, in memory and on disk
+        """
+        self.path = path
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._num_files = None
+
+    def get(self, key):
+        """
+        :return tuple: vector and norm, or None
+        """
+        if key in self._entries:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return self._entries[key]
+        file_path = self._get_file_path(key)
+        if file_path is not None and os.path.exists(file_path):
+            try:
+                with open(file_path, 'rb') as f:
+                    entry = pickle.load(f)
+                os.utime(file_path)
+            except (OSError, EOFError, pickle.UnpicklingError):
+                entry = None
+            if entry is not None:
+                self._set_entry(key, entry)
+                self.hits += 1
+                return entry
+        self.misses += 1
+        return None
+
+    def set(self, key, vector, norm):
+        entry = (np.array(vector, dtype=float), float(norm))
+        self._set_entry(key, entry)
+        file_path = self._get_file_path(key)
+        if file_path is None:
+            return
+        if not os.path.exists(self.path):
+            os.makedirs(self.path, exist_ok=True)
+        # Written to a temporary file first, so that a concurrent reader never sees a partial entry
+        fd, temp_path = tempfile.mkstemp(dir=self.path)
+        with os.fdopen(fd, 'wb') as f:
+            pickle.dump(entry, f, pickle.HIGHEST_PROTOCOL)
+        os.replace(temp_path, file_path)
+        if self._num_files is None:
+            self._num_files = len(self._get_file_paths())
+        else:
+            self._num_files += 1
+        if self._num_files > self.max_size:
+            self._evict_files()
+
+    def clear(self):
+        self._entries.clear()
+        if self.path is not None and os.path.exists(self.path):
+            for file_path in self._get_file_paths():
+                os.remove(file_path)
+        self._num_files = 0
+
+    def _set_entry(self, key, entry):
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def _get_file_path(self, key):
+        if self.path is None:
+            return None
+        return os.path.join(self.path, key + ".p")
+
+    def _get_file_paths(self):
+        return [os.path.join(self.path, name) for name in os.listdir(self.path) if name.endswith(".p")]
+
+    def _evict_files(self):
+        """
+        Removes the least recently used files down to 90% of max_size, so that eviction is not run on every set.
+        """
+        file_paths = sorted(self._get_file_paths(), key=os.path.getmtime)
+        num_removed = len(file_paths) - int(0.9 * self.max_size)
+        for file_path in file_paths[:max(num_removed, 0)]:
+            try:
+                os.remove(file_path)
+            except OSError:
+                pass
+        self._num_files = len(file_paths) - max(num_removed, 0)
+
+
+_solution_cache = None
+
+
+def get_solution_cache():
+    """
+    The cache shared by the solvers of this process.
+    It is kept in memory, and on disk under settings.CACHE_ROOT if that is set.
+    """
+    global _solution_cache
+    if _solution_cache is None:
+        _solution_cache = SolutionCache(settings.get_cache_path("solution_cache"))
+    return _solution_cache
+
+
+def get_key(atoms, variable_indices, fixed_assignment, tol, seeded_assignment=None):
+    """
+    :param list atoms: atoms added to a VariableHandler
+    :param dict variable_indices: free variables
+    :param dict fixed_assignment: values of the fixed variables
+    :param float tol: tolerance of the solve
+    :param dict seeded_assignment: starting values of the seeded free variables
+    :return tuple: the key, and the free variable names in canonical order
+    """
+    anonymous_reprs = [_get_canonical_repr(atom, variable_indices, fixed_assignment, None) for atom in atoms]
+    order = sorted(range(len(atoms)), key=lambda idx: anonymous_reprs[idx])
+    renaming = {}
+    reprs = [_get_canonical_repr(atoms[idx], variable_indices, fixed_assignment, renaming) for idx in order]
+    names = sorted(renaming, key=renaming.get)
+    if seeded_assignment is None:
+        seeded_assignment = {}
+    seeds = ["$%d=%.9g" % (idx, seeded_assignment[name]) for idx, name in enumerate(names)
+             if name in seeded_assignment]
+    content = "\n".join([str(CACHE_VERSION), repr(tol)] + reprs + seeds)
+    key = hashlib.sha1(content.encode('utf-8')).hexdigest()
+    return key, names
+
+
+def _get_canonical_repr(node, variable_indices, fixed_assignment, renaming):
+    """
+    If renaming is None, free variables are left anonymous.
+    """
+    if not isinstance(node, Node):
+        return repr(node)
+    children = ",".join(_get_canonical_repr(child, variable_indices, fixed_assignment, renaming)
+                        for child in node.children)
+    if isinstance(node, SetNode):
+        return "{%s}" % children
+    assert isinstance(node, FormulaNode)
+    signature = node.signature
+    if isinstance(signature, VariableSignature):
+        if signature.id in variable_indices:
+            if renaming is None:
+                return "$"
+            return "$%d" % renaming.setdefault(signature.id, len(renaming))
+        if signature.id in fixed_assignment:
+            return "%.9g" % fixed_assignment[signature.id]
+    if node.is_leaf():
+        return str(signature.id)
+    return "%s(%s)" % (signature.id, children)
@@ -1,4 +1,7 @@
+from concurrent.futures import ProcessPoolExecutor
+from functools import reduce
 import logging
+import operator
 import time
 from geosolver.ontology.ontology_semantics import evaluate, Equals
 from geosolver.solver.display_entities import display_entities
@@ -7,11 +10,15 @@ from geosolver.ontology.ontology_definitions import FormulaNode, signatures
 
 __author__ = 'minjoon'
 
-def solve(given_formulas, choice_formulas=None, assignment=None):
+def solve(given_formulas, choice_formulas=None, assignment=None, constrained_choices=False, num_processes=1):
     """
+    If constrained_choices is set, each choice is solved as a constraint together with the true formulas,
+    starting from the shared solution of the true formulas (see solve_choices).
 
     :param list true_formulas:
     :param dict choice_formulas:
+    :param bool constrained_choices:
+    :param int num_processes: number of processes for the per-choice solves of constrained_choices
     :return:
     """
     start_time = time.time()
@@ -30,22 +37,38 @@ def solve(given_formulas, choice_formulas=None, assignment=None):
     if query_formula is None:
         raise Exception("No query formula.")
 
+    elif constrained_choices and choice_formulas is not None:
+        if query_formula.has_signature("What"):
+            shared_formulas = given_formulas
+            choice_atoms = {key: FormulaNode(signatures['Equals'], [_get_what(query_formula), choice_formula])
+                            for key, choice_formula in choice_formulas.items()}
+        elif query_formula.has_signature("Find"):
+            shared_formulas = true_formulas
+            choice_atoms = {key: FormulaNode(signatures['Equals'], [query_formula.children[0], choice_formula])
+                            for key, choice_formula in choice_formulas.items()}
+        else:
+            shared_formulas = true_formulas
+            tester = lambda node: isinstance(node, FormulaNode) and node.signature.id == "Which"
+            choice_atoms = {key: query_formula.replace_node(tester, lambda node, choice_formula=choice_formula: choice_formula)
+                            for key, choice_formula in choice_formulas.items()}
+        out = solve_choices(shared_formulas, choice_atoms, assignment=assignment, num_processes=num_processes)
+
     elif query_formula.has_signature("What"):
+        # Evaluating solves only the part of the system connected to the query
         if choice_formulas is None:
             ns = NumericSolver(given_formulas, assignment=assignment)
-            ns.solve()
-            out = ns.assignment['What']
+            out = ns.evaluate(_get_what(query_formula))
         else:
             ns = NumericSolver(given_formulas, assignment=assignment)
-            ns.solve()
-            for key, choice_formula in choice_formulas.iteritems():
-                equal_formula = FormulaNode(signatures['Equals'], [ns.assignment['What'], choice_formula])
+            what = ns.evaluate(_get_what(query_formula))
+            for key, choice_formula in choice_formulas.items():
+                equal_formula = FormulaNode(signatures['Equals'], [what, choice_formula])
                 out[key] = ns.evaluate(equal_formula)
 
             """
             ns = NumericSolver(true_formulas)
             ns.solve()
-            for key, choice_formula in choice_formulas.iteritems():
+            for key, choice_formula in choice_formulas.items():
                 # print query_formula.children[1], ns.evaluate(query_formula.children[1])
                 # print choice_formula, ns.evaluate(choice_formula)
                 tester = lambda node: isinstance(node, FormulaNode) and node.signature.id == "What"
@@ -58,13 +81,12 @@ def solve(given_formulas, choice_formulas=None, assignment=None):
 
     elif query_formula.has_signature("Find"):
         ns = NumericSolver(true_formulas, assignment=assignment)
-        ns.solve()
         # display_entities(ns)
         if choice_formulas is None:
             # No choice given; need to find the answer!
             out = ns.evaluate(query_formula.children[0])
         else:
-            for key, choice_formula in choice_formulas.iteritems():
+            for key, choice_formula in choice_formulas.items():
                 replaced_formula = FormulaNode(signatures['Equals'], [query_formula.children[0], choice_formula])
                 out[key] = ns.evaluate(replaced_formula)
         # display_entities(ns)
@@ -72,8 +94,7 @@ def solve(given_formulas, choice_formulas=None, assignment=None):
 
     elif query_formula.has_signature("Which"):
         ns = NumericSolver(true_formulas, assignment=assignment)
-        ns.solve()
-        for key, choice_formula in choice_formulas.iteritems():
+        for key, choice_formula in choice_formulas.items():
             # print query_formula.children[1], ns.evaluate(query_formula.children[1])
             # print choice_formula, ns.evaluate(choice_formula)
             tester = lambda node: node.signature.id == "Which"
@@ -81,22 +102,57 @@ def solve(given_formulas, choice_formulas=None, assignment=None):
             replaced_formula = query_formula.replace_node(tester, getter)
             out[key] = ns.evaluate(replaced_formula)
 
-    # this won't be executed!
-    elif query_formula.has_signature("Which"):
-        tester = lambda node: isinstance(node, FormulaNode) and node.signature.id == "Which"
-        for choice, choice_formula in choice_formulas.iteritems():
-            getter = lambda node: choice_formula
-            replaced_formula = query_formula.replace_node(tester, getter)
-            all_formulas = true_formulas + [replaced_formula]
-            ns = NumericSolver(all_formulas)
-            out[choice] = ns.evaluate(replaced_formula)
-            print out[choice]
-
-            #display_entities(ns)
     else:
         raise Exception()
 
     end_time = time.time()
     delta_time = end_time - start_time
-    print "%.2f seconds" % delta_time
-    return out
\ No newline at end of file
+    print("%.2f seconds" % delta_time)
+    return out
+
+
+def solve_choices(shared_formulas, choice_atoms, assignment=None, num_processes=1):
+    """
+    Solves shared_formulas once, then solves shared_formulas with each choice atom added,
+    starting from the shared solution, and evaluates the atom and shared_formulas there.
+    With num_processes > 1 and more than one choice, the per-choice solves run concurrently on a process pool.
+
+    :param list shared_formulas:
+    :param dict choice_atoms: choice key to formula node
+    :param dict assignment: initial values of the variables of shared_formulas
+    :param int num_processes:
+    :return dict: choice key to TruthValue
+    """
+    ns = NumericSolver(shared_formulas, assignment=assignment)
+    ns.solve()
+    warm_start = dict(assignment) if assignment is not None else {}
+    warm_start.update(_get_entity_assignment(ns))
+
+    if num_processes > 1 and len(choice_atoms) > 1:
+        with ProcessPoolExecutor(min(num_processes, len(choice_atoms))) as executor:
+            futures = {key: executor.submit(_solve_choice, shared_formulas, atom, warm_start)
+                       for key, atom in choice_atoms.items()}
+            return {key: future.result() for key, future in futures.items()}
+    return {key: _solve_choice(shared_formulas, atom, warm_start) for key, atom in choice_atoms.items()}
+
+
+def _solve_choice(shared_formulas, choice_atom, warm_start):
+    """
+    Truth of the choice atom and the shared formulas together at their joint solution,
+    so that a choice is not satisfied by giving up the shared formulas.
+    The warm start replaces random restarts, so a single run is made.
+    """
+    ns = NumericSolver(shared_formulas + [choice_atom], max_num_resets=1, assignment=warm_start, rescale=False)
+    return reduce(operator.__and__, (ns.evaluate(formula) for formula in shared_formulas), ns.evaluate(choice_atom))
+
+
+def _get_entity_assignment(ns):
+    """
+    Solved value of each named variable, in the form of the assignment argument of NumericSolver
+    (e.g. a point instance for a point variable).
+    """
+    return {name: ns.evaluate(node) for name, node in ns.variable_handler.named_entities.items()}
+
+
+def _get_what(query_formula):
+    return query_formula.get_nodes(lambda node: isinstance(node, FormulaNode) and node.signature.id == "What")[0]
\ No newline at end of file
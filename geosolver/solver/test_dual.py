@@ -0,0 +1,85 @@
+"""
+The gradient of the solver objective from one evaluation on dual numbers matches central differences
+of the objective value.
+"""
+import numpy as np
+import pytest
+
+from geosolver.solver.dual import Dual, seed, value_and_gradient
+from geosolver.solver.numeric_solver import _get_objective
+from geosolver.solver.variable_handler import VariableHandler
+
+__author__ = 'minjoon'
+
+STEP = 1e-6
+
+
+def _get_atoms():
+    vh = VariableHandler()
+    x = vh.number('x')
+    A, B, C, D, O = [vh.point(name) for name in "ABCDO"]
+    AB, BC, CA, CD = vh.line(A, B), vh.line(B, C), vh.line(C, A), vh.line(C, D)
+    cO = vh.circle(O)
+    angle = vh.apply('Angle', A, B, C)
+    atoms = [vh.apply('Equals', vh.apply('LengthOf', AB), 3),
+             vh.apply('Equals', vh.apply('LengthOf', BC), x),
+             vh.apply('Equals', vh.apply('LengthOf', CA), (16 + x**2)**0.5),
+             vh.apply('Perpendicular', AB, BC),
+             vh.apply('Parallel', AB, CD),
+             vh.apply('Tangent', AB, cO),
+             vh.apply('Equals', vh.apply('RadiusOf', cO), 5),
+             vh.apply('PointLiesOnLine', D, AB),
+             vh.apply('PointLiesOnCircle', A, cO),
+             vh.apply('Equals', vh.apply('MeasureOf', angle), x),
+             vh.apply('Equals', vh.apply('AreaOf', vh.apply('Triangle', A, B, C)), 6),
+             vh.apply('Equals', vh.apply('Div', vh.apply('LengthOf', AB), vh.apply('LengthOf', CD)), 2),
+             ]
+    return vh, atoms
+
+
+def _central_differences(func, vector):
+    gradient = np.zeros(len(vector))
+    for idx in range(len(vector)):
+        step = np.zeros(len(vector))
+        step[idx] = STEP
+        gradient[idx] = (func(vector + step)[0] - func(vector - step)[0]) / (2 * STEP)
+    return gradient
+
+
+@pytest.mark.parametrize('random_seed', range(10))
+def test_objective_gradient(random_seed):
+    vh, atoms = _get_atoms()
+    names = sorted(vh.get_variable_indices(), key=vh.get_variable_indices().get)
+    vector = np.random.RandomState(random_seed).uniform(-5, 5, len(names))
+    for atom in atoms:
+        func = _get_objective(vh, [atom], names)
+        value, gradient = func(vector)
+        assert np.isfinite(value)
+        assert np.allclose(gradient, _central_differences(func, vector), rtol=1e-4, atol=1e-4), atom
+
+
+@pytest.mark.parametrize('name', ['sqrt', 'exp', 'log', 'sin', 'cos', 'arccos'])
+def test_ufuncs(name):
+    value = 0.3
+    dual, = seed(np.array([value]))
+    out = getattr(np, name)(dual)
+    function = getattr(np, name)
+    expected = (function(value + STEP) - function(value - STEP)) / (2 * STEP)
+    assert np.isclose(out.value, function(value))
+    assert np.isclose(out.gradient[0], expected)
+
+
+def test_arctan2():
+    y, x = seed(np.array([0.4, -1.3]))
+    out = np.arctan2(y, x)
+    assert np.isclose(out.value, np.arctan2(0.4, -1.3))
+    expected = [(np.arctan2(0.4 + STEP, -1.3) - np.arctan2(0.4 - STEP, -1.3)) / (2 * STEP),
+                (np.arctan2(0.4, -1.3 + STEP) - np.arctan2(0.4, -1.3 - STEP)) / (2 * STEP)]
+    assert np.allclose(out.gradient, expected)
+
+
+def test_constant_value():
+    value, gradient = value_and_gradient(2.0, 3)
+    assert value == 2.0
+    assert np.array_equal(gradient, np.zeros(3))
+    assert isinstance(Dual(1.0, np.ones(3)) ** 0, Dual)
@@ -0,0 +1,52 @@
+"""
+get_components splits the atoms into groups that share no free variable, and evaluating a node
+solves only the components of its variables, with the values of a full solve.
+"""
+import contextlib
+import io
+
+import numpy as np
+
+from geosolver.solver.numeric_solver import NumericSolver, get_components
+from geosolver.solver.variable_handler import VariableHandler
+
+__author__ = 'minjoon'
+
+
+def _get_atoms():
+    vh = VariableHandler()
+    x, y, z, w = vh.number('x'), vh.number('y'), vh.number('z'), vh.number('w', 4.0)
+    vh.fix('w', 4.0)
+    atoms = [vh.apply('Equals', z*z, 4), vh.apply('Equals', y + x, 3), vh.apply('Equals', w, 4),
+             vh.apply('Equals', y, 1), vh.apply('Equals', z, 2)]
+    return vh, atoms
+
+
+def test_components():
+    vh, atoms = _get_atoms()
+    components = get_components(atoms, vh.get_variable_indices())
+    # Ordered by their first atom, with the names in the order of the variables,
+    # and the atom over the fixed w alone with no variable
+    assert components == [([atoms[0], atoms[4]], ['z']), ([atoms[1], atoms[3]], ['x', 'y']), ([atoms[2]], [])]
+    assert get_components([], vh.get_variable_indices()) == []
+
+
+def test_evaluate_solves_queried_components():
+    vh, atoms = _get_atoms()
+    ns = NumericSolver(atoms, vh, propagation=False, use_cache=False)
+    z_init = ns.variable_handler.get_value('z')
+    with contextlib.redirect_stdout(io.StringIO()):
+        x = ns.evaluate(vh.named_entities['x'])
+        assert ns.solved_variables == {'x', 'y'}
+        # The component of z is not solved until z is queried
+        assert ns.assignment['z'] == z_init
+        z = ns.evaluate(vh.named_entities['z'])
+        assert ns.solved_variables == {'x', 'y', 'z'}
+        assert ns.evaluate(vh.named_entities['x']) == x
+
+        full = NumericSolver(atoms, vh, propagation=False, use_cache=False)
+        full.solve()
+    assert np.isclose(x, 2, atol=10**-2) and np.isclose(z, 2, atol=10**-2)
+    for name in ['x', 'y', 'z', 'w']:
+        assert np.isclose(ns.assignment[name], full.assignment[name], atol=10**-2)
+    assert full.is_sat()
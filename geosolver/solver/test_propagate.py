@@ -0,0 +1,48 @@
+"""
+Propagation only determines variables whose Equals atom has a unique solution,
+and leaves the VariableHandler it is given unchanged.
+"""
+import numpy as np
+
+from geosolver.solver.numeric_solver import NumericSolver
+from geosolver.solver.propagate import propagate, solve_equation
+from geosolver.solver.variable_handler import VariableHandler
+
+__author__ = 'minjoon'
+
+
+def test_solve_equation():
+    vh = VariableHandler()
+    x = vh.number('x')
+    assert np.isclose(solve_equation(2*x + 1, 7, 'x', {}), 3)
+    assert np.isclose(solve_equation(vh.apply('Div', x, 4), 0.5, 'x', {}), 2)
+    assert np.isclose(solve_equation(x**2 - 6*x, -9, 'x', {}), 3)
+    # Two roots, no root, no dependence on x, and a function that is not quadratic
+    assert solve_equation(x**2, 9, 'x', {}) is None
+    assert solve_equation(x**2, -1, 'x', {}) is None
+    assert solve_equation(x - x, 1, 'x', {}) is None
+    assert solve_equation(x**3, 8, 'x', {}) is None
+
+
+def test_propagate():
+    vh = VariableHandler()
+    x, y, z = vh.number('x'), vh.number('y'), vh.number('z')
+    atoms = [vh.apply('Equals', y, 2*x), vh.apply('Equals', x + 1, 4), vh.apply('Equals', z**2, 16)]
+    variables = dict(vh.variables)
+    values = propagate(vh, atoms)
+    assert set(values) == {'x', 'y'}
+    assert np.isclose(values['x'], 3) and np.isclose(values['y'], 6)
+    assert dict(vh.variables) == variables
+    assert vh.fixed == set()
+
+
+def test_solver_copies_handler():
+    vh = VariableHandler()
+    x = vh.number('x')
+    A, B = vh.point('A'), vh.point('B')
+    atoms = [vh.apply('Equals', vh.apply('LengthOf', vh.line(A, B)), x), vh.apply('Equals', x, 5)]
+    variables, fixed = dict(vh.variables), vh.fixed
+    ns = NumericSolver(atoms, vh, use_cache=False)
+    assert ns.variable_handler.fixed == fixed | {'x'}
+    assert dict(vh.variables) == variables
+    assert vh.fixed == fixed
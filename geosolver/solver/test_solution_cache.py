@@ -0,0 +1,100 @@
+"""
+Solution cache keys do not depend on the order of the atoms, the names of the variables or the random initial values,
+but do depend on the seeded initial values, and only solutions that meet the tolerance are stored.
+The cache is only used by the solvers that ask for it.
+"""
+import contextlib
+import io
+import os
+
+import numpy as np
+
+from geosolver import settings
+from geosolver.solver.numeric_solver import NumericSolver, find_assignment
+from geosolver.solver.solution_cache import SolutionCache, get_key
+from geosolver.solver.variable_handler import VariableHandler
+
+__author__ = 'minjoon'
+
+
+def _get_triangle(names, reverse=False):
+    vh = VariableHandler()
+    x = vh.number('x')
+    A, B, C = [vh.point(name) for name in names]
+
+    def length(p, q):
+        return vh.apply('LengthOf', vh.line(p, q))
+    atoms = [vh.apply('Equals', length(B, C), 3), vh.apply('Equals', length(C, A), 4),
+             vh.apply('Perpendicular', vh.line(A, C), vh.line(B, C)), vh.apply('Equals', length(A, B), x)]
+    if reverse:
+        atoms.reverse()
+    return vh, atoms
+
+
+def test_key():
+    vh, atoms = _get_triangle("ABC")
+    key, names = get_key(atoms, vh.get_variable_indices(), vh.get_fixed_assignment(), 10**-3)
+    other_vh, other_atoms = _get_triangle("PQR", reverse=True)
+    other_key, other_names = get_key(other_atoms, other_vh.get_variable_indices(),
+                                     other_vh.get_fixed_assignment(), 10**-3)
+    assert key == other_key
+    assert [name.replace('P', 'A').replace('Q', 'B').replace('R', 'C') for name in other_names] == names
+    assert get_key(atoms, vh.get_variable_indices(), vh.get_fixed_assignment(), 10**-2)[0] != key
+
+
+def test_seeded_key():
+    vh, atoms = _get_triangle("ABC")
+    variable_indices, fixed_assignment = vh.get_variable_indices(), vh.get_fixed_assignment()
+    key, names = get_key(atoms, variable_indices, fixed_assignment, 10**-3)
+    # A warm start of C, e.g. from the diagram, and its mirror image
+    seeded_key = get_key(atoms, variable_indices, fixed_assignment, 10**-3, {'C_x': 1.0, 'C_y': 2.0})[0]
+    mirrored_key = get_key(atoms, variable_indices, fixed_assignment, 10**-3, {'C_x': 1.0, 'C_y': -2.0})[0]
+    assert len({key, seeded_key, mirrored_key}) == 3
+    assert get_key(atoms, variable_indices, fixed_assignment, 10**-3, {'C_x': 1.0, 'C_y': 2.0})[0] == seeded_key
+
+    other_vh, other_atoms = _get_triangle("PQR", reverse=True)
+    other_key = get_key(other_atoms, other_vh.get_variable_indices(), other_vh.get_fixed_assignment(), 10**-3,
+                        {'R_x': 1.0, 'R_y': 2.0})[0]
+    assert other_key == seeded_key
+
+
+def test_opt_in():
+    vh, atoms = _get_triangle("ABC")
+    assert NumericSolver(atoms, vh).solution_cache is None
+    assert NumericSolver(atoms, vh, use_cache=True).solution_cache is not None
+
+
+def test_solutions_below_tol_are_stored():
+    vh, atoms = _get_triangle("ABC")
+    cache = SolutionCache()
+    with contextlib.redirect_stdout(io.StringIO()):
+        assignment, norm = find_assignment(vh, atoms, 3, 10**-3, random_seed=0, solution_cache=cache)
+    assert norm < 10**-3 and np.isclose(abs(assignment['x']), 5, atol=10**-2)
+    assert len(cache._entries) == 1
+    cached_assignment, cached_norm = find_assignment(vh, atoms, 3, 10**-3, solution_cache=cache)
+    assert cache.hits == 1
+    assert cached_assignment == assignment and cached_norm == norm
+
+    vh = VariableHandler()
+    x = vh.number('x')
+    atoms = [vh.apply('Equals', x*x, -1)]
+    cache = SolutionCache()
+    with contextlib.redirect_stdout(io.StringIO()):
+        _, norm = find_assignment(vh, atoms, 1, 10**-3, random_seed=0, solution_cache=cache)
+    assert norm >= 10**-3
+    assert len(cache._entries) == 0
+
+
+def test_disk_entries(tmpdir):
+    cache = SolutionCache(str(tmpdir))
+    cache.set('key', [1.0, 2.0], 0.0)
+    vector, norm = SolutionCache(str(tmpdir)).get('key')
+    assert np.array_equal(vector, [1.0, 2.0]) and norm == 0.0
+
+
+def test_cache_path(monkeypatch):
+    assert settings.CACHE_ROOT is None
+    assert settings.get_cache_path("solution_cache") is None
+    monkeypatch.setattr(settings, 'CACHE_ROOT', "temp")
+    root = os.path.normpath(os.path.join(os.path.dirname(settings.__file__), os.pardir))
+    assert settings.get_cache_path("solution_cache") == os.path.join(root, "temp", "solution_cache")
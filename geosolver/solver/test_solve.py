@@ -0,0 +1,63 @@
+"""
+In the constrained choice mode of solve, the choice that holds together with the true formulas is satisfied,
+and a choice that contradicts them is not, for What, Find and Which queries, serially and on a process pool.
+"""
+import contextlib
+import io
+
+import numpy as np
+import pytest
+
+from geosolver.ontology.ontology_definitions import FormulaNode, FunctionSignature, VariableSignature, signatures
+from geosolver.solver.solve import solve, solve_choices
+
+__author__ = 'minjoon'
+
+
+def _node(id_, *children):
+    return FormulaNode(signatures[id_], list(children))
+
+
+def _point(name):
+    return FormulaNode(VariableSignature(name, 'point'), [])
+
+
+def _number(value):
+    return FormulaNode(FunctionSignature(str(value), 'number', []), [])
+
+
+def _line(p, q):
+    return _node('Line', _point(p), _point(q))
+
+
+def _length(p, q):
+    return _node('LengthOf', _line(p, q))
+
+
+# Right triangle ABC with legs AC = 4 and BC = 3, so AB = 5
+TRUE_FORMULAS = [_node('Equals', _length('A', 'C'), _number(4)), _node('Equals', _length('B', 'C'), _number(3)),
+                 _node('Perpendicular', _line('A', 'C'), _line('B', 'C'))]
+
+QUERIES = {
+    'What': (_node('Equals', _length('A', 'B'), _node('What')), {1: _number(5), 2: _number(7)}),
+    'Find': (_node('Find', _length('A', 'B')), {1: _number(5), 2: _number(7)}),
+    'Which': (_node('Perpendicular', _node('Which'), _line('B', 'C')), {1: _line('A', 'C'), 2: _line('A', 'B')}),
+}
+
+
+@pytest.mark.parametrize('num_processes', [1, 2])
+@pytest.mark.parametrize('query', sorted(QUERIES))
+def test_constrained_choices(query, num_processes):
+    query_formula, choice_formulas = QUERIES[query]
+    with contextlib.redirect_stdout(io.StringIO()):
+        out = solve(TRUE_FORMULAS + [query_formula], choice_formulas, constrained_choices=True,
+                    num_processes=num_processes)
+    assert sorted(out) == [1, 2]
+    assert out[1].norm < 10**-3 and np.isclose(out[1].conf, 1, atol=10**-3)
+    assert out[2].norm > 10**-2 and out[2].conf < 0.9
+
+
+@pytest.mark.parametrize('num_processes', [1, 2])
+def test_no_choices(num_processes):
+    with contextlib.redirect_stdout(io.StringIO()):
+        assert solve_choices(TRUE_FORMULAS, {}, num_processes=num_processes) == {}
@@ -0,0 +1,49 @@
+"""
+VariableHandler.variables is a live view of the slot layout, and the vectors of the layout line up with it.
+"""
+import numpy as np
+import pytest
+
+from geosolver.solver.variable_handler import VariableHandler
+
+__author__ = 'minjoon'
+
+
+def test_variables_view():
+    vh = VariableHandler()
+    vh.number('x', 2.0)
+    vh.point('A', (1.0, 3.0))
+    variables = vh.variables
+    assert dict(variables) == {'x': 2.0, 'A_x': 1.0, 'A_y': 3.0}
+
+    variables['x'] = 5.0
+    assert vh.get_value('x') == 5.0
+    vh.set_value('A_x', 4.0)
+    assert variables['A_x'] == 4.0
+    vh.number('y', 1.0)
+    assert 'y' in variables and len(variables) == 4
+
+    with pytest.raises(KeyError):
+        variables['z'] = 1.0
+    with pytest.raises(TypeError):
+        del variables['x']
+    with pytest.raises(AttributeError):
+        vh.fixed.add('x')
+
+
+def test_vectors():
+    vh = VariableHandler()
+    vh.point('A', (1.0, 3.0))
+    vh.number('x', 2.0)
+    vh.number('y', 7.0)
+    vh.fix('y', 6.0)
+    assert vh.fixed == {'A_x', 'A_y', 'y'}
+    assert vh.get_variable_indices() == {'x': 0}
+    assert np.array_equal(vh.dict_to_vector(), [2.0])
+    assert vh.vector_to_dict(np.array([8.0])) == {'A_x': 1.0, 'A_y': 3.0, 'x': 8.0, 'y': 6.0}
+    assert vh.get_fixed_assignment() == {'A_x': 1.0, 'A_y': 3.0, 'y': 6.0}
+
+    copy = vh.copy()
+    copy.set_value('x', 0.0)
+    copy.fix('x', 0.0)
+    assert vh.get_value('x') == 2.0 and 'x' not in vh.fixed
@@ -1,3 +1,5 @@
+from collections.abc import MutableMapping
+
 import numpy as np
 
 from geosolver.ontology.ontology_definitions import FormulaNode, VariableSignature, signatures, FunctionSignature, Node, \
@@ -5,19 +7,178 @@ from geosolver.ontology.ontology_definitions import FormulaNode, VariableSignatu
 
 __author__ = 'minjoon'
 
+
+class VariableLayout(object):
+    """
+    Gives each variable a fixed integer slot, in order of creation, and stores the values in a contiguous array.
+    Fixed variables are masked out of the optimization vector, which holds the free variables in slot order.
+    """
+    def __init__(self, capacity=16):
+        self.names = []
+        self.slots = {}
+        self._values = np.zeros(capacity)
+        self._fixed = np.zeros(capacity, dtype=bool)
+        self._free_slots = None
+        self._free_indices = None
+
+    def __len__(self):
+        return len(self.names)
+
+    def __contains__(self, name):
+        return name in self.slots
+
+    @property
+    def values(self):
+        return self._values[:len(self.names)]
+
+    @property
+    def fixed_mask(self):
+        return self._fixed[:len(self.names)]
+
+    def add(self, name, value):
+        assert name not in self.slots
+        if len(self.names) == len(self._values):
+            self._values = np.concatenate([self._values, np.zeros(len(self._values))])
+            self._fixed = np.concatenate([self._fixed, np.zeros(len(self._fixed), dtype=bool)])
+        self.slots[name] = len(self.names)
+        self._values[len(self.names)] = value
+        self.names.append(name)
+        self._free_slots = None
+        self._free_indices = None
+
+    def get(self, name):
+        return float(self._values[self.slots[name]])
+
+    def set(self, name, value):
+        self._values[self.slots[name]] = value
+
+    def fix(self, name):
+        self._fixed[self.slots[name]] = True
+        self._free_slots = None
+        self._free_indices = None
+
+    def is_fixed(self, name):
+        return bool(self._fixed[self.slots[name]])
+
+    def get_free_slots(self):
+        if self._free_slots is None:
+            self._free_slots = np.flatnonzero(~self.fixed_mask)
+        return self._free_slots
+
+    def get_free_indices(self):
+        """
+        Index of each free variable in the optimization vector.
+        """
+        if self._free_indices is None:
+            self._free_indices = {self.names[slot]: idx for idx, slot in enumerate(self.get_free_slots())}
+        return self._free_indices
+
+    def to_vector(self):
+        return self.values[self.get_free_slots()]
+
+    def from_vector(self, vector):
+        """
+        :return numpy.ndarray: the values, with the free slots replaced by vector
+        """
+        values = self.values.copy()
+        values[self.get_free_slots()] = vector
+        return values
+
+    def copy(self):
+        out = VariableLayout(len(self._values))
+        out.names = list(self.names)
+        out.slots = dict(self.slots)
+        out._values = self._values.copy()
+        out._fixed = self._fixed.copy()
+        return out
+
+    def to_dict(self, values=None, slots=None):
+        if values is None:
+            values = self.values
+        if slots is None:
+            slots = range(len(self.names))
+        return {self.names[slot]: float(values[slot]) for slot in slots}
+
+
+class VariableView(MutableMapping):
+    """
+    Live view of the values of a VariableLayout by name.
+    Assigning to a variable changes its value in the layout; variables cannot be added or removed through the view.
+    """
+    def __init__(self, layout):
+        self.layout = layout
+
+    def __getitem__(self, name):
+        if name not in self.layout:
+            raise KeyError(name)
+        return self.layout.get(name)
+
+    def __setitem__(self, name, value):
+        if name not in self.layout:
+            raise KeyError("%s is not a variable; add it with VariableHandler.number or point" % name)
+        self.layout.set(name, value)
+
+    def __delitem__(self, name):
+        raise TypeError("variables cannot be removed")
+
+    def __contains__(self, name):
+        return name in self.layout
+
+    def __iter__(self):
+        return iter(self.layout.names)
+
+    def __len__(self):
+        return len(self.layout)
+
+    def __repr__(self):
+        return repr(self.layout.to_dict())
+
+
 class VariableHandler(object):
     def __init__(self):
-        self.variables = {}
-        self.fixed = set()
+        self.layout = VariableLayout()
+        self.anchor = None  # Name of the point fixed at its initial value
+        self.point_coordinates = set()
+        self.seeded = set()  # Names whose initial value was given rather than drawn at random
+        self.scales = {}  # Typical magnitude of each variable; the solver optimizes variable / scale
         self.entities = []
         self.named_entities = {}
-        self.free_variables = None
+
+    def copy(self):
+        """
+        Handler with the same variables whose values can be changed independently; formula nodes are shared.
+        """
+        out = VariableHandler()
+        out.layout = self.layout.copy()
+        out.anchor = self.anchor
+        out.point_coordinates = set(self.point_coordinates)
+        out.seeded = set(self.seeded)
+        out.scales = dict(self.scales)
+        out.entities = list(self.entities)
+        out.named_entities = dict(self.named_entities)
+        return out
+
+    @property
+    def variables(self):
+        """
+        Values of all variables by name, as a live VariableView.
+        """
+        return VariableView(self.layout)
+
+    @property
+    def fixed(self):
+        """
+        Names of the fixed variables (read-only; use fix to fix one).
+        """
+        return frozenset(name for name in self.layout.names if self.layout.is_fixed(name))
 
     def number(self, name, init=None):
-        assert name not in self.variables
+        assert name not in self.layout
         if init is None:
             init = np.random.rand()
-        self.variables[name] = init
+        else:
+            self.seeded.add(name)
+        self.layout.add(name, init)
         vn = FormulaNode(VariableSignature(name, 'number'), [])
         self.named_entities[name] = vn
         return vn
@@ -25,16 +186,23 @@ class VariableHandler(object):
     def point(self, name, init=None):
         x_name = name + "_x"
         y_name = name + "_y"
-        assert x_name not in self.variables
-        assert y_name not in self.variables
+        assert x_name not in self.layout
+        assert y_name not in self.layout
         if init is None:
-            init = np.random.rand(2)
+            init = (None, None)
         x, y = self.number(x_name, init[0]), self.number(y_name, init[1])
+        self.point_coordinates.update([x_name, y_name])
         vn = self.apply('Point', x, y)
         self.named_entities[name] = vn
-        if len(self.fixed) == 0:
-            self.fixed.add(x_name)
-            self.fixed.add(y_name)
+        if self.anchor is None:
+            self.anchor = name
+            if x_name not in self.seeded:
+                # Only positions relative to the anchor matter, so it is put at the origin rather than at random,
+                # which keeps the fixed values, and so the solution cache keys, reproducible
+                self.layout.set(x_name, 0.0)
+                self.layout.set(y_name, 0.0)
+            self.layout.fix(x_name)
+            self.layout.fix(y_name)
         """
         elif len(self.fixed) == 2:
             self.fixed.add(x_name)
@@ -45,8 +213,6 @@ class VariableHandler(object):
         return self.apply('Line', p1, p2)
 
     def circle(self, center, r=None, init=None):
-        if init is None:
-            init = np.random.rand()
         if r is None:
             r_name = "%s_r" % center.signature.id
             r = self.number(r_name, init=init)
@@ -78,7 +244,7 @@ class VariableHandler(object):
             else:
                 raise Exception()
         else:
-            children = [self.add(child) for child in formula_node.children]
+            children = [self.add(child, assignment) for child in formula_node.children]
             if isinstance(formula_node, FormulaNode):
                 formula = FormulaNode(formula_node.signature, children)
                 if formula_node.signature.id in ['Line', 'Circle']:
@@ -95,35 +261,67 @@ class VariableHandler(object):
             self.entities.append(vn)
         return vn
 
+    def fix(self, name, value):
+        """
+        Fixes the variable at value, which removes it from the vectors of vector_to_dict and dict_to_vector.
+        """
+        self.layout.set(name, value)
+        self.layout.fix(name)
+        self.seeded.discard(name)
+
+    def get_value(self, name):
+        return self.layout.get(name)
+
+    def set_value(self, name, value):
+        """
+        Changes the initial value of the variable.
+        """
+        self.layout.set(name, value)
+
     def get_free_variables(self):
-        return {key: value for key, value in self.variables.iteritems() if key not in self.fixed}
+        return self.layout.to_dict(slots=self.layout.get_free_slots())
 
     def vector_to_dict(self, vector, fix=True):
         """
-        :param vector:
-        :param padding:
-        :return:
+        :param vector: values of the free variables if fix is set, otherwise of all variables, in slot order
+        :return dict:
         """
         if fix:
-            assert len(vector) + len(self.fixed) == len(self.variables)
-        else:
-            assert len(vector) == len(self.variables)
-        if fix:
-            if self.free_variables is None:
-                self.free_variables = self.get_free_variables()
-            variables = self.free_variables
-        else:
-            variables = self.variables
-        out = dict(zip(variables.keys(), vector))
-        if fix:
-            for key in self.fixed: out[key] = self.variables[key]
-        return out
+            assert len(vector) == len(self.layout.get_free_slots())
+            return self.layout.to_dict(self.layout.from_vector(vector))
+        assert len(vector) == len(self.layout)
+        return self.layout.to_dict(vector)
 
     def dict_to_vector(self, fix=True):
         if fix:
-            if self.free_variables is None:
-                self.free_variables = self.get_free_variables()
-            variables = self.free_variables
-        else:
-            variables = self.variables
-        return variables.values()
+            return self.layout.to_vector()
+        return self.layout.values.copy()
+
+    def get_variable_indices(self):
+        """
+        Index of each free variable in the vectors of vector_to_dict and dict_to_vector.
+        """
+        return self.layout.get_free_indices()
+
+    def get_fixed_assignment(self):
+        return self.layout.to_dict(slots=np.flatnonzero(self.layout.fixed_mask))
+
+    def get_scales(self, names):
+        """
+        :param list names:
+        :return numpy.ndarray: scale of each variable, 1 by default
+        """
+        return np.array([self.scales.get(name, 1.0) for name in names])
+
+
+def get_variables(formula, variable_indices):
+    """
+    Names of the free variables (keys of variable_indices) in formula.
+    """
+    if not isinstance(formula, Node):
+        return set()
+    if isinstance(formula, FormulaNode) and isinstance(formula.signature, VariableSignature):
+        if formula.signature.id in variable_indices:
+            return {formula.signature.id}
+        return set()
+    return set().union(*(get_variables(child, variable_indices) for child in formula.children))
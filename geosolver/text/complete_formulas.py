@@ -2,7 +2,8 @@ import re
 
 import networkx as nx
 
-from geosolver.ontology.ontology_definitions import FormulaNode, VariableSignature, SetNode, issubtype, signatures
+from geosolver.ontology.ontology_definitions import FormulaNode, VariableSignature, SetNode, issubtype, signatures, \
+    Node
 
 __author__ = 'minjoon'
 
@@ -57,11 +58,11 @@ def _apply_cc(cc_formulas, core_formulas):
         firsts.add(b_sig)
         graph.add_edge(a_sig, b_sig)
 
-    def tester(node):
+    def tester(node, parent, index):
         if node.signature.valence == 2 and node.is_singular():
             child_node = node.children[0]
             if child_node.signature in graph.nodes() and len(graph.edges(child_node.signature)) == 1:
-                nbr = graph[child_node.signature].keys()[0]
+                nbr = next(iter(graph[child_node.signature]))
                 if is_valid_relation(node.signature, nbr, 1):
                     nbr_node = FormulaNode(nbr, [])
                     return FormulaNode(node.signature, [node.children[0], nbr_node])
@@ -73,20 +74,38 @@ def _apply_cc(cc_formulas, core_formulas):
 
         if node.signature not in firsts:
             return None
-        if node.parent is None:
+        if parent is None:
             raise Exception
-        if isinstance(node.parent, FormulaNode) and (node.parent.signature.valence == 1 or node.parent.is_plural()):
+        if isinstance(parent, FormulaNode) and (parent.signature.valence == 1 or parent.is_plural()):
             args =  [FormulaNode(nbr, []) for nbr in graph[node.signature]
-                     if is_valid_relation(node.parent.signature, nbr, node.index)]
+                     if is_valid_relation(parent.signature, nbr, index)]
             if len(args) == 0:
                 return None
             return SetNode([node] + args)
         return None
 
-    new_formula_nodes = [formula_node.replace_node(tester) for formula_node in core_formulas]
+    new_formula_nodes = [_replace_node(formula_node, tester) for formula_node in core_formulas]
     return new_formula_nodes
 
 
+def _replace_node(node, tester, parent=None, index=None):
+    """
+    Node.replace_node with a tester that also takes the parent of the node in the original formula
+    and the index of the node in it, since nodes do not point to their parents.
+    """
+    if not isinstance(node, Node):
+        return node
+    args = [_replace_node(child, tester, node, idx) for idx, child in enumerate(node.children)]
+    if isinstance(node, FormulaNode):
+        out = FormulaNode(node.signature, args)
+    else:
+        out = node.__class__(args)
+    test = tester(out, parent, index)
+    if bool(test):
+        return test
+    return out
+
+
 def is_valid_relation(parent_signature, child_signature, index):
     parent_type = parent_signature.arg_types[index]
     child_type = child_signature.return_type
@@ -1,4 +1,5 @@
 from collections import defaultdict, Counter
+from functools import reduce
 import itertools
 from operator import __mul__
 from sklearn import svm
@@ -20,7 +21,7 @@ __author__ = 'minjoon'
 
 def _normalize(counter):
     n = len(counter)
-    new_counter = Counter({key: float(value) for key, value in counter.iteritems()})
+    new_counter = Counter({key: float(value) for key, value in counter.items()})
     return new_counter
 
 def filter_tag_rules(unary_model, tag_rules, unary_rules, th):
@@ -174,8 +175,8 @@ class NaiveTagModel(TagModel):
         return tag_rules
 
     def print_lexicon(self):
-        for words, entries in self.lexicon.iteritems():
-            print "%s: %s" % (" ".join(words), ", ".join(" ".join(entry) for entry in entries))
+        for words, entries in self.lexicon.items():
+            print("%s: %s" % (" ".join(words), ", ".join(" ".join(entry) for entry in entries)))
 
 
 class SemanticModel(Model):
@@ -407,9 +408,9 @@ class RFUnaryModel(UnaryModel):
         self.negative_unary_rules.extend(negative_unary_rules)
 
     def fit(self):
-        print "Fitting %s:" % self.__class__.__name__
-        print "# of positive examples:", len(self.positive_unary_rules)
-        print "# of negative examples:", len(self.negative_unary_rules)
+        print("Fitting %s:" % self.__class__.__name__)
+        print("# of positive examples:", len(self.positive_unary_rules))
+        print("# of negative examples:", len(self.negative_unary_rules))
         self.feature_function = UnaryFeatureFunction(self.positive_unary_rules + self.negative_unary_rules)
         X = []
         y = []
@@ -420,7 +421,7 @@ class RFUnaryModel(UnaryModel):
             X.append(self.feature_function.map(nur))
             y.append(0)
 
-        print "length of feature vector:", np.shape(X)[1]
+        print("length of feature vector:", np.shape(X)[1])
 
         cw = {0: len(self.positive_unary_rules), 1: len(self.negative_unary_rules)}
         # self.classifier = RandomForestClassifier(class_weight='auto', n_estimators=30) # RandomForestClassifier()
@@ -461,9 +462,9 @@ class RFCoreModel(BinaryModel):
         self.negative_binary_rules.extend(negative_binary_rules)
 
     def fit(self):
-        print "Fitting %s:" % self.__class__.__name__
-        print "# of positive examples:", len(self.positive_binary_rules)
-        print "# of negative examples:", len(self.negative_binary_rules)
+        print("Fitting %s:" % self.__class__.__name__)
+        print("# of positive examples:", len(self.positive_binary_rules))
+        print("# of negative examples:", len(self.negative_binary_rules))
         self.feature_function = self.feature_function_class(self.positive_binary_rules + self.negative_binary_rules)
         X = []
         y = []
@@ -474,7 +475,7 @@ class RFCoreModel(BinaryModel):
             X.append(self.feature_function.map(nbr))
             y.append(0)
 
-        print "length of feature vector:", np.shape(X)[1]
+        print("length of feature vector:", np.shape(X)[1])
 
         cw = {0: len(self.positive_binary_rules), 1: len(self.negative_binary_rules)}
         # self.classifier = self.classifier_class(class_weight='auto', n_estimators=30)
@@ -505,9 +506,9 @@ class RFIsModel(RFCoreModel):
         return BinaryRule.val_func(p, a, b)
 
     def fit(self):
-        print "Fitting %s:" % self.__class__.__name__
-        print "# of positive examples:", len(self.positive_binary_rules)
-        print "# of negative examples:", len(self.negative_binary_rules)
+        print("Fitting %s:" % self.__class__.__name__)
+        print("# of positive examples:", len(self.positive_binary_rules))
+        print("# of negative examples:", len(self.negative_binary_rules))
         self.feature_function = self.feature_function_class(self.positive_binary_rules + self.negative_binary_rules)
         X = []
         y = []
@@ -518,7 +519,7 @@ class RFIsModel(RFCoreModel):
             X.append(self.feature_function.map(nbr))
             y.append(0)
 
-        print "length of feature vector:", np.shape(X)[1]
+        print("length of feature vector:", np.shape(X)[1])
 
         cw = {0: len(self.positive_binary_rules), 1: len(self.negative_binary_rules)}
         # self.classifier = self.classifier_class(class_weight='auto', n_estimators=30)
@@ -550,9 +551,9 @@ class RFCCModel(RFCoreModel):
                 self.negative_binary_rules.append(binary_rule)
 
     def fit(self):
-        print "Fitting %s:" % self.__class__.__name__
-        print "# of positive examples:", len(self.positive_binary_rules)
-        print "# of negative examples:", len(self.negative_binary_rules)
+        print("Fitting %s:" % self.__class__.__name__)
+        print("# of positive examples:", len(self.positive_binary_rules))
+        print("# of negative examples:", len(self.negative_binary_rules))
         self.feature_function = self.feature_function_class(self.positive_binary_rules + self.negative_binary_rules)
         X = []
         y = []
@@ -563,7 +564,7 @@ class RFCCModel(RFCoreModel):
             X.append(self.feature_function.map(nbr))
             y.append(0)
 
-        print "length of feature vector:", np.shape(X)[1]
+        print("length of feature vector:", np.shape(X)[1])
 
         cw = {0: len(self.positive_binary_rules), 1: len(self.negative_binary_rules)}
         self.classifier = self.classifier_class(class_weight='auto')
@@ -15,15 +15,21 @@ from geosolver.text.rule_model import NaiveTagModel, CombinedModel, \
     RFUnaryModel, RFCoreModel, RFIsModel, RFCCModel, filter_tag_rules, NaiveCCModel
 from geosolver.text.semantic_forest import SemanticForest
 from geosolver.text.syntax_parser import SyntaxParse, stanford_parser
-import cPickle as pickle
+import pickle
 
 __author__ = 'minjoon'
 
 
 def questions_to_syntax_parses(questions, parser=True):
-    syntax_parses = {pk: {number: stanford_parser.get_best_syntax_parse(words, parser=parser)
-                          for number, words in question.sentence_words.iteritems()}
-                     for pk, question in questions.iteritems()}
+    """
+    All sentences are parsed in one batch, so that the parser server sees them concurrently.
+    """
+    keys = [(pk, number) for pk, question in questions.items() for number in question.sentence_words]
+    best_syntax_parses = stanford_parser.get_best_syntax_parses(
+        [questions[pk].sentence_words[number] for pk, number in keys], parser=parser)
+    syntax_parses = {pk: {} for pk in questions}
+    for (pk, number), syntax_parse in zip(keys, best_syntax_parses):
+        syntax_parses[pk][number] = syntax_parse
     return syntax_parses
 
 
@@ -44,8 +50,8 @@ def split_binary_rules(binary_rules):
 def train_tag_model(syntax_parses, annotations):
     tm = NaiveTagModel()
 
-    for pk, local_syntax_parses in syntax_parses.iteritems():
-        for number, syntax_parse in local_syntax_parses.iteritems():
+    for pk, local_syntax_parses in syntax_parses.items():
+        for number, syntax_parse in local_syntax_parses.items():
             semantic_trees = [annotation_to_semantic_tree(syntax_parse, annotation)
                               for annotation in annotations[pk][number].values()]
             assert isinstance(syntax_parse, SyntaxParse)
@@ -59,9 +65,9 @@ def train_semantic_model(tm, syntax_parses, annotations):
     ism = RFIsModel()
     ccm = NaiveCCModel(3)
 
-    for pk, local_syntax_parses in syntax_parses.iteritems():
-        print "training:", pk
-        for number, syntax_parse in local_syntax_parses.iteritems():
+    for pk, local_syntax_parses in syntax_parses.items():
+        print("training:", pk)
+        for number, syntax_parse in local_syntax_parses.items():
             assert isinstance(syntax_parse, SyntaxParse)
             semantic_trees = [annotation_to_semantic_tree(syntax_parse, annotation)
                               for annotation in annotations[pk][number].values()]
@@ -107,10 +113,10 @@ def evaluate_rule_model(combined_model, syntax_parses, annotations, thresholds):
     all_pos_bool_semantic_trees = []
     all_neg_bool_semantic_trees = []
 
-    for pk, local_syntax_parses in syntax_parses.iteritems():
-        print "\n\n\n"
-        print pk
-        for number, syntax_parse in local_syntax_parses.iteritems():
+    for pk, local_syntax_parses in syntax_parses.items():
+        print("\n\n\n")
+        print(pk)
+        for number, syntax_parse in local_syntax_parses.items():
             pos_semantic_trees = set(annotation_to_semantic_tree(syntax_parse, annotation)
                                      for annotation in annotations[pk][number].values())
 
@@ -160,12 +166,12 @@ def evaluate_rule_model(combined_model, syntax_parses, annotations, thresholds):
             all_neg_bool_semantic_trees.extend(neg_bool_semantic_trees)
 
             for pst in pos_bool_semantic_trees:
-                print "pos:", combined_model.get_tree_score(pst), pst
-            print ""
+                print("pos:", combined_model.get_tree_score(pst), pst)
+            print("")
             for nst in neg_bool_semantic_trees:
                 score = combined_model.get_tree_score(nst)
                 if score > 0:
-                    print "neg:", combined_model.get_tree_score(nst), nst
+                    print("neg:", combined_model.get_tree_score(nst), nst)
 
     unary_prs = combined_model.unary_model.get_prs(all_pos_unary_rules, all_neg_unary_rules, thresholds)
     core_prs = combined_model.core_model.get_prs(all_pos_core_rules, all_neg_core_rules, thresholds)
@@ -179,11 +185,11 @@ def evaluate_rule_model(combined_model, syntax_parses, annotations, thresholds):
 def evaluate_opt_model(combined_model, syntax_parses, annotations, match_parses, thresholds):
     tps, fps, tns, fns = defaultdict(int), defaultdict(int), defaultdict(int), defaultdict(int)
 
-    for pk, local_syntax_parses in syntax_parses.iteritems():
-        print "="*80
+    for pk, local_syntax_parses in syntax_parses.items():
+        print("="*80)
         match_parse = match_parses[pk]
-        for number, syntax_parse in local_syntax_parses.iteritems():
-            print pk, number
+        for number, syntax_parse in local_syntax_parses.items():
+            print(pk, number)
             opt_model = TextGreedyOptModel(combined_model)
             # opt_model = FullGreedyOptModel(combined_model, match_parse)
 
@@ -204,13 +210,13 @@ def evaluate_opt_model(combined_model, syntax_parses, annotations, match_parses,
             neg_semantic_trees = semantic_trees - pos_semantic_trees
 
             for pst in pos_semantic_trees:
-                print "pos:", combined_model.get_tree_score(pst), pst
+                print("pos:", combined_model.get_tree_score(pst), pst)
             for nst in neg_semantic_trees:
                 score = combined_model.get_tree_score(nst)
                 if score > 0:
-                    print "neg:", score, nst
+                    print("neg:", score, nst)
 
-            print ""
+            print("")
 
 
             for th in thresholds:
@@ -223,7 +229,7 @@ def evaluate_opt_model(combined_model, syntax_parses, annotations, match_parses,
                 fps[th] += fp
                 tns[th] += tn
                 fns[th] += fn
-            print "-"*80
+            print("-"*80)
 
     prs = {}
 
@@ -248,15 +254,15 @@ def test_rule_model():
     cm = train_semantic_model(tm, tr_s, tr_a)
     unary_prs, core_prs, is_prs, cc_prs, core_tree_prs = evaluate_rule_model(cm, te_s, te_a, np.linspace(0,1,101))
 
-    plt.plot(core_tree_prs.keys(), core_tree_prs.values(), 'o')
+    plt.plot(list(core_tree_prs.keys()), list(core_tree_prs.values()), 'o')
     plt.show()
-    plt.plot(unary_prs.keys(), unary_prs.values(), 'o')
+    plt.plot(list(unary_prs.keys()), list(unary_prs.values()), 'o')
     plt.show()
-    plt.plot(core_prs.keys(), core_prs.values(), 'o')
+    plt.plot(list(core_prs.keys()), list(core_prs.values()), 'o')
     plt.show()
-    plt.plot(is_prs.keys(), is_prs.values(), 'o')
+    plt.plot(list(is_prs.keys()), list(is_prs.values()), 'o')
     plt.show()
-    plt.plot(cc_prs.keys(), cc_prs.values(), 'o')
+    plt.plot(list(cc_prs.keys()), list(cc_prs.values()), 'o')
     plt.show()
 
 def test_opt_model():
@@ -274,8 +280,8 @@ def test_opt_model():
     prs = evaluate_opt_model(cm, te_s, te_a, all_questions, np.linspace(-2,2,21))
 
     ps, rs = zip(*prs.values())
-    plt.plot(prs.keys(), ps, 'o', label='precision')
-    plt.plot(prs.keys(), rs, 'o', label='recall')
+    plt.plot(list(prs.keys()), ps, 'o', label='precision')
+    plt.plot(list(prs.keys()), rs, 'o', label='recall')
     plt.legend(bbox_to_anchor=(0., 1.02, 1., .102), loc=3, ncol=2, mode="expand", borderaxespad=0.)
     plt.show()
 
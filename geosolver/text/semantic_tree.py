@@ -6,8 +6,8 @@ __author__ = 'minjoon'
 
 
 class SemanticTreeNode(FormulaNode):
-    def __init__(self, content, children, parent=None, index=None):
-        super(SemanticTreeNode, self).__init__(content.signature, children, parent, index)
+    def __init__(self, content, children):
+        super(SemanticTreeNode, self).__init__(content.signature, children)
         self.syntax_parse = content.syntax_parse
         self.content = content
 
@@ -0,0 +1,71 @@
+"""
+Local stand-in for the stanford parser server, for tests and runs without the parser.
+It answers the requests of StanfordDependencyParser with k chain-shaped dependency trees:
+the tree of rank r is rooted at word r+1, and every other word depends on its neighbor toward the root.
+Words that are numbers, or were neutralized to 'number', are tagged CD, and the others NN.
+
+Usage: python -m geosolver.text.stub_parser_server [port], then point STANFORD_PARSER_SERVER_URL to it.
+"""
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+import sys
+import threading
+from urllib.parse import urlparse, parse_qs
+
+__author__ = 'minjoon'
+
+
+class StubParserHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        params = parse_qs(urlparse(self.path).query)
+        words = params['words'][0].split('+') if 'words' in params else []
+        k = int(params['k'][0]) if 'k' in params else 1
+        body = json.dumps(get_stub_trees(words, k)).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def get_stub_trees(words, k):
+    """
+    :param list words:
+    :param int k:
+    :return list: trees in the format of the parser server, with 1-based word indices and 0 as the root
+    """
+    tags = ['CD' if word == 'number' or word.replace('.', '', 1).isdigit() else 'NN' for word in words]
+    trees = []
+    for rank in range(min(k, len(words))):
+        head = rank + 1
+        tuples = [['root', 0, head, 'ROOT', tags[head-1]]]
+        for index in range(1, len(words)+1):
+            if index == head:
+                continue
+            from_ = index + 1 if index < head else index - 1
+            tuples.append(['dep', from_, index, tags[from_-1], tags[index-1]])
+        trees.append({'score': -float(rank), 'tuples': tuples})
+    return trees
+
+
+def start_stub_server(port=0):
+    """
+    Serves in a daemon thread; port 0 picks a free port.
+
+    :return ThreadingHTTPServer: its url is "http://localhost:%d/dep" % server.server_port
+    """
+    server = ThreadingHTTPServer(('localhost', port), StubParserHandler)
+    thread = threading.Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+    return server
+
+
+if __name__ == "__main__":
+    port = int(sys.argv[1]) if len(sys.argv) > 1 else 9000
+    ThreadingHTTPServer(('localhost', port), StubParserHandler).serve_forever()
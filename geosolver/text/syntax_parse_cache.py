@@ -0,0 +1,64 @@
+"""
+Persistent cache of the responses of the dependency parser server, in a sqlite file.
+A response only depends on the neutralized sentence sent to the server and on k,
+so it is stored under these and shared by all questions with the same sentence.
+The connection is opened again in a forked process, as sqlite connections must not cross a fork.
+"""
+import json
+import os
+import sqlite3
+
+__author__ = 'minjoon'
+
+
+class SyntaxParseCache(object):
+    def __init__(self, path):
+        """
+        :param str path: path of the sqlite file
+        """
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        self._connection = None
+        self._pid = None
+
+    def get(self, sentence, k):
+        """
+        :param list sentence: neutralized words
+        :param int k:
+        :return: the response of the server, or None
+        """
+        row = self._get_connection().execute("SELECT response FROM parses WHERE sentence=? AND k=?",
+                                             (json.dumps(sentence), k)).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return json.loads(row[0])
+
+    def set_many(self, entries):
+        """
+        :param list entries: (sentence, k, response) triples, stored in a single transaction
+        """
+        connection = self._get_connection()
+        with connection:
+            connection.executemany("INSERT OR REPLACE INTO parses (sentence, k, response) VALUES (?, ?, ?)",
+                                   [(json.dumps(sentence), k, json.dumps(response))
+                                    for sentence, k, response in entries])
+
+    def clear(self):
+        connection = self._get_connection()
+        with connection:
+            connection.execute("DELETE FROM parses")
+
+    def _get_connection(self):
+        if self._connection is None or self._pid != os.getpid():
+            dir_path = os.path.dirname(self.path)
+            if dir_path and not os.path.exists(dir_path):
+                os.makedirs(dir_path, exist_ok=True)
+            self._connection = sqlite3.connect(self.path, timeout=60)
+            self._pid = os.getpid()
+            with self._connection:
+                self._connection.execute("CREATE TABLE IF NOT EXISTS parses "
+                                         "(sentence TEXT, k INTEGER, response TEXT, PRIMARY KEY (sentence, k))")
+        return self._connection
@@ -1,17 +1,101 @@
+from concurrent.futures import ThreadPoolExecutor
 import itertools
+import numpy as np
 import requests
+from requests.adapters import HTTPAdapter
 from geosolver import settings
+from geosolver.text.syntax_parse_cache import SyntaxParseCache
 import networkx as nx
 
 __author__ = 'minjoon'
 
+# Number of sentences sent to the parser server concurrently, which is also the size of the connection pool
+NUM_THREADS = 8
+
+# Sentences of at most this many words get the distances between all pairs of words computed on construction
+MAX_PRECOMPUTED_LENGTH = 64
+
+# POS tags and relation labels of the syntax parses of this process, indexed by the ids the parses store
+_tags = []
+_tag_ids = {}
+_relations = []
+_relation_ids = {}
+
+
 class SyntaxParse(object):
-    def __init__(self, words, directed, undirected, rank, score):
+    """
+    Dependency parse of a sentence, stored as arrays rather than networkx graphs:
+    the head, dependent and relation id of each dependency (one head per word for a tree),
+    and the POS tag id of each word, -1 for the words outside the parse.
+    The distances between all pairs of words are computed once, on construction for sentences of at most
+    MAX_PRECOMPUTED_LENGTH words and on first use otherwise, so that the span queries are lookups.
+    The queries behave as on the graphs, including the networkx exceptions for words outside the parse.
+    """
+    def __init__(self, words, heads, dependents, relation_ids, tag_ids, rank, score):
+        """
+        :param dict words: word by index, from 0
+        :param numpy.ndarray heads: head of each dependency
+        :param numpy.ndarray dependents: dependent of each dependency
+        :param numpy.ndarray relation_ids: relation id of each dependency
+        :param numpy.ndarray tag_ids: tag id of each word
+        """
         self.words = words
-        self.directed = directed
-        self.undirected = undirected
+        self.heads = heads
+        self.dependents = dependents
+        self.relation_ids = relation_ids
+        self.tag_ids = tag_ids
         self.rank = rank
         self.score = score
+        self._neighbors = {}
+        self._distances = {}
+        if len(tag_ids) <= MAX_PRECOMPUTED_LENGTH:
+            self._get_distances(False)
+            self._get_distances(True)
+
+    @classmethod
+    def from_tuples(cls, words, tuples, rank, score):
+        """
+        :param dict words:
+        :param list tuples: (label, head, dependent, head tag, dependent tag) of each dependency,
+        with indices from 1 and 0 for the root, as sent by the parser server
+        """
+        # Dependencies are kept in the order they are first given, and a repeated dependency takes the last label,
+        # as when adding them to a networkx.DiGraph
+        edges = {}
+        tags = {}
+        for label, from_, to, from_tag, to_tag in tuples:
+            from_ -= 1
+            to -= 1
+            if from_ < 0:
+                continue
+            edges[(from_, to)] = label
+            tags.setdefault(from_, from_tag)
+            tags.setdefault(to, to_tag)
+        triples = [(from_, to, label) for (from_, to), label in edges.items()]
+        heads = np.array([from_ for from_, _, _ in triples], dtype=np.int16)
+        dependents = np.array([to for _, to, _ in triples], dtype=np.int16)
+        relation_ids = np.array([_get_id(_relations, _relation_ids, label) for _, _, label in triples], dtype=np.int16)
+        tag_ids = np.full(len(words), -1, dtype=np.int16)
+        for index, tag in tags.items():
+            tag_ids[index] = _get_id(_tags, _tag_ids, tag)
+        return cls(words, heads, dependents, relation_ids, tag_ids, rank, score)
+
+    @property
+    def directed(self):
+        """
+        The parse as a networkx.DiGraph, built on each access.
+        """
+        graph = nx.DiGraph()
+        for from_, to, relation_id in zip(self.heads.tolist(), self.dependents.tolist(), self.relation_ids.tolist()):
+            graph.add_edge(from_, to, label=_relations[relation_id])
+        for index in graph.nodes:
+            graph.nodes[index].update(label="%s-%d" % (self.words[index], index), word=self.words[index],
+                                      tag=_tags[self.tag_ids[index]])
+        return graph
+
+    @property
+    def undirected(self):
+        return self.directed.to_undirected()
 
     def get_words(self, span):
         return tuple(self.words[idx] for idx in range(*span))
@@ -22,9 +106,9 @@ class SyntaxParse(object):
         return self.words[index]
 
     def get_pos_by_index(self, index):
-        if index not in self.undirected.node:
+        if not self._has_index(index):
             return None
-        tag = self.undirected.node[index]['tag']
+        tag = _tags[self.tag_ids[index]]
         return tag
 
     def get_pos_by_span(self, span):
@@ -42,20 +126,55 @@ class SyntaxParse(object):
                     yield (start, end)
 
     def shortest_path_between_spans(self, s0, s1, directed=False):
-        paths = [self.shortest_path_between_indices(i0, i1, directed)
-                 for i0, i1 in itertools.product(range(*s0), range(*s1))]
-        return min(paths, key=lambda path: len(path))
+        """
+        The first shortest path between a word of s0 and a word of s1, in the order of the word pairs.
+        """
+        distances = self._get_distances(directed)
+        pairs = list(itertools.product(range(*s0), range(*s1)))
+        if len(pairs) == 0 or any(distances[i0][i1] < 0 for i0, i1 in pairs):
+            paths = [self.shortest_path_between_indices(i0, i1, directed) for i0, i1 in pairs]
+            return min(paths, key=lambda path: len(path))
+        i0, i1 = min(pairs, key=lambda pair: distances[pair[0]][pair[1]])
+        return self.shortest_path_between_indices(i0, i1, directed)
 
     def shortest_path_between_indices(self, i0, i1, directed=False):
-        graph = self.undirected
-        if directed:
-            graph = self.directed
-        path = nx.shortest_path(graph, i0, i1)
+        """
+        Bidirectional search, as networkx.shortest_path, so that ties between shortest paths are broken alike.
+        """
+        self.distance_between_indices(i0, i1, directed)
+        if i0 == i1:
+            return [i0]
+        successors = self._get_neighbors(directed)
+        predecessors = self._get_neighbors(directed, reverse=True)
+        pred = {i0: None}
+        succ = {i1: None}
+        forward_fringe = [i0]
+        reverse_fringe = [i1]
+        middle = None
+        while middle is None:
+            if len(forward_fringe) <= len(reverse_fringe):
+                middle = _extend_fringe(successors, forward_fringe, pred, succ)
+            else:
+                middle = _extend_fringe(predecessors, reverse_fringe, succ, pred)
+
+        path = []
+        index = middle
+        while index is not None:
+            path.append(index)
+            index = pred[index]
+        path.reverse()
+        index = succ[middle]
+        while index is not None:
+            path.append(index)
+            index = succ[index]
         return path
 
     def distance_between_spans(self, s0, s1, directed=False):
-        distances = [self.distance_between_indices(i0, i1, directed)
-                     for i0, i1 in itertools.product(range(*s0), range(*s1))]
+        rows = self._get_distances(directed)
+        distances = [rows[i0][i1] for i0 in range(*s0) for i1 in range(*s1)]
+        if len(distances) == 0 or min(distances) < 0:
+            distances = [self.distance_between_indices(i0, i1, directed)
+                         for i0, i1 in itertools.product(range(*s0), range(*s1))]
         return min(distances)
 
     def plain_distance_between_spans(self, s0, s1, directed=False):
@@ -64,10 +183,13 @@ class SyntaxParse(object):
         return min(distances)
 
     def distance_between_indices(self, i0, i1, directed=False):
-        graph = self.undirected
-        if directed:
-            graph = self.directed
-        d = nx.shortest_path_length(graph, i0, i1)
+        if not self._has_index(i0):
+            raise nx.NodeNotFound("Source %s is not in G" % i0)
+        if not self._has_index(i1):
+            raise nx.NodeNotFound("Target %s is not in G" % i1)
+        d = self._get_distances(directed)[i0][i1]
+        if d < 0:
+            raise nx.NetworkXNoPath("No path between %s and %s." % (i0, i1))
         return d
 
     def plain_distance_between_indices(self, i0, i1, directed=False):
@@ -84,24 +206,108 @@ class SyntaxParse(object):
         return None
 
     def relation_between_indices(self, i0, i1, directed=False):
-        graph = self.undirected
-        if directed: graph = self.directed
-
-        if i1 in graph[i0]:
-            label = graph[i0][i1]['label']
-            return label
-        return None
+        return self._get_neighbors(directed)[i0].get(i1)
 
     def get_neighbors(self, span, directed=False):
-        graph = self.undirected
-        if directed: graph = self.directed
+        neighbors = self._get_neighbors(directed)
 
         nbrs = {}
         for from_ in range(*span):
-            for to in graph[from_]:
-                nbrs[to] = graph[from_][to]['label']
+            for to, label in neighbors[from_].items():
+                nbrs[to] = label
         return nbrs
 
+    def _has_index(self, index):
+        return 0 <= index < len(self.tag_ids) and self.tag_ids[index] >= 0
+
+    def _get_neighbors(self, directed, reverse=False):
+        """
+        Label of each neighbor of each word in the parse, in the order of the adjacency of the networkx graphs:
+        dependents (or heads if reverse) in the directed parse, and both in the undirected parse,
+        where a dependency in both directions takes the label of the one later in the adjacency.
+        """
+        key = (directed, reverse and directed)
+        if key not in self._neighbors:
+            triples = list(zip(self.heads.tolist(), self.dependents.tolist(), self.relation_ids.tolist()))
+            successors = {}
+            predecessors = {}
+            for from_, to, relation_id in triples:
+                for index in (from_, to):
+                    successors.setdefault(index, {})
+                    predecessors.setdefault(index, {})
+                successors[from_][to] = _relations[relation_id]
+                predecessors[to][from_] = _relations[relation_id]
+            self._neighbors[(True, False)] = successors
+            self._neighbors[(True, True)] = predecessors
+            neighbors = {index: {} for index in successors}
+            for from_, d in successors.items():
+                for to, label in d.items():
+                    neighbors[from_][to] = label
+                    neighbors[to][from_] = label
+            self._neighbors[(False, False)] = neighbors
+        return self._neighbors[key]
+
+    def _get_distances(self, directed):
+        """
+        Rows of the distances between the words, -1 where there is no path.
+        Kept as lists rather than an array, as they are read one entry at a time.
+        """
+        if directed not in self._distances:
+            distances = np.full((len(self.tag_ids), len(self.tag_ids)), -1, dtype=np.int16)
+            neighbors = self._get_neighbors(directed)
+            for source in neighbors:
+                reached = {source: 0}
+                frontier = [source]
+                while len(frontier) > 0:
+                    next_frontier = []
+                    for index in frontier:
+                        for nbr in neighbors[index]:
+                            if nbr not in reached:
+                                reached[nbr] = reached[index] + 1
+                                next_frontier.append(nbr)
+                    frontier = next_frontier
+                distances[source, list(reached)] = list(reached.values())
+            self._distances[directed] = distances.tolist()
+        return self._distances[directed]
+
+    def __getstate__(self):
+        # Ids are only valid in this process, so tags and relations are pickled by name
+        return {'words': self.words, 'heads': self.heads, 'dependents': self.dependents,
+                'relations': [_relations[id_] for id_ in self.relation_ids.tolist()],
+                'tags': [_tags[id_] if id_ >= 0 else None for id_ in self.tag_ids.tolist()],
+                'rank': self.rank, 'score': self.score}
+
+    def __setstate__(self, state):
+        relation_ids = np.array([_get_id(_relations, _relation_ids, relation) for relation in state['relations']],
+                                dtype=np.int16)
+        tag_ids = np.array([_get_id(_tags, _tag_ids, tag) if tag is not None else -1 for tag in state['tags']],
+                           dtype=np.int16)
+        self.__init__(state['words'], state['heads'], state['dependents'], relation_ids, tag_ids,
+                      state['rank'], state['score'])
+
+
+def _extend_fringe(neighbors, fringe, reached, other_reached):
+    """
+    Replaces the content of fringe with its next level, and returns the index where the searches meet, if any.
+    """
+    this_level = list(fringe)
+    del fringe[:]
+    for index in this_level:
+        for nbr in neighbors[index]:
+            if nbr not in reached:
+                fringe.append(nbr)
+                reached[nbr] = index
+            if nbr in other_reached:
+                return nbr
+    return None
+
+
+def _get_id(names, ids, name):
+    if name not in ids:
+        ids[name] = len(names)
+        names.append(name)
+    return ids[name]
+
 
 class SyntaxParser(object):
     def get_syntax_parses(self, words, k, unique=True):
@@ -110,55 +316,86 @@ class SyntaxParser(object):
         """
         raise Exception("This function must be overriden!")
 
+    def get_syntax_parses_batch(self, words_list, k, unique=True, parser=True):
+        """
+        Returns the list of syntax parses of each sentence in words_list.
+        """
+        return [self.get_syntax_parses(words, k, unique=unique, parser=parser) for words in words_list]
+
     def get_best_syntax_parse(self, words, parser=True):
         return self.get_syntax_parses(words, 1, parser=parser)[0]
 
+    def get_best_syntax_parses(self, words_list, parser=True):
+        return [parses[0] for parses in self.get_syntax_parses_batch(words_list, 1, parser=parser)]
+
 
 class StanfordDependencyParser(SyntaxParser):
     """
     Connects to stanford parser sever via http.
+    Responses are kept in a SyntaxParseCache if cache_path is given,
+    and sentences that are not cached are sent to the server concurrently over pooled connections.
     """
-    def __init__(self, server_url):
+    def __init__(self, server_url, cache_path=None):
         self.server_url = server_url
+        self.cache = SyntaxParseCache(cache_path) if cache_path is not None else None
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=NUM_THREADS, pool_maxsize=NUM_THREADS)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
 
     def get_syntax_parses(self, words, k, unique=True, parser=True):
+        return self.get_syntax_parses_batch([words], k, unique=unique, parser=parser)[0]
+
+    def get_syntax_parses_batch(self, words_list, k, unique=True, parser=True):
         # FIXME : this should be fixed at geoserver level
-        words = {key: word.lstrip().rstrip() for key, word in words.iteritems()}
+        words_list = [{key: word.lstrip().rstrip() for key, word in words.items()} for words in words_list]
         if not parser:
-            return [SyntaxParse(words, None, None, None, None)]
-
-        sentence = [words[index] for index in sorted(words.keys())]
-        neutral_sentence = [_neutralize(word) for word in sentence]
+            return [[SyntaxParse.from_tuples(words, [], None, None)] for words in words_list]
+
+        sentences = [[_neutralize(words[index]) for index in sorted(words.keys())] for words in words_list]
+        responses = {}
+        missing = []
+        for sentence in sentences:
+            key = tuple(sentence)
+            if key in responses:
+                continue
+            responses[key] = self.cache.get(sentence, k) if self.cache is not None else None
+            if responses[key] is None:
+                missing.append(sentence)
+
+        with ThreadPoolExecutor(NUM_THREADS) as executor:
+            futures = [executor.submit(self._request, sentence, k) for sentence in missing]
+        # The responses that were received are cached even if other requests failed, before raising the first error
+        received = []
+        for sentence, future in zip(missing, futures):
+            if future.exception() is None:
+                responses[tuple(sentence)] = future.result()
+                received.append(sentence)
+        if self.cache is not None and len(received) > 0:
+            self.cache.set_many([(sentence, k, responses[tuple(sentence)]) for sentence in received])
+        for future in futures:
+            if future.exception() is not None:
+                raise future.exception()
+
+        return [_get_syntax_parses(words, responses[tuple(sentence)], unique)
+                for words, sentence in zip(words_list, sentences)]
+
+    def _request(self, neutral_sentence, k):
         params = {'words': '+'.join(neutral_sentence), 'k': k, 'paragraph': ' '.join(neutral_sentence)}
-        r = requests.get(self.server_url, params=params)
-        data = r.json()
-        trees = []
-
-        for rank, tree_data in enumerate(data):
-            score = tree_data['score']
-            tuples = tree_data['tuples']
-            graph = nx.DiGraph()
-            for label, from_, to, from_tag, to_tag in tuples:
-                from_ -= 1
-                to -= 1
-                if from_ < 0:
-                    continue
-                graph.add_edge(from_, to, label=label)
-                if 'label' not in graph.node[from_]:
-                    graph.node[from_]['label'] = "%s-%d" % (words[from_], from_)
-                    graph.node[from_]['word'] = words[from_]
-                    graph.node[from_]['tag'] = from_tag
-
-                if 'label' not in graph.node[to]:
-                    graph.node[to]['label'] = "%s-%d" % (words[to], to)
-                    graph.node[to]['word'] = words[to]
-                    graph.node[to]['tag'] = to_tag
-
-            if unique and not any(_match_trees(syntax_tree.directed, graph) for syntax_tree in trees):
-                tree = SyntaxParse(words, graph, graph.to_undirected(), rank, score)
-                trees.append(tree)
-
-        return trees
+        r = self.session.get(self.server_url, params=params)
+        r.raise_for_status()
+        return r.json()
+
+
+def _get_syntax_parses(words, data, unique):
+    trees = []
+
+    for rank, tree_data in enumerate(data):
+        tree = SyntaxParse.from_tuples(words, tree_data['tuples'], rank, tree_data['score'])
+        if unique and not any(_match_trees(syntax_tree, tree) for syntax_tree in trees):
+            trees.append(tree)
+
+    return trees
 
 def _neutralize(word):
     if word.startswith("@v"):
@@ -172,18 +409,18 @@ def _match_trees(tree0, tree1, match_edge_label=False):
     Returns True if tree0 and tree1 are identical.
     Edge labels are not considered unless match_edge_label is set to True.
 
-    :param tree0:
-    :param tree1:
+    :param SyntaxParse tree0:
+    :param SyntaxParse tree1:
     :param match_edge_label:
     :return:
     """
-    assert isinstance(tree0, nx.DiGraph)
-    assert isinstance(tree1, nx.DiGraph)
-    for u, v, data in tree0.edges(data=True):
-        if not tree1.has_edge(u, v):
-            return False
-        if match_edge_label and data['label'] != tree1[u][v]['label']:
-            return False
-    return True
-
-stanford_parser = StanfordDependencyParser(settings.STANFORD_PARSER_SERVER_URL)
+    assert isinstance(tree0, SyntaxParse)
+    assert isinstance(tree1, SyntaxParse)
+    if match_edge_label:
+        return set(zip(tree0.heads.tolist(), tree0.dependents.tolist(), tree0.relation_ids.tolist())) <= \
+            set(zip(tree1.heads.tolist(), tree1.dependents.tolist(), tree1.relation_ids.tolist()))
+    return set(zip(tree0.heads.tolist(), tree0.dependents.tolist())) <= \
+        set(zip(tree1.heads.tolist(), tree1.dependents.tolist()))
+
+stanford_parser = StanfordDependencyParser(settings.STANFORD_PARSER_SERVER_URL,
+                                           settings.get_cache_path("syntax_parse_cache.sqlite"))
@@ -0,0 +1,217 @@
+"""
+Against the stub parser server, a batch gives the same parses as one sentence at a time,
+repeated sentences are served from the cache, and the responses received before a failed request are cached.
+SyntaxParse, also after pickling, answers every query like the networkx graphs it replaced, on random parses.
+"""
+from http.server import ThreadingHTTPServer
+import itertools
+import pickle
+import random
+import threading
+
+import networkx as nx
+import numpy as np
+import pytest
+import requests
+
+from geosolver.text.stub_parser_server import StubParserHandler, start_stub_server
+from geosolver.text.syntax_parser import StanfordDependencyParser, SyntaxParse
+
+__author__ = 'minjoon'
+
+SENTENCES = ["In triangle ABC , AB = @v_0", "Find the area of circle O", "AC = @v_1 and BC = 4",
+             "Find the area of circle O"]
+
+
+def _get_words_list(sentences):
+    return [dict(enumerate(sentence.split(' '))) for sentence in sentences]
+
+
+def _get_summary(syntax_parse):
+    return (syntax_parse.words, syntax_parse.heads.tolist(), syntax_parse.dependents.tolist(),
+            syntax_parse.relation_ids.tolist(), syntax_parse.tag_ids.tolist(), syntax_parse.rank, syntax_parse.score)
+
+
+class _FailingHandler(StubParserHandler):
+    """
+    Fails the sentences that contain 'fail'.
+    """
+    def do_GET(self):
+        if 'fail' in self.path:
+            self.send_response(500)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        StubParserHandler.do_GET(self)
+
+
+@pytest.fixture
+def server():
+    server = start_stub_server()
+    yield server
+    server.shutdown()
+
+
+def _get_url(server):
+    return "http://localhost:%d/dep" % server.server_port
+
+
+def test_batch(server):
+    parser = StanfordDependencyParser(_get_url(server))
+    words_list = _get_words_list(SENTENCES)
+    batch = parser.get_syntax_parses_batch(words_list, 3)
+    assert len(batch) == len(SENTENCES)
+    for words, syntax_parses in zip(words_list, batch):
+        expected = parser.get_syntax_parses(words, 3)
+        assert [_get_summary(parse) for parse in syntax_parses] == [_get_summary(parse) for parse in expected]
+    assert batch[0][0].get_pos_by_index(6) == 'CD'
+
+
+def test_cache(server, tmpdir):
+    path = str(tmpdir.join("syntax_parse_cache.sqlite"))
+    words_list = _get_words_list(SENTENCES)
+    parser = StanfordDependencyParser(_get_url(server), path)
+    expected = parser.get_best_syntax_parses(words_list)
+    assert (parser.cache.hits, parser.cache.misses) == (0, 3)
+
+    parser = StanfordDependencyParser("http://localhost:1/dep", path)
+    best_syntax_parses = parser.get_best_syntax_parses(words_list)
+    assert (parser.cache.hits, parser.cache.misses) == (3, 0)
+    assert [_get_summary(parse) for parse in best_syntax_parses] == [_get_summary(parse) for parse in expected]
+
+
+def test_failed_request(tmpdir):
+    server = ThreadingHTTPServer(('localhost', 0), _FailingHandler)
+    thread = threading.Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+    try:
+        path = str(tmpdir.join("syntax_parse_cache.sqlite"))
+        parser = StanfordDependencyParser(_get_url(server), path)
+        with pytest.raises(requests.HTTPError):
+            parser.get_best_syntax_parses(_get_words_list(SENTENCES + ["this will fail"]))
+        parser = StanfordDependencyParser("http://localhost:1/dep", path)
+        assert len(parser.get_best_syntax_parses(_get_words_list(SENTENCES))) == len(SENTENCES)
+        assert (parser.cache.hits, parser.cache.misses) == (3, 0)
+    finally:
+        server.shutdown()
+
+
+def test_without_parser(server):
+    parser = StanfordDependencyParser(_get_url(server))
+    syntax_parse, = parser.get_syntax_parses({0: " AB ", 1: "= @v_0"}, 1, parser=False)
+    assert syntax_parse.words == {0: "AB", 1: "= @v_0"}
+    assert np.array_equal(syntax_parse.heads, [])
+
+
+class _ReferenceParse(object):
+    """
+    The networkx graphs that SyntaxParse was built on before it held arrays, with the same queries.
+    """
+    def __init__(self, words, tuples):
+        graph = nx.DiGraph()
+        for label, from_, to, from_tag, to_tag in tuples:
+            from_ -= 1
+            to -= 1
+            if from_ < 0:
+                continue
+            graph.add_edge(from_, to, label=label)
+            for index, tag in ((from_, from_tag), (to, to_tag)):
+                if 'tag' not in graph.nodes[index]:
+                    graph.nodes[index]['tag'] = tag
+        self.words = words
+        self.directed = graph
+        self.undirected = graph.to_undirected()
+
+    def _get_graph(self, directed):
+        return self.directed if directed else self.undirected
+
+    def get_pos_by_index(self, index):
+        if index not in self.undirected.nodes:
+            return None
+        return self.undirected.nodes[index]['tag']
+
+    def get_pos_by_span(self, span):
+        return self.get_pos_by_index(span[-1]-1)
+
+    def shortest_path_between_spans(self, s0, s1, directed=False):
+        paths = [nx.shortest_path(self._get_graph(directed), i0, i1)
+                 for i0, i1 in itertools.product(range(*s0), range(*s1))]
+        return min(paths, key=lambda path: len(path))
+
+    def distance_between_spans(self, s0, s1, directed=False):
+        return min(nx.shortest_path_length(self._get_graph(directed), i0, i1)
+                   for i0, i1 in itertools.product(range(*s0), range(*s1)))
+
+    def relation_between_spans(self, s0, s1, directed=False):
+        graph = self._get_graph(directed)
+        relations = [graph[i0][i1]['label'] if i1 in graph[i0] else None
+                     for i0, i1 in itertools.product(range(*s0), range(*s1))]
+        return next((relation for relation in relations if relation is not None), None)
+
+    def get_neighbors(self, span, directed=False):
+        graph = self._get_graph(directed)
+        return {to: graph[from_][to]['label'] for from_ in range(*span) for to in graph[from_]}
+
+
+def _get_random_tuples(rng, num_words):
+    """
+    A tree over some of the words, sometimes with a word that has two heads and a repeated dependency.
+    """
+    tags = ['NN', 'VB', 'CD', 'JJ', 'IN']
+    relations = ['nsubj', 'dobj', 'amod', 'compound', 'det']
+    root = rng.randrange(num_words) + 1
+    tuples = [['root', 0, root, 'ROOT', rng.choice(tags)]]
+    placed = [root]
+    order = list(range(1, num_words+1))
+    rng.shuffle(order)
+    for index in order:
+        if index == root or rng.random() < 0.1:
+            continue
+        tuples.append([rng.choice(relations), rng.choice(placed), index, rng.choice(tags), rng.choice(tags)])
+        placed.append(index)
+    if rng.random() < 0.3 and len(placed) > 2:
+        from_, to = rng.sample(placed, 2)
+        tuples.append(['conj', from_, to, 'NN', 'NN'])
+    if rng.random() < 0.2 and len(tuples) > 1:
+        tuples.append(['dup'] + tuples[1][1:])
+    return tuples
+
+
+def _call(function, *args):
+    try:
+        result = function(*args)
+    except Exception as e:
+        return 'exception', type(e).__name__
+    return sorted(result.items()) if isinstance(result, dict) else result
+
+
+def _get_answers(parse, rng, num_words):
+    spans = [(start, end) for start in range(num_words) for end in range(start+1, min(num_words, start+2)+1)]
+    answers = [_call(parse.get_pos_by_index, index) for index in range(-1, num_words+1)]
+    for span in spans:
+        answers.append(_call(parse.get_pos_by_span, span))
+        answers.extend(_call(parse.get_neighbors, span, directed) for directed in (False, True))
+    for s0 in rng.sample(spans, min(4, len(spans))):
+        for s1, directed in itertools.product(spans, (False, True)):
+            answers.append(_call(parse.distance_between_spans, s0, s1, directed))
+            answers.append(_call(parse.shortest_path_between_spans, s0, s1, directed))
+            answers.append(_call(parse.relation_between_spans, s0, s1, directed))
+    return answers
+
+
+def test_reference_parses():
+    rng = random.Random(0)
+    mismatches = 0
+    for _ in range(300):
+        num_words = rng.randint(1, 12)
+        words = {index: rng.choice(['the', 'x', 'AB', 'is', '5']) for index in range(num_words)}
+        tuples = _get_random_tuples(rng, num_words)
+        parse = SyntaxParse.from_tuples(words, tuples, 0, 0.0)
+        reference = _ReferenceParse(words, tuples)
+        seed = rng.random()
+        expected = _get_answers(reference, random.Random(seed), num_words)
+        for other in (parse, pickle.loads(pickle.dumps(parse))):
+            if _get_answers(other, random.Random(seed), num_words) != expected:
+                mismatches += 1
+    assert mismatches == 0
@@ -0,0 +1,160 @@
+"""
+Runs a function over many inputs on a pool of worker processes, isolating the runs from each other.
+Each worker enforces a time limit per run with SIGALRM and an optional address space limit,
+and is replaced after max_tasks_per_child runs, so that leaks in native code (OpenCV, sklearn) do not accumulate.
+A worker that dies or does not return within the time limit and a grace period is killed and replaced,
+and its run is reported as an error; the other runs are not affected.
+Results are streamed back in order of completion.
+"""
+from contextlib import contextmanager
+import multiprocessing
+import queue
+import signal
+import time
+import traceback
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+from geosolver import parameters
+
+__author__ = 'minjoon'
+
+# Seconds after the time limit before a worker that ignored SIGALRM (e.g. stuck in native code) is killed
+GRACE_PERIOD = 30
+
+
+class TimeLimitExceeded(Exception):
+    pass
+
+
+@contextmanager
+def time_limit(seconds):
+    """
+    Raises TimeLimitExceeded in the main thread if the block runs longer than seconds (None for no limit).
+    """
+    if seconds is None:
+        yield
+        return
+
+    def handler(signum, frame):
+        raise TimeLimitExceeded("Timeout after %d seconds" % seconds)
+    previous_handler = signal.signal(signal.SIGALRM, handler)
+    signal.alarm(int(seconds))
+    try:
+        yield
+    finally:
+        signal.alarm(0)
+        signal.signal(signal.SIGALRM, previous_handler)
+
+
+def run_benchmark(function, args_list, num_processes=parameters.BENCHMARK_NUM_PROCESSES,
+                  timeout=parameters.BENCHMARK_TIMEOUT, memory_limit=parameters.BENCHMARK_MEMORY_LIMIT,
+                  max_tasks_per_child=parameters.BENCHMARK_MAX_TASKS_PER_CHILD):
+    """
+    Generator of (index, result, error) for function(*args_list[index]), in order of completion.
+    error is None, or a message if the run raised, timed out or killed its worker, in which case result is None.
+    With the fork start method, function and args_list are inherited by the workers rather than pickled.
+
+    :param function function:
+    :param list args_list: list of argument tuples
+    :param int num_processes: number of workers; the number of CPUs by default
+    :param int timeout: seconds per run; None for no limit
+    :param int memory_limit: bytes of address space per worker
+    :param int max_tasks_per_child: runs per worker before it is replaced; None to keep workers
+    """
+    if num_processes is None:
+        num_processes = multiprocessing.cpu_count()
+    methods = multiprocessing.get_all_start_methods()
+    context = multiprocessing.get_context('fork' if 'fork' in methods else None)
+    result_queue = context.Queue()
+    pending = list(range(len(args_list)))[::-1]
+    workers = {}
+    next_worker_id = 0
+    try:
+        while len(pending) > 0 or len(workers) > 0:
+            while len(workers) < num_processes and len(pending) > 0:
+                worker = _Worker(context, next_worker_id, function, args_list, result_queue, timeout, memory_limit)
+                workers[next_worker_id] = worker
+                next_worker_id += 1
+                worker.assign(pending.pop())
+
+            try:
+                worker_id, index, result, error = result_queue.get(timeout=1.0)
+            except queue.Empty:
+                for worker in list(workers.values()):
+                    error = worker.get_failure()
+                    if error is not None:
+                        yield worker.index, None, error
+                        worker.kill()
+                        del workers[worker.id]
+                continue
+
+            worker = workers[worker_id]
+            yield index, result, error
+            worker.index = None
+            worker.num_tasks += 1
+            if len(pending) > 0 and (max_tasks_per_child is None or worker.num_tasks < max_tasks_per_child):
+                worker.assign(pending.pop())
+            else:
+                worker.stop()
+                del workers[worker_id]
+    finally:
+        for worker in workers.values():
+            worker.kill()
+
+
+class _Worker(object):
+    def __init__(self, context, id_, function, args_list, result_queue, timeout, memory_limit):
+        self.id = id_
+        self.timeout = timeout
+        self.task_queue = context.Queue()
+        self.process = context.Process(target=_work, args=(id_, function, args_list, self.task_queue, result_queue,
+                                                           timeout, memory_limit))
+        self.process.daemon = True
+        self.process.start()
+        self.index = None
+        self.start_time = None
+        self.num_tasks = 0
+
+    def assign(self, index):
+        self.index = index
+        self.start_time = time.time()
+        self.task_queue.put(index)
+
+    def get_failure(self):
+        """
+        :return str: why the current run failed, or None if it is still running
+        """
+        if self.index is None:
+            return None
+        if not self.process.is_alive():
+            return "Worker exited with code %s" % self.process.exitcode
+        if self.timeout is not None and time.time() - self.start_time > self.timeout + GRACE_PERIOD:
+            return "Worker killed after %d seconds" % (time.time() - self.start_time)
+        return None
+
+    def stop(self):
+        self.task_queue.put(None)
+        self.process.join()
+
+    def kill(self):
+        self.process.kill()
+        self.process.join()
+
+
+def _work(worker_id, function, args_list, task_queue, result_queue, timeout, memory_limit):
+    if memory_limit is not None and resource is not None:
+        resource.setrlimit(resource.RLIMIT_AS, (memory_limit, memory_limit))
+    while True:
+        index = task_queue.get()
+        if index is None:
+            break
+        try:
+            with time_limit(timeout):
+                result = function(*args_list[index])
+            result_queue.put((worker_id, index, result, None))
+        except BaseException as e:
+            result_queue.put((worker_id, index, None, "%s\n%s" % (repr(e), traceback.format_exc())))
@@ -0,0 +1,54 @@
+"""
+Bounded memo table with least-recently-used eviction and hit counters.
+"""
+from collections import OrderedDict
+
+__author__ = 'minjoon'
+
+
+class LRUCache(object):
+    def __init__(self, max_size):
+        """
+        :param int max_size: maximum number of entries; the least recently used one is evicted beyond it
+        """
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def get(self, key, default=None):
+        """
+        Counts a hit or a miss.
+        """
+        if key in self._entries:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return self._entries[key]
+        self.misses += 1
+        return default
+
+    def set(self, key, value):
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        if len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        self._entries.clear()
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def hit_rate(self):
+        total = self.hits + self.misses
+        return self.hits / float(total) if total > 0 else 0.0
+
+    def __repr__(self):
+        return "LRUCache(size=%d/%d, hits=%d, misses=%d, hit_rate=%.3f)" % \
+               (len(self._entries), self.max_size, self.hits, self.misses, self.hit_rate)
@@ -0,0 +1,58 @@
+"""
+run_benchmark reports a crashing, a hanging and a raising run as errors, without affecting the other runs.
+"""
+import os
+import signal
+import time
+
+from geosolver.utils import benchmark
+from geosolver.utils.benchmark import run_benchmark
+
+__author__ = 'minjoon'
+
+
+def _task(kind, value):
+    if kind == 'crash':
+        os._exit(3)
+    elif kind == 'hang':
+        time.sleep(60)
+    elif kind == 'hang_in_native_code':
+        signal.signal(signal.SIGALRM, signal.SIG_IGN)
+        time.sleep(60)
+    elif kind == 'raise':
+        raise ValueError("bad question")
+    return value * 2
+
+
+def _run(args_list, **kwargs):
+    results = {}
+    for index, result, error in run_benchmark(_task, args_list, timeout=1, **kwargs):
+        assert index not in results
+        results[index] = (result, error)
+    assert sorted(results) == list(range(len(args_list)))
+    return results
+
+
+def test_failures():
+    args_list = [('ok', 1), ('crash', 2), ('ok', 3), ('hang', 4), ('raise', 5), ('ok', 6)]
+    results = _run(args_list, num_processes=2)
+    for index in [0, 2, 5]:
+        assert results[index] == (args_list[index][1] * 2, None)
+    for index in [1, 3, 4]:
+        assert results[index][0] is None
+    assert "exited with code 3" in results[1][1]
+    assert "TimeLimitExceeded" in results[3][1]
+    assert "ValueError" in results[4][1] and "bad question" in results[4][1]
+
+
+def test_killed_worker(monkeypatch):
+    monkeypatch.setattr(benchmark, 'GRACE_PERIOD', 1)
+    results = _run([('hang_in_native_code', 1), ('ok', 2)], num_processes=1, max_tasks_per_child=None)
+    assert results[0][0] is None and "killed" in results[0][1]
+    assert results[1] == (4, None)
+
+
+def test_reused_workers():
+    args_list = [('ok', value) for value in range(10)]
+    results = _run(args_list, num_processes=3, max_tasks_per_child=None)
+    assert results == {index: (value * 2, None) for index, (_, value) in enumerate(args_list)}